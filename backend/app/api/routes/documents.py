@@ -1,4 +1,4 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form, BackgroundTasks
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import os
@@ -13,8 +13,9 @@ from ...schemas.document import (
     ProvisionalDocumentResponse,
     UploadResponse
 )
-from ...services.ocr_service import ocr_service
-from ...services.llama_service import llama_service
+from ...services.image_preprocessing import parse_preprocessing_steps
+from ...services.document_pipeline import document_pipeline
+from ...services.llm_scheduler import llm_scheduler, LLMRequestCancelled
 
 router = APIRouter()
 
@@ -25,17 +26,25 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 @router.post("/commercial", response_model=UploadResponse)
 async def upload_commercial_document(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    preprocessing: Optional[str] = Form(None),
+    priority: str = Form("normal"),
     db: Session = Depends(get_db)
 ):
     """
     Sube y procesa un documento comercial
 
     - Extrae el texto del documento
+      (**preprocessing**: perfil none/fast/default o pasos como "grayscale,deskew")
     - Clasifica el tipo de documento usando Phi-4
     - Extrae datos estructurados
+      (**priority**: "normal" o "bulk" para cargas masivas, que ceden el modelo a las demás)
     - Guarda en la base de datos
     """
+    if priority not in ("normal", "bulk"):
+        raise HTTPException(status_code=400, detail="Prioridad no válida. Use: normal, bulk")
+
     # Validar extensión de archivo
     file_extension = Path(file.filename).suffix.lower()
     if file_extension not in settings.ALLOWED_EXTENSIONS:
@@ -44,6 +53,11 @@ async def upload_commercial_document(
             detail=f"Extensión no permitida. Use: {', '.join(settings.ALLOWED_EXTENSIONS)}"
         )
 
+    try:
+        parse_preprocessing_steps(preprocessing)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     # Guardar archivo
     file_path = UPLOAD_DIR / f"commercial_{file.filename}"
     try:
@@ -53,20 +67,24 @@ async def upload_commercial_document(
         raise HTTPException(status_code=500, detail=f"Error guardando archivo: {str(e)}")
 
     try:
-        # Extraer texto
-        text_content = ocr_service.extract_text(str(file_path), file_extension)
+        # Extraer texto (capa de texto u OCR según cada página), clasificando
+        # en cuanto hay texto suficiente y extrayendo datos estructurados
+        with llm_scheduler.priority(priority):
+            result = await document_pipeline.process(str(file_path), file_extension, db, preprocessing)
 
-        if not text_content:
+        if not result["text_content"]:
             raise HTTPException(status_code=400, detail="No se pudo extraer texto del documento")
 
-        # Clasificar documento
-        classification_result = llama_service.classify_document(text_content, db)
+        classification_result = result["classification"]
         document_type = classification_result.get("document_type", "desconocido")
         confidence = classification_result.get("confidence", 0.0)
 
-        # Extraer datos estructurados
-        extracted_data = llama_service.extract_structured_data(text_content, document_type, db)
+        extracted_data = result["extracted_data"]
         extracted_data["classification_reasoning"] = classification_result.get("reasoning", "")
+        extracted_data["processing_metadata"] = {
+            "text_extraction": result["text_extraction"],
+            "pipeline": result["pipeline"]
+        }
 
         # Guardar en base de datos
         db_document = CommercialDocument(
@@ -81,6 +99,9 @@ async def upload_commercial_document(
         db.commit()
         db.refresh(db_document)
 
+        # Completar el texto de las páginas que no hicieron falta
+        background_tasks.add_task(document_pipeline.complete_in_background, result["stream"])
+
         return UploadResponse(
             message="Documento comercial subido y procesado exitosamente",
             document_id=db_document.id,
@@ -90,6 +111,12 @@ async def upload_commercial_document(
             classification_confidence=confidence
         )
 
+    except LLMRequestCancelled as e:
+        db.rollback()
+        if file_path.exists():
+            os.remove(file_path)
+        raise HTTPException(status_code=503, detail=f"Procesamiento cancelado: {str(e)}")
+
     except Exception as e:
         db.rollback()
         # Eliminar archivo si hubo error
@@ -100,13 +127,16 @@ async def upload_commercial_document(
 
 @router.post("/provisional", response_model=UploadResponse)
 async def upload_provisional_document(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    preprocessing: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
     """
     Sube y procesa un documento provisorio para validación
 
     - Extrae el texto del documento
+      (**preprocessing**: perfil none/fast/default o pasos como "grayscale,deskew")
     - Extrae datos estructurados
     - Guarda en la base de datos
     """
@@ -118,6 +148,11 @@ async def upload_provisional_document(
             detail=f"Extensión no permitida. Use: {', '.join(settings.ALLOWED_EXTENSIONS)}"
         )
 
+    try:
+        parse_preprocessing_steps(preprocessing)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     # Guardar archivo
     file_path = UPLOAD_DIR / f"provisional_{file.filename}"
     try:
@@ -127,14 +162,21 @@ async def upload_provisional_document(
         raise HTTPException(status_code=500, detail=f"Error guardando archivo: {str(e)}")
 
     try:
-        # Extraer texto
-        text_content = ocr_service.extract_text(str(file_path), file_extension)
-
-        if not text_content:
+        # Extraer texto y datos estructurados (asumiendo que es una factura genérica)
+        # Hay un despachante esperando el resultado: carril interactivo
+        with llm_scheduler.priority("interactive"):
+            result = await document_pipeline.process(
+                str(file_path), file_extension, db, preprocessing, document_type="factura"
+            )
+
+        if not result["text_content"]:
             raise HTTPException(status_code=400, detail="No se pudo extraer texto del documento")
 
-        # Extraer datos estructurados (asumiendo que es una factura genérica)
-        extracted_data = llama_service.extract_structured_data(text_content, "factura", db)
+        extracted_data = result["extracted_data"]
+        extracted_data["processing_metadata"] = {
+            "text_extraction": result["text_extraction"],
+            "pipeline": result["pipeline"]
+        }
 
         # Guardar en base de datos
         db_document = ProvisionalDocument(
@@ -147,6 +189,9 @@ async def upload_provisional_document(
         db.commit()
         db.refresh(db_document)
 
+        # Completar el texto de las páginas que no hicieron falta
+        background_tasks.add_task(document_pipeline.complete_in_background, result["stream"])
+
         return UploadResponse(
             message="Documento provisorio subido y procesado exitosamente",
             document_id=db_document.id,
@@ -154,6 +199,12 @@ async def upload_provisional_document(
             extracted_data=extracted_data
         )
 
+    except LLMRequestCancelled as e:
+        db.rollback()
+        if file_path.exists():
+            os.remove(file_path)
+        raise HTTPException(status_code=503, detail=f"Procesamiento cancelado: {str(e)}")
+
     except Exception as e:
         db.rollback()
         # Eliminar archivo si hubo error
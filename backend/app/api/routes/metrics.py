@@ -0,0 +1,80 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from ...core.database import get_db
+from ...services.ocr_service import ocr_service
+from ...services.document_pipeline import document_pipeline
+from ...services.layout_templates import layout_template_store
+from ...services.llama_service import llama_service
+from ...services.llm_scheduler import llm_scheduler
+
+router = APIRouter()
+
+
+@router.get("/")
+async def get_metrics():
+    """
+    Métricas de rendimiento del procesamiento de documentos
+
+    - **ocr_cache**: aciertos, fallos y tamaño de la caché de extracción de texto
+    - **llm_cache**: aciertos, fallos, vencimientos y tamaño de la caché de respuestas del modelo
+    - **llm_streaming**: generaciones, cortes al cerrarse el JSON y tokens generados
+    - **llm_output**: tasa de respuestas que no se pudieron interpretar, con y sin esquema JSON
+    - **llm_tokens**: tokens de prompt estimados vs. reales, num_predict y respuestas cortadas
+    - **llm_tiers**: escalamientos del modelo chico (OLLAMA_FAST_MODEL) al grande, por tipo de prompt y motivo
+    - **rule_classifier**: documentos clasificados por reglas sin consultar al modelo
+      (avoidance_rate) y acuerdo de las reglas con el modelo (agreement_rate)
+    - **fiscal_fields**: campos fiscales (CUIT, CAE, número de comprobante, ...) extraídos
+      sin el modelo (prefill_rate) y extracciones que no consultaron al modelo (llm_skip_rate)
+    - **layout_templates**: documentos procesados con una plantilla de diseño sin
+      consultar al modelo (hit_ratio) y usos en que faltó algún campo (failures)
+    - **llm_scheduler**: llamadas al modelo en curso y, por carril (interactive, normal,
+      bulk), cola actual y máxima, despachadas, canceladas y tiempo de espera
+    - **pipeline**: tiempo hasta la primera clasificación, tiempo de extracción
+      de texto y páginas cuyo OCR se difirió a segundo plano
+    """
+    return {
+        "ocr_cache": ocr_service.get_cache_stats(),
+        "llm_cache": llama_service.get_cache_stats(),
+        "llm_streaming": llama_service.get_stream_stats(),
+        "llm_output": llama_service.get_output_stats(),
+        "llm_tokens": llama_service.get_token_stats(),
+        "rule_classifier": llama_service.get_rule_stats(),
+        "llm_tiers": llama_service.get_tier_stats(),
+        "fiscal_fields": llama_service.get_fiscal_stats(),
+        "layout_templates": layout_template_store.get_stats(),
+        "llm_scheduler": llm_scheduler.get_stats(),
+        "pipeline": document_pipeline.get_stats()
+    }
+
+
+@router.get("/layout-templates")
+async def get_layout_template_metrics(db: Session = Depends(get_db)):
+    """
+    Plantillas de diseño aprendidas y su precisión
+
+    - **accuracy**: fracción de campos ubicados por la plantilla que coincidieron
+      con la extracción del modelo (al confirmarla y al verificarla)
+    - **hits** / **failures**: usos de la plantilla y usos en que faltó algún campo
+    - **llm_fields**: campos que la plantilla deja al modelo (listas, valores sin etiqueta)
+    """
+    return {
+        "summary": layout_template_store.get_stats(),
+        "templates": layout_template_store.get_template_stats(db)
+    }
+
+
+@router.post("/llm-scheduler/cancel")
+async def cancel_queued_llm_calls(lane: Optional[str] = None):
+    """
+    Cancela las llamadas al modelo que esperan en la cola (ej: una carga
+    masiva que ya no hace falta); las que están en curso terminan
+
+    - **lane**: carril a vaciar (interactive, normal o bulk); sin indicar, todos
+    """
+    try:
+        cancelled = llm_scheduler.cancel_queued(lane)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"cancelled": cancelled}
@@ -8,7 +8,7 @@ from ...schemas.document import (
     PromptTemplateUpdate,
     PromptTemplateResponse
 )
-from ...services.prompt_service import PromptService
+from ...services.prompt_service import PromptService, PROMPT_TYPES
 
 router = APIRouter()
 
@@ -22,7 +22,8 @@ async def create_prompt(
     Crea una nueva plantilla de prompt
 
     - **name**: Nombre único del prompt
-    - **prompt_type**: "classification" o "extraction"
+    - **prompt_type**: "classification", "extraction" o "classification_extraction"
+      (clasificación y extracción en una sola llamada)
     - **document_type**: Tipo de documento (solo para extraction)
     - **prompt_template**: Template con variables como {text_content}, {document_type}
     - **description**: Descripción opcional
@@ -35,10 +36,10 @@ async def create_prompt(
         raise HTTPException(status_code=400, detail="Ya existe un prompt con ese nombre")
 
     # Validar que el prompt_type sea válido
-    if prompt_data.prompt_type not in ["classification", "extraction"]:
+    if prompt_data.prompt_type not in PROMPT_TYPES:
         raise HTTPException(
             status_code=400,
-            detail="prompt_type debe ser 'classification' o 'extraction'"
+            detail=f"prompt_type debe ser uno de: {', '.join(PROMPT_TYPES)}"
         )
 
     # Validar que extraction tenga document_type
@@ -124,10 +125,10 @@ async def update_prompt(
             raise HTTPException(status_code=400, detail="Ya existe un prompt con ese nombre")
 
     # Validar prompt_type si se está actualizando
-    if prompt_data.prompt_type and prompt_data.prompt_type not in ["classification", "extraction"]:
+    if prompt_data.prompt_type and prompt_data.prompt_type not in PROMPT_TYPES:
         raise HTTPException(
             status_code=400,
-            detail="prompt_type debe ser 'classification' o 'extraction'"
+            detail=f"prompt_type debe ser uno de: {', '.join(PROMPT_TYPES)}"
         )
 
     updated_prompt = PromptService.update_prompt(db, prompt_id, prompt_data)
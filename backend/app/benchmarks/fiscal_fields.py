@@ -0,0 +1,81 @@
+"""
+Benchmark de los extractores de campos fiscales contra el modelo
+
+Toma los documentos comerciales ya procesados, vuelve a obtener su texto
+(de la caché de OCR si está) y extrae con fiscal_fields los campos que
+tienen guardados. Informa, por campo, en cuántos documentos el extractor
+encontró un valor (y no habría hecho falta pedírselo al modelo) y en
+cuántos de ellos coincide con el valor guardado, junto con el tiempo de
+extracción. Los desacuerdos suelen ser valores del modelo con otro formato
+(sin guiones, número sin punto de venta) o inventados.
+
+Uso (desde el directorio backend, con la BD y los archivos subidos):
+
+    python -m app.benchmarks.fiscal_fields --limit 500
+"""
+
+import argparse
+import os
+import re
+import time
+from collections import Counter
+
+from ..core.database import SessionLocal
+from ..models.document import CommercialDocument
+from ..services.fiscal_fields import FISCAL_FIELDS, extract_fiscal_fields
+from ..services.ocr_service import ocr_service
+from ..services.text_normalization import parse_number
+
+
+def _same(found, stored) -> bool:
+    """Mismo valor, sin importar separadores ni el tipo (número o texto)"""
+    if isinstance(found, float):
+        stored = parse_number(str(stored)) if not isinstance(stored, (int, float)) else stored
+        return stored is not None and abs(found - stored) < 0.01
+    return re.sub(r"\W", "", str(found)).lower() == re.sub(r"\W", "", str(stored)).lower()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extractores de campos fiscales vs. datos extraídos por el modelo")
+    parser.add_argument("--limit", type=int, default=500, help="Documentos a evaluar (los más recientes)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        documents = db.query(CommercialDocument).order_by(CommercialDocument.id.desc()).limit(args.limit).all()
+        rows = []
+        for document in documents:
+            extracted = document.extracted_data or {}
+            fields = [field for field in FISCAL_FIELDS if extracted.get(field) not in (None, "")]
+            if not fields or not os.path.exists(document.file_path):
+                continue
+            rows.append((document.file_path, {field: extracted[field] for field in fields}))
+    finally:
+        db.close()
+
+    if not rows:
+        print("No hay documentos con campos fiscales extraídos y su archivo disponible")
+        return
+
+    requested, found, agreed = Counter(), Counter(), Counter()
+    seconds = 0.0
+    for file_path, stored in rows:
+        text = ocr_service.extract_text(file_path, os.path.splitext(file_path)[1].lower())
+        start = time.perf_counter()
+        values, _ = extract_fiscal_fields(text, list(stored))
+        seconds += time.perf_counter() - start
+        for field, value in stored.items():
+            requested[field] += 1
+            if field in values:
+                found[field] += 1
+                agreed[field] += int(_same(values[field], value))
+
+    print(f"Documentos: {len(rows)}  extractores: {seconds / len(rows) * 1000:.2f} ms por documento")
+    print(f"{'campo':>24} {'guardados':>10} {'sin modelo':>11} {'acuerdo':>8}")
+    for field in sorted(requested, key=lambda field: -requested[field]):
+        agreement = f"{agreed[field] / found[field]:.1%}" if found[field] else "-"
+        print(f"{field:>24} {requested[field]:>10} {found[field] / requested[field]:>11.1%} {agreement:>8}")
+
+
+if __name__ == "__main__":
+    main()
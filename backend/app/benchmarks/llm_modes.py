@@ -0,0 +1,89 @@
+"""
+Benchmark de latencia: clasificación y extracción combinadas vs. dos llamadas
+
+Envía el texto de facturas de prueba al modelo configurado (OLLAMA_MODEL)
+en los dos modos de LlamaService y compara la latencia de punta a punta,
+además de cuántas veces coincide el tipo de documento.
+
+Uso (desde el directorio backend, con Ollama y la BD disponibles):
+
+    python -m app.benchmarks.llm_modes --documents 5
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..services.llama_service import llama_service
+from .samples import SAMPLE_LINES
+
+
+def _sample_text(seed: int) -> str:
+    """Texto de una factura de prueba, repetido hasta el presupuesto de extracción"""
+    rng = random.Random(seed)
+    lines = SAMPLE_LINES[:]
+    items = lines[7:10]
+    rng.shuffle(items)
+    lines[7:10] = items
+    text = "\n".join(lines)
+    while len(text) < settings.LLM_EXTRACTION_CHARS:
+        text += "\n\n" + "\n".join(lines)
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de clasificación+extracción combinadas vs. dos llamadas")
+    parser.add_argument("--documents", type=int, default=5, help="Documentos de prueba")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    # Sin caché de respuestas: se mide la latencia del modelo
+    cache, llama_service.cache = llama_service.cache, None
+    combined_setting = settings.LLM_COMBINED_CLASSIFICATION
+    # Sin clasificación por reglas: las facturas de prueba no llegarían al modelo
+    rules_setting, settings.LLM_RULE_CLASSIFIER_ENABLED = settings.LLM_RULE_CLASSIFIER_ENABLED, False
+    try:
+        texts = [_sample_text(seed) for seed in range(args.documents)]
+
+        # Primera llamada fuera de la medición: carga del modelo en Ollama
+        llama_service.classify_document(texts[0][:200], db)
+
+        combined_times, two_call_times = [], []
+        agreements = 0
+        fallbacks = 0
+        for text in texts:
+            settings.LLM_COMBINED_CLASSIFICATION = True
+            start = time.perf_counter()
+            combined, _ = llama_service.classify_and_extract(text, db)
+            combined_times.append(time.perf_counter() - start)
+            if combined["mode"] != "combined":
+                fallbacks += 1
+
+            settings.LLM_COMBINED_CLASSIFICATION = False
+            start = time.perf_counter()
+            classification, _ = llama_service.classify_and_extract(text, db)
+            two_call_times.append(time.perf_counter() - start)
+
+            if combined.get("document_type") == classification.get("document_type"):
+                agreements += 1
+    finally:
+        settings.LLM_COMBINED_CLASSIFICATION = combined_setting
+        settings.LLM_RULE_CLASSIFIER_ENABLED = rules_setting
+        llama_service.cache = cache
+        db.close()
+
+    print(f"Modelo: {settings.OLLAMA_MODEL}  documentos: {len(texts)}  "
+          f"caracteres por documento: {settings.LLM_EXTRACTION_CHARS}")
+    print(f"{'modo':>10} {'p50 s':>8} {'media s':>8}")
+    for name, times in (("combinado", combined_times), ("dos llam.", two_call_times)):
+        print(f"{name:>10} {statistics.median(times):>8.2f} {statistics.mean(times):>8.2f}")
+    print(f"\nSpeedup (media): {statistics.mean(two_call_times) / statistics.mean(combined_times):.2f}x")
+    print(f"Tipo de documento coincidente: {agreements}/{len(texts)}  "
+          f"respuestas combinadas inválidas (fallback): {fallbacks}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark de la tasa de respuestas inválidas con y sin esquema JSON
+
+Extrae los datos de facturas de prueba con el modelo configurado
+(OLLAMA_MODEL) dos veces: con texto libre y con la respuesta restringida
+por el esquema JSON (LLM_STRUCTURED_OUTPUT). Informa, para cada modo, la
+fracción de primeras respuestas que no se pudieron interpretar, cuántas se
+recuperaron con el pedido de corrección y la latencia media.
+
+Uso (desde el directorio backend, con Ollama y la BD disponibles):
+
+    python -m app.benchmarks.llm_output --documents 10
+"""
+
+import argparse
+import statistics
+import time
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..services.llama_service import llama_service
+from .llm_modes import _sample_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Respuestas inválidas con y sin esquema JSON")
+    parser.add_argument("--documents", type=int, default=10, help="Documentos de prueba")
+    parser.add_argument("--document-type", default="factura", help="Tipo de documento para el prompt de extracción")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    # Sin caché de respuestas: cada modo genera todas sus respuestas
+    cache, llama_service.cache = llama_service.cache, None
+    structured_setting = settings.LLM_STRUCTURED_OUTPUT
+    times = {}
+    try:
+        texts = [_sample_text(seed) for seed in range(args.documents)]
+        for structured in (False, True):
+            settings.LLM_STRUCTURED_OUTPUT = structured
+            times[structured] = []
+            for text in texts:
+                start = time.perf_counter()
+                llama_service.extract_structured_data(text, args.document_type, db)
+                times[structured].append(time.perf_counter() - start)
+    finally:
+        settings.LLM_STRUCTURED_OUTPUT = structured_setting
+        llama_service.cache = cache
+        db.close()
+
+    stats = llama_service.get_output_stats()
+    print(f"Modelo: {settings.OLLAMA_MODEL}  documentos: {len(texts)}  "
+          f"correcciones permitidas: {settings.LLM_REPAIR_ATTEMPTS}")
+    print(f"{'modo':>8} {'inválidas':>10} {'corregidas':>11} {'fallidas':>9} {'media s':>8}")
+    for structured, mode in ((False, "free"), (True, "schema")):
+        values = stats.get(mode)
+        if not values:
+            continue
+        print(f"{mode:>8} {values['parse_failure_rate']:>10.1%} {values['repaired']:>11} "
+              f"{values['failed']:>9} {statistics.mean(times[structured]):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark del planificador de llamadas al modelo bajo carga masiva
+
+Encola --bulk clasificaciones de facturas de prueba y, mientras se
+procesan, lanza --interactive clasificaciones de a una, como un despachante
+validando documentos. Se corre dos veces: con todas las llamadas en el
+mismo carril (equivale a la cola FIFO del semáforo anterior) y con las
+masivas en "bulk" y las interactivas en "interactive". Informa la latencia
+de las llamadas interactivas (espera en la cola incluida) y el tiempo total
+de la carga masiva.
+
+Uso (desde el directorio backend, con Ollama y la BD disponibles):
+
+    python -m app.benchmarks.llm_scheduler --bulk 12 --interactive 4
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..services.llama_service import llama_service
+from ..services.llm_scheduler import llm_scheduler
+from .llm_modes import _sample_text
+
+
+async def _classify(request, lane: str) -> float:
+    """Segundos de una clasificación en un carril, espera en la cola incluida"""
+    start = time.perf_counter()
+    with llm_scheduler.priority(lane):
+        await llama_service._agenerate_json(*request)
+    return time.perf_counter() - start
+
+
+async def _run(requests, interactive: int, bulk_lane: str, interactive_lane: str):
+    started = time.perf_counter()
+    bulk = [asyncio.create_task(_classify(request, bulk_lane)) for request in requests[1:]]
+    latencies = []
+    for _ in range(interactive):
+        # Las interactivas llegan con la cola masiva ya armada
+        await asyncio.sleep(0.5)
+        latencies.append(await _classify(requests[0], interactive_lane))
+    await asyncio.gather(*bulk)
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia interactiva con y sin carriles de prioridad")
+    parser.add_argument("--bulk", type=int, default=12, help="Clasificaciones masivas encoladas")
+    parser.add_argument("--interactive", type=int, default=4, help="Clasificaciones interactivas")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    # Sin caché de respuestas: las interactivas repiten el mismo documento
+    cache, llama_service.cache = llama_service.cache, None
+    try:
+        requests = [
+            llama_service._classification_request(_sample_text(seed), db) for seed in range(args.bulk + 1)
+        ]
+        # Primera llamada fuera de la medición: carga del modelo en Ollama
+        asyncio.run(_classify(requests[0], "normal"))
+
+        results = {
+            "un carril": asyncio.run(_run(requests, args.interactive, "normal", "normal")),
+            "carriles": asyncio.run(_run(requests, args.interactive, "bulk", "interactive")),
+        }
+    finally:
+        llama_service.cache = cache
+        db.close()
+
+    print(f"Modelo: {settings.OLLAMA_MODEL}  en curso a la vez: {llm_scheduler.max_in_flight()}  "
+          f"masivas: {args.bulk}  interactivas: {args.interactive}")
+    print(f"{'modo':>10} {'interactiva media':>18} {'interactiva máx':>16} {'carga total':>12}")
+    for mode, (latencies, total) in results.items():
+        print(f"{mode:>10} {statistics.mean(latencies):>17.2f}s {max(latencies):>15.2f}s {total:>11.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark del corte de la generación al cerrarse el objeto JSON
+
+Para cada factura de prueba genera la extracción de datos dos veces con el
+modelo configurado (OLLAMA_MODEL): completa, sin streaming, y en streaming
+cortando al cerrarse el objeto JSON. Informa por llamada los tokens
+ahorrados (eval_count de la generación completa menos los tokens recibidos
+hasta el corte), la latencia de cada modo y si ambos resultados coinciden.
+
+Uso (desde el directorio backend, con Ollama y la BD disponibles):
+
+    python -m app.benchmarks.llm_streaming --documents 5
+"""
+
+import argparse
+import statistics
+import time
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..services.llama_service import llama_service
+from .llm_modes import _sample_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens y latencia ahorrados al cortar la generación")
+    parser.add_argument("--documents", type=int, default=5, help="Documentos de prueba")
+    parser.add_argument("--document-type", default="factura", help="Tipo de documento para el prompt de extracción")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    streaming_setting = settings.LLM_STREAMING_ENABLED
+    rows = []
+    try:
+        # Primera llamada fuera de la medición: carga del modelo en Ollama
+        llama_service.client.generate(
+            model=llama_service.model, prompt="Hola", options={"num_predict": 1, "num_ctx": settings.LLM_NUM_CTX_MIN}
+        )
+
+        for seed in range(args.documents):
+            prompt, options, output_format = llama_service._extraction_request(
+                _sample_text(seed), args.document_type, db
+            )
+
+            start = time.perf_counter()
+            full = llama_service.client.generate(
+                model=llama_service.model, prompt=prompt, format=output_format or '', options=options
+            )
+            full_seconds = time.perf_counter() - start
+
+            settings.LLM_STREAMING_ENABLED = True
+            tokens_before = llama_service.get_stream_stats()["tokens"]
+            start = time.perf_counter()
+            streamed_text = llama_service._generate(prompt, options, output_format)
+            streamed_seconds = time.perf_counter() - start
+            streamed_tokens = llama_service.get_stream_stats()["tokens"] - tokens_before
+
+            try:
+                same = llama_service._parse_json_response(full['response'].strip()) == \
+                    llama_service._parse_json_response(streamed_text)
+            except ValueError:
+                same = False
+            rows.append((full.get('eval_count', 0), streamed_tokens, full_seconds, streamed_seconds, same))
+    finally:
+        settings.LLM_STREAMING_ENABLED = streaming_setting
+        db.close()
+
+    print(f"Modelo: {settings.OLLAMA_MODEL}  documentos: {len(rows)}")
+    print(f"{'doc':>4} {'tokens':>7} {'cortado':>8} {'ahorro':>7} {'completo s':>11} {'cortado s':>10} {'igual':>6}")
+    for i, (full_tokens, streamed_tokens, full_seconds, streamed_seconds, same) in enumerate(rows):
+        print(f"{i:>4} {full_tokens:>7} {streamed_tokens:>8} {full_tokens - streamed_tokens:>7} "
+              f"{full_seconds:>11.2f} {streamed_seconds:>10.2f} {'sí' if same else 'no':>6}")
+
+    saved = [full_tokens - streamed_tokens for full_tokens, streamed_tokens, *_ in rows]
+    print(f"\nTokens ahorrados por llamada (media): {statistics.mean(saved):.1f}")
+    print(f"Latencia (media): completo {statistics.mean(row[2] for row in rows):.2f} s  "
+          f"cortado {statistics.mean(row[3] for row in rows):.2f} s")
+
+
+if __name__ == "__main__":
+    main()
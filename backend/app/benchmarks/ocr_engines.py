@@ -0,0 +1,62 @@
+"""
+Micro-benchmark de latencia por página de los motores de OCR
+
+Compara pytesseract (un proceso `tesseract` por llamada) con tesserocr
+(handles de Tesseract precargados en proceso) sobre imágenes chicas tipo
+ticket y sobre páginas A4 completas.
+
+Uso (desde el directorio backend, con las variables de entorno cargadas):
+
+    python -m app.benchmarks.ocr_engines --iterations 20
+"""
+
+import argparse
+import statistics
+import time
+
+from ..core.config import settings
+from ..services.ocr_engines import get_ocr_engine, tesserocr
+from .samples import render_page
+
+
+def _latencies(engine, image, iterations: int):
+    """Latencias en milisegundos de `iterations` llamadas a OCR"""
+    # Primera llamada fuera de la medición: carga de traineddata / handles
+    engine.image_to_string(image, settings.OCR_LANG)
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        engine.image_to_string(image, settings.OCR_LANG)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia por página de los motores de OCR")
+    parser.add_argument("--iterations", type=int, default=20, help="Llamadas medidas por caso")
+    args = parser.parse_args()
+
+    engines = ["pytesseract"]
+    if tesserocr is not None:
+        engines.append("tesserocr")
+    else:
+        print("tesserocr no está instalado; solo se mide pytesseract")
+
+    # Ticket chico (80 x 120 mm a 200 DPI) y página A4 a OCR_DPI
+    page = render_page(1, dpi=settings.OCR_DPI)
+    receipt = render_page(1, dpi=200).crop((0, 0, int(80 / 25.4 * 200), int(120 / 25.4 * 200)))
+    cases = [("ticket", receipt), ("A4", page)]
+
+    print(f"{'motor':>12} {'imagen':>8} {'p50 ms':>9} {'p95 ms':>9} {'media ms':>9}")
+    for engine_name in engines:
+        engine = get_ocr_engine(engine_name)
+        for case_name, image in cases:
+            latencies = sorted(_latencies(engine, image, args.iterations))
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            print(f"{engine_name:>12} {case_name:>8} {statistics.median(latencies):>9.1f} "
+                  f"{p95:>9.1f} {statistics.mean(latencies):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
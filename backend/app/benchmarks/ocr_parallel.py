@@ -0,0 +1,63 @@
+"""
+Benchmark de OCR serial vs. paralelo por páginas
+
+Genera PDFs escaneados de prueba y compara páginas por segundo de
+OCRService en modo serial y en modo paralelo.
+
+Uso (desde el directorio backend, con las variables de entorno cargadas):
+
+    python -m app.benchmarks.ocr_parallel --pages 4 8 16 --repeat 2
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from ..core.config import settings
+from ..services.ocr_service import ocr_service, shutdown_ocr_executor
+from .samples import generate_scanned_pdf
+
+
+def _measure(file_path: str, parallel: bool, repeat: int) -> float:
+    """Devuelve el mejor tiempo (en segundos) de `repeat` corridas"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ocr_service._extract_text_from_pdf_images(file_path, parallel=parallel)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de OCR serial vs. paralelo")
+    parser.add_argument("--pages", type=int, nargs="+", default=[4, 8, 16],
+                        help="Cantidad de páginas de los PDFs a generar")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Corridas por caso (se informa la mejor)")
+    args = parser.parse_args()
+
+    print(f"CPUs: {os.cpu_count()}  OCR_MAX_WORKERS: {settings.OCR_MAX_WORKERS or os.cpu_count()}  "
+          f"OCR_MAX_WORKERS_PER_DOCUMENT: {settings.OCR_MAX_WORKERS_PER_DOCUMENT}  DPI: {settings.OCR_DPI}")
+    print(f"{'páginas':>8} {'serial p/s':>12} {'paralelo p/s':>14} {'speedup':>9}")
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Calentar el pool para no medir el arranque de los procesos
+            warmup_path = generate_scanned_pdf(os.path.join(tmp_dir, "warmup.pdf"), 2, dpi=settings.OCR_DPI)
+            ocr_service._extract_text_from_pdf_images(warmup_path, parallel=True)
+
+            for pages in args.pages:
+                file_path = generate_scanned_pdf(
+                    os.path.join(tmp_dir, f"sample_{pages}.pdf"), pages, dpi=settings.OCR_DPI
+                )
+                serial_time = _measure(file_path, parallel=False, repeat=args.repeat)
+                parallel_time = _measure(file_path, parallel=True, repeat=args.repeat)
+                print(f"{pages:>8} {pages / serial_time:>12.2f} {pages / parallel_time:>14.2f} "
+                      f"{serial_time / parallel_time:>8.2f}x")
+    finally:
+        shutdown_ocr_executor()
+
+
+if __name__ == "__main__":
+    main()
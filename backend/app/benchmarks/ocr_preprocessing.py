@@ -0,0 +1,61 @@
+"""
+Benchmark de segundos de OCR por página según el preprocesamiento
+
+Aplica OCR a "fotos" de facturas simuladas (grandes, inclinadas y con
+ruido) con cada perfil de preprocesamiento y reporta el tiempo total por
+página, la parte que corresponde al preprocesamiento y cuántas de las
+líneas esperadas se reconocieron.
+
+Uso (desde el directorio backend, con las variables de entorno cargadas):
+
+    python -m app.benchmarks.ocr_preprocessing --photos 3
+"""
+
+import argparse
+import time
+
+from ..core.config import settings
+from ..services.image_preprocessing import PREPROCESSING_PROFILES, parse_preprocessing_steps, preprocess_image
+from ..services.ocr_engines import get_ocr_engine
+from .samples import SAMPLE_LINES, render_photo
+
+
+def _recognized_lines(text: str) -> float:
+    """Fracción de líneas de muestra que aparecen en el texto reconocido"""
+    normalized = " ".join(text.split()).lower()
+    found = sum(1 for line in SAMPLE_LINES if " ".join(line.split()).lower() in normalized)
+    return found / len(SAMPLE_LINES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR por página según preprocesamiento")
+    parser.add_argument("--photos", type=int, default=3, help="Cantidad de fotos simuladas")
+    parser.add_argument("--profiles", nargs="+", default=list(PREPROCESSING_PROFILES),
+                        help="Perfiles o listas de pasos a comparar")
+    args = parser.parse_args()
+
+    engine = get_ocr_engine()
+    photos = [render_photo(i + 1, seed=i) for i in range(args.photos)]
+
+    print(f"Motor: {engine.name}  DPI objetivo: {settings.OCR_PREPROCESS_TARGET_DPI}")
+    print(f"{'perfil':>40} {'s/página':>9} {'preproc s':>10} {'líneas ok':>10}")
+    for profile in args.profiles:
+        steps = parse_preprocessing_steps(profile)
+        total = preprocessing_time = accuracy = 0.0
+
+        for photo in photos:
+            start = time.perf_counter()
+            image = preprocess_image(photo, steps)
+            preprocessed = time.perf_counter()
+            text = engine.image_to_string(image, settings.OCR_LANG)
+            total += time.perf_counter() - start
+            preprocessing_time += preprocessed - start
+            accuracy += _recognized_lines(text)
+
+        label = profile if profile in PREPROCESSING_PROFILES else ",".join(steps)
+        print(f"{label:>40} {total / len(photos):>9.2f} {preprocessing_time / len(photos):>10.2f} "
+              f"{accuracy / len(photos):>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark del orden de los prompts y la caché KV de Ollama
+
+Para cada orden de LLM_PROMPT_LAYOUT ("template": el template tal cual,
+con el documento en el medio; "prefix": instrucciones primero y documento
+al final) procesa documentos de prueba como el pipeline, en una llamada
+combinada (LLM_COMBINED_CLASSIFICATION) o en dos (clasificación y
+extracción), y registra de cada generación los tokens evaluados y el
+tiempo de evaluación del prompt (prompt_eval_count y prompt_eval_duration
+de Ollama). Los tokens que Ollama toma de la caché KV
+no se evalúan, así que el ahorro se ve en ambas columnas desde la segunda
+llamada.
+
+Antes de cada orden se genera con un prompt distinto para descartar la
+caché de la corrida anterior. En dos llamadas, con OLLAMA_NUM_PARALLEL=1,
+clasificación y extracción solo comparten PROMPT_PREFIX (cada una descarta
+la caché de la otra); con más slots Ollama asigna cada prompt al slot con
+el prefijo más largo en común.
+
+Uso (desde el directorio backend, con Ollama y la BD disponibles):
+
+    python -m app.benchmarks.prompt_prefix --documents 5 --mode combined
+"""
+
+import argparse
+import statistics
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..services.llama_service import llama_service
+from .llm_modes import _sample_text
+
+LAYOUTS = ["template", "prefix"]
+
+
+def _generate(prompt, options, output_format):
+    response = llama_service.client.generate(
+        model=llama_service.model,
+        prompt=prompt,
+        format=output_format or '',
+        options=options,
+        keep_alive=llama_service._keep_alive()
+    )
+    return response.get('prompt_eval_count', 0), response.get('prompt_eval_duration', 0) / 1e6
+
+
+def _requests(mode: str, text: str, document_type: str, db):
+    if mode == "combined":
+        return [("combinada", llama_service._combined_request(text, db))]
+    return [
+        ("clasificación", llama_service._classification_request(text, db)),
+        ("extracción", llama_service._extraction_request(text, document_type, db)),
+    ]
+
+
+def _run_layout(layout: str, mode: str, documents: int, document_type: str, db):
+    """Tokens evaluados y ms de evaluación de cada llamada con un orden de prompt"""
+    settings.LLM_PROMPT_LAYOUT = layout
+    # Descartar la caché KV de la corrida anterior (mismo num_ctx: sin recarga del modelo)
+    llama_service.client.generate(
+        model=llama_service.model, prompt="Hola", options={"num_predict": 1, "num_ctx": settings.LLM_NUM_CTX_MIN}
+    )
+
+    rows = []
+    for seed in range(documents):
+        for kind, request in _requests(mode, _sample_text(seed), document_type, db):
+            tokens, milliseconds = _generate(*request)
+            rows.append((seed, kind, len(request[0]), tokens, milliseconds))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluación del prompt con y sin prefijo común")
+    parser.add_argument("--documents", type=int, default=5, help="Documentos de prueba")
+    parser.add_argument("--mode", choices=["combined", "two_call"], default="combined", help="Llamadas por documento")
+    parser.add_argument("--document-type", default="factura", help="Tipo de documento para el prompt de extracción")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    layout_setting = settings.LLM_PROMPT_LAYOUT
+    results = {}
+    try:
+        for layout in LAYOUTS:
+            results[layout] = _run_layout(layout, args.mode, args.documents, args.document_type, db)
+    finally:
+        settings.LLM_PROMPT_LAYOUT = layout_setting
+        db.close()
+
+    print(f"Modelo: {settings.OLLAMA_MODEL}  documentos: {args.documents}  modo: {args.mode}")
+    print(f"{'orden':>9} {'doc':>4} {'llamada':>14} {'caracteres':>11} {'tokens eval':>12} {'eval ms':>9}")
+    for layout, rows in results.items():
+        for seed, kind, chars, tokens, milliseconds in rows:
+            print(f"{layout:>9} {seed:>4} {kind:>14} {chars:>11} {tokens:>12} {milliseconds:>9.1f}")
+
+    # La primera llamada de cada orden no puede reutilizar nada
+    print("\nDesde la segunda llamada (media):")
+    for layout, rows in results.items():
+        repeated = rows[1:] or rows
+        print(f"  {layout:>9}: {statistics.mean(row[3] for row in repeated):.0f} tokens evaluados, "
+              f"{statistics.mean(row[4] for row in repeated):.1f} ms de evaluación del prompt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark de los backends de rasterización (pdf2image vs. pipe)
+
+Compara, sobre PDFs escaneados de prueba:
+
+- Solo rasterización: páginas por segundo entregadas por iter_pdf_pages
+  (pdf2image escribe PPM a un directorio temporal y los decodifica; pipe
+  lee PGM de pdftoppm por stdout directo a un buffer)
+- OCR completo en paralelo: con pdf2image cada worker rasteriza su
+  página; con pipe se rasteriza una vez y los workers leen la página de
+  memoria compartida
+
+Uso (desde el directorio backend, con las variables de entorno cargadas):
+
+    python -m app.benchmarks.raster_handoff --pages 4 16 --repeat 2
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from ..core.config import settings
+from ..services.ocr_service import ocr_service, shutdown_ocr_executor
+from ..services.pdf_rasterizer import RASTER_BACKENDS, iter_pdf_pages
+from .samples import generate_scanned_pdf
+
+
+def _best_time(function, repeat: int) -> float:
+    """Devuelve el mejor tiempo (en segundos) de `repeat` corridas"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _rasterize(file_path: str, pages: int):
+    for _, image in iter_pdf_pages(file_path, list(range(1, pages + 1)), settings.OCR_DPI):
+        image.getpixel((0, 0))
+
+
+def _use_backend(backend: str, warmup_path: str, warm_up: bool):
+    """
+    Cambia el backend de rasterización en este proceso y en los workers
+
+    Los workers leen la configuración del entorno al iniciarse, por lo que
+    se recrea el pool (y se lo calienta para no medir el arranque).
+    """
+    settings.OCR_RASTER_BACKEND = backend
+    os.environ["OCR_RASTER_BACKEND"] = backend
+    shutdown_ocr_executor()
+    if warm_up:
+        ocr_service._extract_text_from_pdf_images(warmup_path, parallel=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de backends de rasterización")
+    parser.add_argument("--pages", type=int, nargs="+", default=[4, 16],
+                        help="Cantidad de páginas de los PDFs a generar")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Corridas por caso (se informa la mejor)")
+    parser.add_argument("--skip-ocr", action="store_true",
+                        help="Medir solo la rasterización")
+    args = parser.parse_args()
+
+    original_backend = settings.OCR_RASTER_BACKEND
+    original_environ = os.environ.get("OCR_RASTER_BACKEND")
+    print(f"CPUs: {os.cpu_count()}  OCR_MAX_WORKERS_PER_DOCUMENT: {settings.OCR_MAX_WORKERS_PER_DOCUMENT}  "
+          f"DPI: {settings.OCR_DPI}")
+    print(f"{'páginas':>8} {'backend':>10} {'raster p/s':>12} {'OCR p/s':>10}")
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            warmup_path = generate_scanned_pdf(os.path.join(tmp_dir, "warmup.pdf"), 2, dpi=settings.OCR_DPI)
+
+            for pages in args.pages:
+                file_path = generate_scanned_pdf(
+                    os.path.join(tmp_dir, f"sample_{pages}.pdf"), pages, dpi=settings.OCR_DPI
+                )
+                for backend in RASTER_BACKENDS:
+                    _use_backend(backend, warmup_path, warm_up=not args.skip_ocr)
+                    raster_time = _best_time(lambda: _rasterize(file_path, pages), args.repeat)
+                    ocr_rate = "-"
+                    if not args.skip_ocr:
+                        ocr_time = _best_time(
+                            lambda: ocr_service._extract_text_from_pdf_images(file_path, parallel=True),
+                            args.repeat
+                        )
+                        ocr_rate = f"{pages / ocr_time:.2f}"
+                    print(f"{pages:>8} {backend:>10} {pages / raster_time:>12.2f} {ocr_rate:>10}")
+    finally:
+        settings.OCR_RASTER_BACKEND = original_backend
+        if original_environ is None:
+            os.environ.pop("OCR_RASTER_BACKEND", None)
+        else:
+            os.environ["OCR_RASTER_BACKEND"] = original_environ
+        shutdown_ocr_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark de la clasificación por reglas contra la del modelo
+
+Toma los documentos comerciales ya clasificados por el modelo (los que
+clasificaron las reglas se omiten), vuelve a obtener su texto (de la caché
+de OCR si está) y los clasifica con classify_by_rules. Para cada umbral de
+confianza informa la fracción de documentos que no habrían consultado al
+modelo y, entre ellos, la fracción con el mismo tipo que eligió el modelo,
+junto con los desacuerdos y el tiempo de clasificación por reglas.
+
+Uso (desde el directorio backend, con la BD y los archivos subidos):
+
+    python -m app.benchmarks.rule_classifier --limit 500 --thresholds 0.7 0.8 0.9
+"""
+
+import argparse
+import os
+import time
+from collections import Counter
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.document import CommercialDocument
+from ..services.ocr_service import ocr_service
+from ..services.rule_classifier import classify_by_rules
+
+
+def _llm_classified(document: CommercialDocument) -> bool:
+    """Si el tipo guardado lo eligió el modelo (no las reglas ni un error)"""
+    pipeline = ((document.extracted_data or {}).get("processing_metadata") or {}).get("pipeline") or {}
+    return document.document_type not in (None, "", "desconocido") and pipeline.get("llm_mode") != "rules"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clasificación por reglas vs. clasificación del modelo")
+    parser.add_argument("--limit", type=int, default=500, help="Documentos a evaluar (los más recientes)")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.7, 0.8, 0.9], help="Umbrales de confianza")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        documents = db.query(CommercialDocument).order_by(CommercialDocument.id.desc()).limit(args.limit).all()
+        documents = [document for document in documents if _llm_classified(document)]
+
+        rows = []
+        rule_seconds = 0.0
+        for document in documents:
+            if not os.path.exists(document.file_path):
+                continue
+            text = ocr_service.extract_text(document.file_path, os.path.splitext(document.file_path)[1].lower())
+            start = time.perf_counter()
+            rules = classify_by_rules(text[:settings.LLM_RULE_CLASSIFIER_CHARS])
+            rule_seconds += time.perf_counter() - start
+            rows.append((document.document_type, rules))
+    finally:
+        db.close()
+
+    if not rows:
+        print("No hay documentos clasificados por el modelo con su archivo disponible")
+        return
+
+    print(f"Documentos: {len(rows)}  caracteres evaluados: {settings.LLM_RULE_CLASSIFIER_CHARS}  "
+          f"reglas: {rule_seconds / len(rows) * 1000:.2f} ms por documento")
+    print(f"{'umbral':>7} {'sin modelo':>11} {'evitadas':>9} {'acuerdo':>8}")
+    for threshold in args.thresholds:
+        accepted = [(llm_type, rules) for llm_type, rules in rows if rules and rules["confidence"] >= threshold]
+        agreements = sum(1 for llm_type, rules in accepted if rules["document_type"] == llm_type)
+        agreement = f"{agreements / len(accepted):.1%}" if accepted else "-"
+        print(f"{threshold:>7.2f} {len(accepted):>11} {len(accepted) / len(rows):>9.1%} {agreement:>8}")
+
+    # Desacuerdos al umbral configurado (modelo -> reglas)
+    disagreements = Counter(
+        (llm_type, rules["document_type"]) for llm_type, rules in rows
+        if rules and rules["confidence"] >= settings.LLM_RULE_CLASSIFIER_THRESHOLD
+        and rules["document_type"] != llm_type
+    )
+    if disagreements:
+        print(f"\nDesacuerdos con umbral {settings.LLM_RULE_CLASSIFIER_THRESHOLD} (modelo -> reglas):")
+        for (llm_type, rule_type), count in disagreements.most_common():
+            print(f"  {llm_type} -> {rule_type}: {count}")
+
+
+if __name__ == "__main__":
+    main()
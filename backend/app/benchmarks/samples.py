@@ -0,0 +1,205 @@
+"""
+Generación de documentos de prueba para los benchmarks
+
+generate_scanned_pdf produce PDFs compuestos solo por imágenes (sin capa
+de texto), de modo que simulan documentos escaneados y fuerzan el camino
+de OCR. generate_text_pdf produce PDFs digitales con capa de texto.
+"""
+
+from PIL import Image, ImageDraw, ImageFont
+from typing import List
+import re
+import numpy as np
+import random
+
+
+SAMPLE_LINES = [
+    "FACTURA A",
+    "Punto de Venta: 0001   Comp. Nro: 00012345",
+    "Fecha de Emision: 15/03/2024",
+    "Razon Social: Importadora del Sur S.A.",
+    "CUIT: 30-71234567-8",
+    "Condicion frente al IVA: IVA Responsable Inscripto",
+    "Cantidad   Descripcion                     Precio Unit.   Subtotal",
+    "10         Rodamiento 6204 ZZ              1.250,00       12.500,00",
+    "4          Correa de transmision A-42      3.400,00       13.600,00",
+    "25         Tornillo hexagonal M8 x 30         85,00        2.125,00",
+    "Subtotal: $ 28.225,00",
+    "IVA 21%: $ 5.927,25",
+    "Importe Total: $ 34.152,25",
+    "CAE N: 74123456789012   Fecha de Vto. de CAE: 25/03/2024",
+]
+
+
+def _load_font(size: int) -> ImageFont.ImageFont:
+    """Carga una fuente TrueType si está disponible, o la fuente por defecto"""
+    for font_name in ("DejaVuSans.ttf", "LiberationSans-Regular.ttf", "Arial.ttf"):
+        try:
+            return ImageFont.truetype(font_name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def render_page(page_number: int, dpi: int = 300, seed: int = 0) -> Image.Image:
+    """
+    Renderiza una página A4 con texto de factura
+
+    Args:
+        page_number: Número de página (se imprime en el encabezado)
+        dpi: Resolución de la página
+        seed: Semilla para variar el orden de las líneas
+
+    Returns:
+        Imagen RGB de la página
+    """
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    font = _load_font(max(12, dpi // 8))
+
+    rng = random.Random(seed + page_number)
+    lines = [f"Pagina {page_number}"] + SAMPLE_LINES[:]
+    items = lines[8:11]
+    rng.shuffle(items)
+    lines[8:11] = items
+
+    margin = dpi // 2
+    line_height = int(dpi / 8 * 1.6)
+    y = margin
+    while y < height - margin - line_height:
+        for line in lines:
+            draw.text((margin, y), line, fill="black", font=font)
+            y += line_height
+            if y >= height - margin - line_height:
+                break
+        y += line_height
+
+    return image
+
+
+def generate_scanned_pdf(path: str, pages: int, dpi: int = 300, seed: int = 0) -> str:
+    """
+    Genera un PDF multipágina compuesto solo por imágenes
+
+    Args:
+        path: Ruta de destino del PDF
+        pages: Cantidad de páginas
+        dpi: Resolución de las páginas
+        seed: Semilla para variar el contenido
+
+    Returns:
+        Ruta del PDF generado
+    """
+    images: List[Image.Image] = [render_page(i + 1, dpi=dpi, seed=seed) for i in range(pages)]
+    images[0].save(path, "PDF", resolution=dpi, save_all=True, append_images=images[1:])
+    for image in images:
+        image.close()
+    return path
+
+
+def render_photo(page_number: int = 1, dpi: int = 400, skew: float = 2.5, seed: int = 0) -> Image.Image:
+    """
+    Simula la foto de celular de una factura: alta resolución, inclinada,
+    con iluminación despareja, ruido y bordes oscuros
+
+    Args:
+        page_number: Número de página a renderizar
+        dpi: Resolución de la "foto"
+        skew: Inclinación en grados
+        seed: Semilla del ruido
+
+    Returns:
+        Imagen RGB sin metadatos de DPI
+    """
+    page = render_page(page_number, dpi=dpi, seed=seed).rotate(
+        skew, resample=Image.BICUBIC, expand=True, fillcolor=(255, 255, 255)
+    )
+
+    pixels = np.asarray(page, dtype=np.float32)
+    height, width = pixels.shape[:2]
+
+    # Iluminación: más oscuro hacia una esquina
+    shading = np.linspace(1.0, 0.75, width, dtype=np.float32)[None, :, None]
+    shading = shading * np.linspace(1.0, 0.85, height, dtype=np.float32)[:, None, None]
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(0, 12, size=(height, width, 1)).astype(np.float32)
+    pixels = np.clip(pixels * shading + noise, 0, 255).astype(np.uint8)
+
+    # Bordes oscuros (la mesa alrededor del papel)
+    border = max(10, width // 40)
+    pixels[:border, :] = 40
+    pixels[-border:, :] = 40
+    pixels[:, :border] = 40
+    pixels[:, -border:] = 40
+
+    return Image.fromarray(pixels, mode="RGB")
+
+
+def _pdf_string(text: str) -> str:
+    """Escapa un texto como string literal de PDF"""
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def generate_text_pdf(path: str, pages: int, seed: int = 0) -> List[str]:
+    """
+    Genera un PDF digital multipágina con capa de texto (Helvetica)
+
+    Cada línea de factura se escribe por columnas (cada celda con su propia
+    posición), como lo hacen los sistemas de facturación, de modo que el
+    orden de lectura depende del extractor.
+
+    Args:
+        path: Ruta de destino del PDF
+        pages: Cantidad de páginas
+        seed: Semilla para variar el orden de las líneas
+
+    Returns:
+        Texto de referencia de cada página
+    """
+    references = []
+    contents = []
+    for page_number in range(1, pages + 1):
+        rng = random.Random(seed + page_number)
+        lines = [f"Pagina {page_number}"] + SAMPLE_LINES[:]
+        items = lines[8:11]
+        rng.shuffle(items)
+        lines[8:11] = items
+
+        operations = ["BT", "/F1 10 Tf"]
+        y = 800
+        for line in lines:
+            # Las columnas se separan por tres o más espacios
+            for column, cell in enumerate(re.split(r"\s{3,}", line)):
+                operations.append(f"1 0 0 1 {50 + column * 130} {y} Tm {_pdf_string(cell)} Tj")
+            y -= 16
+        operations.append("ET")
+        contents.append("\n".join(operations).encode("latin-1"))
+        references.append("\n".join(lines))
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [" + " ".join(f"{4 + i * 2} 0 R" for i in range(pages))
+         + f"] /Count {pages} >>").encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    for i, content in enumerate(contents):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + i * 2} 0 R >>".encode()
+        )
+        objects.append(f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream")
+
+    with open(path, "wb") as file:
+        file.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(file.tell())
+            file.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+        xref_offset = file.tell()
+        file.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+        for offset in offsets:
+            file.write(f"{offset:010d} 00000 n \n".encode())
+        file.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+    return references
@@ -0,0 +1,148 @@
+"""
+Benchmark de los extractores de capa de texto de PDFs
+
+Mide, para cada extractor disponible (pypdf2, pdftotext, pymupdf), el
+tiempo por página y la calidad del texto sobre un corpus, y recomienda el
+más rápido que alcanza el umbral de calidad (valor para
+OCR_TEXT_LAYER_BACKEND).
+
+La calidad es el F1 entre las palabras extraídas y las del texto de
+referencia (sin importar el orden ni los espacios). Por defecto el corpus
+se genera con facturas digitales de prueba; con --corpus se usan los PDFs
+de un directorio, tomando como referencia el .txt homónimo de cada uno
+(los PDFs sin .txt solo cuentan para el tiempo).
+
+Uso (desde el directorio backend, con las variables de entorno cargadas):
+
+    python -m app.benchmarks.text_layer --documents 20 --pages 3
+    python -m app.benchmarks.text_layer --corpus /app/uploads/muestras --min-quality 0.98
+"""
+
+import argparse
+import os
+import re
+import statistics
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from ..services.text_layer import available_text_layer_backends, get_text_layer_backend
+from .samples import generate_text_pdf
+
+
+def text_quality(extracted: str, reference: str) -> float:
+    """F1 entre las palabras (multiconjunto) del texto extraído y la referencia"""
+    extracted_words = Counter(re.findall(r"\w+", extracted.lower()))
+    reference_words = Counter(re.findall(r"\w+", reference.lower()))
+    if not extracted_words or not reference_words:
+        return 1.0 if extracted_words == reference_words else 0.0
+
+    common = sum((extracted_words & reference_words).values())
+    precision = common / sum(extracted_words.values())
+    recall = common / sum(reference_words.values())
+    return 2 * precision * recall / (precision + recall) if common else 0.0
+
+
+def _load_corpus(directory: str) -> List[Tuple[str, Optional[str]]]:
+    """PDFs de un directorio con el texto de referencia de su .txt, si existe"""
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        path = os.path.join(directory, name)
+        reference_path = os.path.splitext(path)[0] + ".txt"
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path, encoding="utf-8") as file:
+                reference = file.read()
+        corpus.append((path, reference))
+    return corpus
+
+
+def _generate_corpus(directory: str, documents: int, pages: int) -> List[Tuple[str, Optional[str]]]:
+    corpus = []
+    for i in range(documents):
+        path = os.path.join(directory, f"factura_{i}.pdf")
+        references = generate_text_pdf(path, pages, seed=i * 100)
+        corpus.append((path, "\n".join(references)))
+    return corpus
+
+
+def _evaluate(backend_name: str, corpus: List[Tuple[str, Optional[str]]], repeat: int) -> Dict[str, float]:
+    """Tiempo por página (ms) y calidad media del extractor sobre el corpus"""
+    backend = get_text_layer_backend(backend_name)
+    total_time = 0.0
+    total_pages = 0
+    qualities = []
+    errors = 0
+
+    for path, reference in corpus:
+        best = float("inf")
+        pages: List[Optional[str]] = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            try:
+                pages = backend.extract_pages(path)
+            except Exception:
+                pages = []
+            best = min(best, time.perf_counter() - start)
+
+        if not pages:
+            errors += 1
+        total_time += best
+        total_pages += max(1, len(pages))
+        if reference is not None:
+            qualities.append(text_quality("\n".join(page or "" for page in pages), reference))
+
+    return {
+        "ms_per_page": total_time / max(1, total_pages) * 1000,
+        "quality": statistics.mean(qualities) if qualities else None,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de extractores de capa de texto")
+    parser.add_argument("--corpus", help="Directorio con PDFs (y .txt de referencia opcionales)")
+    parser.add_argument("--documents", type=int, default=10, help="Documentos a generar sin --corpus")
+    parser.add_argument("--pages", type=int, default=3, help="Páginas por documento generado")
+    parser.add_argument("--repeat", type=int, default=3, help="Corridas por documento (se toma la mejor)")
+    parser.add_argument("--min-quality", type=float, default=0.95,
+                        help="F1 mínimo de palabras para considerar un extractor")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.corpus:
+            corpus = _load_corpus(args.corpus)
+        else:
+            corpus = _generate_corpus(tmp_dir, args.documents, args.pages)
+
+        if not corpus:
+            print("El corpus no contiene PDFs")
+            return
+
+        print(f"Documentos: {len(corpus)}  con referencia: {sum(1 for _, ref in corpus if ref is not None)}")
+        print(f"{'extractor':>10} {'ms/página':>10} {'calidad':>8} {'errores':>8}")
+
+        results = {}
+        for backend_name in available_text_layer_backends():
+            result = _evaluate(backend_name, corpus, args.repeat)
+            results[backend_name] = result
+            quality = f"{result['quality']:.3f}" if result["quality"] is not None else "-"
+            print(f"{backend_name:>10} {result['ms_per_page']:>10.2f} {quality:>8} {result['errors']:>8}")
+
+    eligible = [
+        name for name, result in results.items()
+        if result["errors"] == 0 and (result["quality"] is None or result["quality"] >= args.min_quality)
+    ]
+    if not eligible:
+        print(f"Ningún extractor alcanza la calidad mínima ({args.min_quality})")
+        return
+
+    fastest = min(eligible, key=lambda name: results[name]["ms_per_page"])
+    print(f"\nRecomendado: OCR_TEXT_LAYER_BACKEND={fastest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark de la selección de texto relevante vs. el corte por el comienzo
+
+Arma facturas largas de prueba (encabezado, páginas de condiciones
+generales con el encabezado repetido, ítems y totales al final) y compara,
+para cada presupuesto de caracteres, cuántos de los valores a extraer
+(número, fecha, CUIT, total, CAE) llegan al prompt cortando el texto por el
+comienzo y con select_relevant_text, junto con el tiempo de selección.
+
+Uso (desde el directorio backend):
+
+    python -m app.benchmarks.text_selection --pages 2 6 --budgets 2000 4000
+"""
+
+import argparse
+import random
+import time
+
+from ..services.prompt_service import DEFAULT_EXTRACTION_FIELDS
+from ..services.text_selection import field_keywords, select_relevant_text
+from .samples import SAMPLE_LINES
+
+# Valores de SAMPLE_LINES que la extracción de una factura debe encontrar
+EXPECTED_VALUES = ["00012345", "15/03/2024", "30-71234567-8", "34.152,25", "74123456789012"]
+
+FILLER = [
+    "Las mercaderias viajan por cuenta y riesgo del comprador salvo pacto en contrario.",
+    "Los reclamos por faltantes deberan realizarse dentro de las 48 horas de recibida la mercaderia.",
+    "Los precios pueden ser modificados sin previo aviso segun las condiciones del mercado.",
+    "La falta de pago en termino devengara intereses a la tasa vigente del banco de la nacion.",
+    "Para cualquier controversia las partes se someten a los tribunales ordinarios de la ciudad.",
+]
+
+
+def long_invoice(pages: int, seed: int = 0) -> str:
+    """Factura con `pages` páginas de condiciones entre el encabezado y los totales"""
+    rng = random.Random(seed)
+    header = SAMPLE_LINES[:6]
+    sections = ["\n".join(header)]
+    for page in range(pages):
+        # Encabezado repetido en cada página, como en los PDFs reales
+        sections.append(f"{header[0]}\n{header[3]}")
+        sections.append("\n".join(rng.choice(FILLER) for _ in range(30)))
+    sections.append("\n".join(SAMPLE_LINES[6:10]))
+    sections.append("\n".join(SAMPLE_LINES[10:]))
+    return "\n\n".join(sections)
+
+
+def _recall(text: str) -> int:
+    return sum(1 for value in EXPECTED_VALUES if value in text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Selección de texto relevante vs. corte por el comienzo")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 3, 6], help="Páginas de condiciones")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[2000, 3000, 4000], help="Caracteres del prompt")
+    parser.add_argument("--repeat", type=int, default=20, help="Corridas para medir el tiempo de selección")
+    args = parser.parse_args()
+
+    keywords = field_keywords(DEFAULT_EXTRACTION_FIELDS["factura"])
+    print(f"Valores esperados: {len(EXPECTED_VALUES)}")
+    print(f"{'páginas':>8} {'caracteres':>11} {'presupuesto':>12} {'comienzo':>9} {'selección':>10} {'ms':>7}")
+
+    for pages in args.pages:
+        text = long_invoice(pages, seed=pages)
+        for budget in args.budgets:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                selected = select_relevant_text(text, keywords, budget)
+            elapsed_ms = (time.perf_counter() - start) / args.repeat * 1000
+            print(f"{pages:>8} {len(text):>11} {budget:>12} {_recall(text[:budget]):>9} "
+                  f"{_recall(selected):>10} {elapsed_ms:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class DiskCache:
+    """
+    Caché persistente en disco con desalojo LRU por tamaño y vencimiento
+
+    Cada entrada es un archivo JSON cuyo nombre es la clave. La fecha de
+    acceso del archivo se actualiza en cada acierto y se usa como orden LRU
+    al desalojar; la de modificación es la de escritura y se usa para el
+    vencimiento (ttl_seconds). Ambas sobreviven a reinicios y son
+    compartidas por todos los procesos que usan el mismo directorio.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: int = 0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._size_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Construye una clave estable (SHA-256) a partir de valores serializables a JSON"""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """Obtiene un valor de la caché, o None si no existe"""
+        path = self._path(key)
+        now = time.time()
+        try:
+            written_at = os.stat(path).st_mtime
+            if self.ttl_seconds > 0 and now - written_at > self.ttl_seconds:
+                self.delete(key)
+                with self._lock:
+                    self.expirations += 1
+                    self.misses += 1
+                return None
+
+            with open(path, "r", encoding="utf-8") as file:
+                value = json.load(file)
+            os.utime(path, (now, written_at))
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        """Guarda un valor en la caché (escritura atómica)"""
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(value, file, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error guardando en caché {self.directory}: {str(e)}")
+            return
+
+        with self._lock:
+            if self._size_bytes is None:
+                self._size_bytes = self._scan_size()
+            else:
+                self._size_bytes += size - previous_size
+            if self.max_bytes > 0 and self._size_bytes > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str):
+        """Elimina una entrada de la caché"""
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+
+        with self._lock:
+            if self._size_bytes is not None:
+                self._size_bytes -= size
+
+    def clear(self):
+        """Elimina todas las entradas de la caché"""
+        with self._lock:
+            for path, _, _, _ in self._entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size_bytes = 0
+
+    def _entries(self):
+        """Lista (ruta, tamaño, fecha de acceso, fecha de escritura) de las entradas en disco"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_atime, stat.st_mtime))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(entry[1] for entry in self._entries())
+
+    def _evict(self):
+        """
+        Elimina las entradas vencidas y luego las usadas hace más tiempo
+        hasta quedar en el 90% del límite
+        """
+        now = time.time()
+
+        def expired(entry) -> bool:
+            return self.ttl_seconds > 0 and now - entry[3] > self.ttl_seconds
+
+        entries = sorted(self._entries(), key=lambda entry: (not expired(entry), entry[2]))
+        size = sum(entry[1] for entry in entries)
+        target = int(self.max_bytes * 0.9)
+
+        for entry in entries:
+            path, entry_size = entry[0], entry[1]
+            if size <= target and not expired(entry):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+            if expired(entry):
+                self.expirations += 1
+            else:
+                self.evictions += 1
+
+        self._size_bytes = size
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas de uso de la caché"""
+        with self._lock:
+            if self._size_bytes is None:
+                self._size_bytes = self._scan_size()
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size_bytes": self._size_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+            }
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional, List
+from typing import Optional, Dict, List
 from zoneinfo import ZoneInfo
 import os
 
@@ -23,12 +23,83 @@ class Settings(BaseSettings):
     # Llama/Ollama Settings
     OLLAMA_HOST: str
     OLLAMA_MODEL: str
+    OLLAMA_FAST_MODEL: str = ""  # Modelo chico que responde primero ("" = solo OLLAMA_MODEL)
+    LLM_MODEL_ROUTING: Dict[str, str] = {}  # Política por tipo de prompt o "extraction:<tipo>": tiered, fast o large
+    LLM_ESCALATION_CONFIDENCE: float = 0.7  # Confianza bajo la cual se repite la clasificación con OLLAMA_MODEL
+    LLM_ESCALATE_ON_MISSING_REQUIRED: bool = True  # Repetir con OLLAMA_MODEL si faltan atributos requeridos
+    OLLAMA_NUM_PARALLEL: int = 1  # Generaciones simultáneas: igual al OLLAMA_NUM_PARALLEL del servidor
+    LLM_SCHEDULER_MAX_IN_FLIGHT: int = 0  # Generaciones en curso a la vez (0 = OLLAMA_NUM_PARALLEL)
+    LLM_SCHEDULER_WEIGHTS: Dict[str, int] = {"interactive": 8, "normal": 2, "bulk": 1}  # Peso de cada carril
+    LLM_TIMEOUT_SECONDS: float = 120  # Tiempo máximo por generación (0 = sin límite)
+    OLLAMA_KEEP_ALIVE: str = "24h"  # Tiempo que Ollama mantiene el modelo cargado ("-1" = siempre)
+    LLM_WARMUP_ENABLED: bool = True  # Cargar el modelo al iniciar (y al detectar que se descargó)
+    LLM_CLASSIFICATION_CHARS: int = 3000  # Caracteres del documento usados para clasificar
+    LLM_EXTRACTION_CHARS: int = 4000  # Caracteres del documento usados para extraer datos
+    LLM_PROMPT_LAYOUT: str = "prefix"  # "prefix": documento al final (reusa la caché KV); "template": tal cual
+    LLM_TEXT_SELECTION: bool = True  # Enviar los bloques más relevantes para los campos en vez del comienzo
+    LLM_SOURCE_MAX_CHARS: int = 20000  # Texto del documento entre el que se eligen los bloques relevantes
+    LLM_MAP_REDUCE_ENABLED: bool = False  # Extraer los documentos largos por fragmentos en vez de seleccionar texto
+    LLM_MAP_REDUCE_OVERLAP_CHARS: int = 400  # Caracteres que se repiten entre fragmentos consecutivos
+    LLM_MAP_REDUCE_MAX_CHUNKS: int = 8
+    LLM_MAP_REDUCE_CONCURRENCY: int = 2  # Fragmentos de un mismo documento que se extraen a la vez
+    LLM_RULE_CLASSIFIER_ENABLED: bool = True  # Clasificar por reglas de palabras clave antes de consultar al modelo
+    LLM_RULE_CLASSIFIER_THRESHOLD: float = 0.8  # Confianza mínima de las reglas para no consultar al modelo
+    LLM_RULE_CLASSIFIER_CHARS: int = 1500  # Comienzo del documento que se evalúa con las reglas
+    LLM_RULE_CLASSIFIER_AUDIT_RATE: float = 0.05  # Fracción de lo clasificado por reglas que se verifica con el modelo
+    LLM_FISCAL_EXTRACTORS_ENABLED: bool = True  # Extraer CUIT, CAE, número de comprobante, etc. sin el modelo
+    LLM_COMBINED_CLASSIFICATION: bool = True  # Clasificar y extraer en una sola llamada (con fallback a dos)
+    LLM_STREAMING_ENABLED: bool = True  # Generar en streaming y cortar al cerrarse el objeto JSON
+    LLM_STRUCTURED_OUTPUT: bool = True  # Restringir las respuestas con el esquema JSON (format de Ollama)
+    LLM_REPAIR_ATTEMPTS: int = 1  # Pedidos de corrección cuando la respuesta no es el JSON esperado
+    LLM_CHARS_PER_TOKEN: float = 3.0  # Caracteres por token para estimar el tamaño de los prompts
+    LLM_NUM_CTX_MIN: int = 4096  # Contexto mínimo por generación (se duplica hasta cubrir prompt + respuesta)
+    LLM_NUM_CTX_MAX: int = 8192
+    LLM_NUM_PREDICT_MAX: int = 1024  # Tokens máximos de respuesta
+    LLM_LOG_TOKENS: bool = True  # Imprimir tokens estimados y reales de cada generación
+    LLM_CACHE_ENABLED: bool = True  # Caché de respuestas por (modelo, prompt renderizado, opciones)
+    LLM_CACHE_DIR: str = "./uploads/.cache/llm"
+    LLM_CACHE_MAX_MB: int = 128
+    LLM_CACHE_TTL_SECONDS: int = 7 * 24 * 3600  # Vencimiento de las respuestas (0 = sin vencimiento)
 
     # File Upload Settings
     UPLOAD_DIR: str
     MAX_FILE_SIZE: int
     ALLOWED_EXTENSIONS: set = {".pdf", ".png", ".jpg", ".jpeg"}
 
+    # OCR Settings
+    OCR_DPI: int = 300
+    OCR_RASTER_BACKEND: str = "pipe"  # pipe (pdftoppm por stdout, en escala de grises) o pdf2image (RGB)
+    OCR_LANG: str = "spa+eng"
+    OCR_ENGINE: str = "pytesseract"  # pytesseract o tesserocr (API en proceso)
+    OCR_ENGINE_POOL_SIZE: int = 2  # Handles de Tesseract precargados por proceso (tesserocr)
+    OCR_PREPROCESSING: str = "none"  # Perfil (none, fast, default) o pasos separados por coma
+    OCR_PREPROCESS_TARGET_DPI: int = 200  # DPI al que se reducen las imágenes en el paso "downscale"
+    OCR_TEXT_LAYER_BACKEND: str = "pdftotext"  # pdftotext (poppler), pypdf2 o pymupdf
+    OCR_TEXT_LAYER_LAYOUT: bool = True  # pdftotext -layout: conserva columnas de tablas
+    OCR_MIN_PAGE_TEXT_CHARS: int = 100  # Mínimo de texto para usar la capa de texto de una página
+    OCR_ADAPTIVE_DPI: bool = False  # OCR a OCR_LOW_DPI y re-rasterizado a OCR_DPI si la confianza es baja
+    OCR_LOW_DPI: int = 150
+    OCR_MIN_CONFIDENCE: float = 70.0  # Confianza media por palabra (0-100) para aceptar el DPI bajo
+    OCR_PARALLEL_ENABLED: bool = True
+    OCR_MAX_WORKERS: int = 0  # Tope global de procesos OCR (0 = cantidad de CPUs)
+    OCR_MAX_WORKERS_PER_DOCUMENT: int = 4  # Páginas en paralelo por documento
+    OCR_PAGE_WINDOW: int = 2  # Páginas rasterizadas a la vez en modo serial
+    OCR_MAX_PAGES: int = 100  # Páginas con OCR por documento (0 = sin límite)
+    OCR_MAX_RASTER_MEMORY_MB: int = 256  # Memoria de páginas rasterizadas por documento (0 = sin límite)
+    OCR_CACHE_ENABLED: bool = True
+    OCR_CACHE_DIR: str = "./uploads/.cache/ocr"
+    OCR_CACHE_MAX_MB: int = 512
+
+    # Pipeline Settings
+    PIPELINE_STREAMING_ENABLED: bool = True  # Clasificar durante el OCR y cortarlo al tener el texto necesario
+    PIPELINE_DEFER_REMAINING_PAGES: bool = True  # Completar en segundo plano las páginas no usadas (o descartarlas)
+
+    # Layout Template Settings
+    LAYOUT_TEMPLATES_ENABLED: bool = True  # Reutilizar tipo y ubicación de campos de documentos con el mismo diseño
+    LAYOUT_TEMPLATE_MIN_SIMILARITY: float = 0.7  # Similitud de diseño (Jaccard) mínima para usar una plantilla
+    LAYOUT_TEMPLATE_MIN_SAMPLES: int = 2  # Extracciones del modelo que confirman una plantilla antes de usarla
+    LAYOUT_TEMPLATE_AUDIT_RATE: float = 0.05  # Fracción de usos de plantillas que se verifica con el modelo
+
     # Timezone
     TIMEZONE: str
 
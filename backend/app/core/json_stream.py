@@ -0,0 +1,84 @@
+from typing import Any, Optional
+import json
+
+
+class JSONObjectScanner:
+    """
+    Detecta, sobre texto que llega por partes, el cierre del primer objeto
+    JSON de nivel superior
+
+    Ignora el texto previo a la primera llave (bloques ```json, frases
+    introductorias) y las llaves dentro de strings. Cuando la profundidad
+    vuelve a cero intenta interpretar el objeto: si es válido el escaneo
+    termina; si no, sigue buscando el próximo objeto.
+    """
+
+    def __init__(self):
+        self._buffer: list = []
+        self._length = 0
+        self._start: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.text: Optional[str] = None
+        self.value: Any = None
+
+    @property
+    def complete(self) -> bool:
+        return self.text is not None
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Agrega un fragmento de la respuesta
+
+        Args:
+            chunk: Texto recibido
+
+        Returns:
+            True si ya se cerró un objeto JSON válido (disponible en
+            `text` y `value`)
+        """
+        if self.complete:
+            return True
+
+        offset = self._length
+        self._buffer.append(chunk)
+        self._length += len(chunk)
+
+        for i, char in enumerate(chunk, start=offset):
+            if self._start is None:
+                if char == "{":
+                    self._start = i
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._try_parse(i + 1):
+                    return True
+
+        return False
+
+    def _try_parse(self, end: int) -> bool:
+        text = "".join(self._buffer)
+        self._buffer = [text]
+        candidate = text[self._start:end]
+        try:
+            self.value = json.loads(candidate)
+        except ValueError:
+            # Objeto mal formado: se descarta y se busca el siguiente
+            self._start = None
+            return False
+        self.text = candidate
+        return True
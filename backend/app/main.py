@@ -1,13 +1,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 import os
 
 from .core.config import settings
 from .core.database import engine, Base, SessionLocal
-from .api.routes import documents, comparisons, attributes, prompts
+from .api.routes import documents, comparisons, attributes, prompts, metrics
 from .services.prompt_service import PromptService
+from .services.ocr_service import shutdown_ocr_executor
+from .services.llama_service import llama_service
 
 # Configurar zona horaria
 os.environ['TZ'] = 'America/Argentina/Buenos_Aires'
@@ -93,6 +96,26 @@ app.include_router(
     tags=["prompts"]
 )
 
+app.include_router(
+    metrics.router,
+    prefix=f"{settings.API_V1_STR}/metrics",
+    tags=["metrics"]
+)
+
+
+@app.on_event("startup")
+async def warm_up_model():
+    """Carga el modelo en Ollama en segundo plano, sin demorar el arranque (ver /ready)"""
+    if settings.LLM_WARMUP_ENABLED:
+        llama_service.start_warm_up()
+
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    """Libera los procesos de OCR al detener la aplicación"""
+    llama_service.stop_warm_up()
+    shutdown_ocr_executor()
+
 
 @app.get("/")
 async def root():
@@ -110,6 +133,18 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness check: 200 si el modelo está cargado en Ollama, 503 si no
+
+    Pensado para que el balanceador no envíe tráfico a instancias que
+    pagarían la carga del modelo en la primera subida.
+    """
+    readiness = await llama_service.get_readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -81,3 +81,22 @@ class PromptTemplate(Base):
     variables = Column(JSON)  # Variables que el prompt puede usar: {text_content}, {document_type}, etc.
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class LayoutTemplate(Base):
+    """Modelo para diseños de documentos aprendidos (un proveedor con el mismo formato)"""
+    __tablename__ = "layout_templates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    fingerprint = Column(String(64), nullable=False, unique=True, index=True)  # Hash de los rasgos del primer documento
+    document_type = Column(String(100), nullable=False)
+    features = Column(JSON)  # Rasgos del diseño: palabras y estructura de las líneas del encabezado
+    field_locators = Column(JSON)  # Ubicación de cada campo (null = el campo no está en este diseño)
+    llm_fields = Column(JSON)  # Campos que se siguen pidiendo al modelo (listas, valores no ubicables)
+    samples = Column(Integer, default=1)  # Extracciones del modelo con que se aprendió o confirmó
+    hits = Column(Integer, default=0)  # Documentos procesados con la plantilla
+    failures = Column(Integer, default=0)  # Usos en que algún campo no se encontró (se usó el modelo)
+    compared_fields = Column(Integer, default=0)  # Campos comparados con la extracción del modelo
+    matched_fields = Column(Integer, default=0)  # Campos que coincidieron con la extracción del modelo
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
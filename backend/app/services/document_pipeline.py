@@ -0,0 +1,348 @@
+from sqlalchemy.orm import Session
+from typing import Optional, Dict, Any, List, Tuple
+import asyncio
+import random
+import threading
+import time
+
+from ..core.config import settings
+from .ocr_service import ocr_service, TextStream
+from .layout_templates import layout_template_store
+from .llama_service import llama_service
+
+
+async def _classify_timed(text_content: str, db: Session) -> Tuple[Dict[str, Any], float]:
+    """
+    Clasifica un texto y registra cuándo terminó
+
+    Returns:
+        Tupla (resultado de la clasificación, instante en que terminó)
+    """
+    return await llama_service.aclassify_document(text_content, db), time.perf_counter()
+
+
+class DocumentPipeline:
+    """
+    Procesa un documento superponiendo la extracción de texto con el LLM
+
+    El texto se consume página por página: la clasificación se lanza en
+    cuanto hay LLM_CLASSIFICATION_CHARS caracteres y el OCR se corta al
+    llegar al texto que usa la extracción (LLM_EXTRACTION_CHARS, o
+    LLM_SOURCE_MAX_CHARS con LLM_TEXT_SELECTION, que elige los bloques
+    relevantes de todo ese texto; con LLM_MAP_REDUCE_ENABLED, todo lo que
+    cubren los fragmentos).
+    Si el documento tiene el diseño de una plantilla aprendida
+    (LAYOUT_TEMPLATES_ENABLED), el tipo y los campos que la plantilla ubica
+    salen de ella y el modelo solo extrae el resto.
+    El OCR corre en hilos y el modelo se consulta con el cliente asíncrono,
+    de modo que el event loop queda libre durante todo el procesamiento.
+    Las páginas restantes se completan en segundo plano (para la caché)
+    o se descartan según PIPELINE_DEFER_REMAINING_PAGES.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            "documents": 0,
+            "early_exits": 0,
+            "deferred_pages": 0,
+            "time_to_first_classification": [],
+            "text_extraction_seconds": [],
+            "llm_seconds": {},
+            "map_reduce_seconds": [],
+            "map_reduce_coverage": [],
+        }
+
+    async def process(
+        self,
+        file_path: str,
+        file_extension: str,
+        db: Session,
+        preprocessing: Optional[str] = None,
+        document_type: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Extrae el texto de un documento, lo clasifica y extrae sus datos
+
+        Args:
+            file_path: Ruta al archivo
+            file_extension: Extensión del archivo (.pdf, .png, .jpg, etc.)
+            db: Sesión de base de datos
+            preprocessing: Perfil o pasos de preprocesamiento de imágenes
+            document_type: Tipo de documento conocido; si se indica no se clasifica
+
+        Returns:
+            Dict con text_content, classification (None si no se clasificó),
+            extracted_data, text_extraction (metadatos de extracción),
+            pipeline (tiempos) y stream (TextStream a completar con
+            complete_in_background, o None si ya terminó)
+
+        Raises:
+            ValueError: Si la extensión o el preprocesamiento no son válidos
+        """
+        started = time.perf_counter()
+        # Abrir el stream calcula el hash del archivo para la caché
+        stream = await asyncio.to_thread(
+            ocr_service.open_text_stream, file_path, file_extension, preprocessing
+        )
+
+        # En modo combinado la clasificación sale de la misma llamada que la
+        # extracción, así que no se adelanta con el texto parcial
+        combined = document_type is None and settings.LLM_COMBINED_CLASSIFICATION
+        required_chars = settings.LLM_SOURCE_MAX_CHARS if settings.LLM_TEXT_SELECTION \
+            else settings.LLM_EXTRACTION_CHARS
+        if settings.LLM_MAP_REDUCE_ENABLED:
+            required_chars = max(required_chars, settings.LLM_MAP_REDUCE_MAX_CHUNKS * settings.LLM_EXTRACTION_CHARS)
+        classification_task: Optional[asyncio.Task] = None
+        classified_at = None
+
+        try:
+            if settings.PIPELINE_STREAMING_ENABLED:
+                pages = iter(stream)
+                while await asyncio.to_thread(next, pages, None) is not None:
+                    text_length = len(stream.text.strip())
+                    if document_type is None and not combined and classification_task is None \
+                            and text_length >= settings.LLM_CLASSIFICATION_CHARS:
+                        classification_task = asyncio.create_task(_classify_timed(stream.text.strip(), db))
+                    if text_length >= required_chars:
+                        break
+            else:
+                await asyncio.to_thread(stream.complete)
+
+            text_extraction_seconds = time.perf_counter() - started
+            text_content = stream.text.strip()
+
+            if not text_content:
+                return {"text_content": "", "stream": None}
+
+            classification = None
+            llm_started = time.perf_counter()
+            # Solo se aprende de los documentos que clasifica el pipeline
+            learn = document_type is None
+            template, llm_mode, located = self._use_template(text_content, db, document_type)
+            if llm_mode is not None:
+                if classification_task is not None:
+                    classification_task.cancel()
+                if document_type is None:
+                    classification = {
+                        "document_type": template["document_type"],
+                        "confidence": template["similarity"],
+                        "reasoning": f"Plantilla de diseño #{template['id']} (similitud {template['similarity']})",
+                    }
+                    document_type = template["document_type"]
+                    classified_at = time.perf_counter()
+                if llm_mode == "template":
+                    extracted_data = await self._complete_template(text_content, document_type, template, located, db)
+                else:
+                    extracted_data = await llama_service.aextract_structured_data(text_content, document_type, db)
+            elif combined:
+                classification, extracted_data = await llama_service.aclassify_and_extract(text_content, db)
+                classified_at = time.perf_counter()
+                llm_mode = classification.pop("mode")
+                classification.pop("llm_seconds")
+            else:
+                if document_type is None:
+                    if classification_task is None:
+                        classification_task = asyncio.create_task(_classify_timed(text_content, db))
+                    classification, classified_at = await classification_task
+                    document_type = classification.get("document_type", "desconocido")
+                    llm_mode = "rules" if classification.pop("method", None) == "rules" else "two_call"
+                else:
+                    llm_mode = "extraction"
+
+                extracted_data = await llama_service.aextract_structured_data(text_content, document_type, db)
+            llm_seconds = time.perf_counter() - llm_started
+            map_reduce = extracted_data.pop("_map_reduce", None) if isinstance(extracted_data, dict) else None
+            if learn and llm_mode != "template":
+                self._learn_template(text_content, classification, extracted_data, template, db)
+
+        except BaseException:
+            if classification_task is not None:
+                classification_task.cancel()
+            stream.close()
+            raise
+
+        pipeline_metadata = {
+            "streaming": settings.PIPELINE_STREAMING_ENABLED,
+            "early_exit": not stream.finished,
+            "pages_extracted": stream.pages_done,
+            "text_extraction_seconds": round(text_extraction_seconds, 3),
+            "llm_mode": llm_mode,
+            "llm_seconds": round(llm_seconds, 3),
+        }
+        if map_reduce is not None:
+            pipeline_metadata["map_reduce"] = map_reduce
+        if classified_at is not None:
+            pipeline_metadata["time_to_first_classification"] = round(classified_at - started, 3)
+
+        if stream.finished:
+            text_extraction = stream.complete()
+            text_extraction.pop("text")
+        else:
+            text_extraction = {
+                "pages": stream.pages,
+                "remaining_pages_deferred": settings.PIPELINE_DEFER_REMAINING_PAGES,
+            }
+
+        self._record(pipeline_metadata)
+
+        return {
+            "text_content": text_content,
+            "classification": classification,
+            "extracted_data": extracted_data,
+            "text_extraction": text_extraction,
+            "pipeline": pipeline_metadata,
+            "stream": None if stream.finished else stream,
+        }
+
+    @staticmethod
+    def _use_template(
+        text_content: str,
+        db: Session,
+        document_type: Optional[str]
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Busca la plantilla de diseño de un documento y ubica sus campos
+
+        Returns:
+            Tupla (plantilla parecida o None, modo, datos ubicados). El modo es
+            "template" si la plantilla está confirmada y ubicó todos sus
+            campos, "template_audit" si además el documento se eligió para
+            verificarla con el modelo (LAYOUT_TEMPLATE_AUDIT_RATE; sin datos
+            ubicados) o None si el documento va al modelo
+        """
+        if not settings.LAYOUT_TEMPLATES_ENABLED:
+            return None, None, None
+        try:
+            template = layout_template_store.match(text_content, db, document_type)
+            if template is None or not template["confirmed"]:
+                return template, None, None
+            if random.random() < settings.LAYOUT_TEMPLATE_AUDIT_RATE:
+                return template, "template_audit", None
+            located, missing = layout_template_store.apply(template, text_content, db)
+        except Exception as e:
+            print(f"Error aplicando plantilla de diseño: {str(e)}")
+            return None, None, None
+        if missing:
+            return template, None, None
+        return template, "template", located
+
+    @staticmethod
+    async def _complete_template(
+        text_content: str,
+        document_type: str,
+        template: Dict[str, Any],
+        located: Dict[str, Any],
+        db: Session
+    ) -> Dict[str, Any]:
+        """Datos ubicados por la plantilla más los campos que la plantilla deja al modelo (ej: ítems)"""
+        if not template["llm_fields"]:
+            return located
+        llm_data = await llama_service.aextract_structured_data(
+            text_content, document_type, db, template["llm_fields"]
+        )
+        return {**located, **llm_data}
+
+    @staticmethod
+    def _learn_template(
+        text_content: str,
+        classification: Optional[Dict[str, Any]],
+        extracted_data: Dict[str, Any],
+        template: Optional[Dict[str, Any]],
+        db: Session
+    ):
+        """Crea o refuerza la plantilla de diseño del documento con la extracción del modelo"""
+        if not settings.LAYOUT_TEMPLATES_ENABLED or not classification:
+            return
+        document_type = classification.get("document_type")
+        if template is not None and template["document_type"] != document_type:
+            template = None
+        try:
+            layout_template_store.learn(db, text_content, document_type, extracted_data, template)
+        except Exception as e:
+            db.rollback()
+            print(f"Error aprendiendo plantilla de diseño: {str(e)}")
+
+    def complete_in_background(self, stream: Optional[TextStream]):
+        """
+        Completa (o descarta) las páginas que el pipeline no necesitó
+
+        Pensado para ejecutarse como tarea en segundo plano una vez enviada
+        la respuesta: el texto completo queda en la caché de OCR.
+        """
+        if stream is None or stream.finished:
+            return
+
+        if not settings.PIPELINE_DEFER_REMAINING_PAGES:
+            stream.close()
+            return
+
+        pages_before = stream.pages_done
+        try:
+            stream.complete()
+        except Exception as e:
+            print(f"Error completando extracción en segundo plano: {str(e)}")
+            stream.close()
+            return
+
+        with self._lock:
+            self._stats["deferred_pages"] += stream.pages_done - pages_before
+
+    def _record(self, pipeline_metadata: Dict[str, Any]):
+        with self._lock:
+            self._stats["documents"] += 1
+            if pipeline_metadata["early_exit"]:
+                self._stats["early_exits"] += 1
+            self._stats["text_extraction_seconds"].append(pipeline_metadata["text_extraction_seconds"])
+            if "time_to_first_classification" in pipeline_metadata:
+                self._stats["time_to_first_classification"].append(
+                    pipeline_metadata["time_to_first_classification"]
+                )
+            llm_seconds = self._stats["llm_seconds"].setdefault(pipeline_metadata["llm_mode"], [])
+            llm_seconds.append(pipeline_metadata["llm_seconds"])
+            if "map_reduce" in pipeline_metadata:
+                self._stats["map_reduce_seconds"].append(pipeline_metadata["map_reduce"]["seconds"])
+                self._stats["map_reduce_coverage"].append(pipeline_metadata["map_reduce"]["text_coverage"])
+
+            # Solo se conservan las últimas mediciones
+            for values in [self._stats["text_extraction_seconds"], self._stats["time_to_first_classification"],
+                           self._stats["map_reduce_seconds"], self._stats["map_reduce_coverage"],
+                           *self._stats["llm_seconds"].values()]:
+                del values[:-1000]
+
+    @staticmethod
+    def _summarize(values: List[float]) -> Dict[str, Any]:
+        values = sorted(values)
+        return {
+            "count": len(values),
+            "avg": round(sum(values) / len(values), 3) if values else None,
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))] if values else None,
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Estadísticas del pipeline (tiempos promedio y percentil 95)
+
+        llm_seconds se informa por modo (rules, combined, two_call, extraction,
+        template, template_audit) para comparar la latencia de la llamada
+        combinada con la de dos llamadas, con la de los documentos
+        clasificados por reglas y con la de los extraídos con una plantilla
+        de diseño.
+        map_reduce_* corresponden a los documentos extraídos por fragmentos.
+        """
+        with self._lock:
+            stats = {
+                "documents": self._stats["documents"],
+                "early_exits": self._stats["early_exits"],
+                "deferred_pages": self._stats["deferred_pages"],
+            }
+            for key in ("time_to_first_classification", "text_extraction_seconds",
+                        "map_reduce_seconds", "map_reduce_coverage"):
+                stats[key] = self._summarize(self._stats[key])
+            stats["llm_seconds"] = {
+                mode: self._summarize(values) for mode, values in self._stats["llm_seconds"].items()
+            }
+        return stats
+
+
+document_pipeline = DocumentPipeline()
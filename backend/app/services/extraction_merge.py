@@ -0,0 +1,115 @@
+from typing import Any, Dict, List, Tuple
+import json
+
+# Campos cuyo valor válido es el último que aparece (los totales están al
+# final del documento; antes puede haber subtotales por página)
+LAST_VALUE_FIELDS = {"monto_total", "monto", "total", "importe_total"}
+
+
+def split_into_chunks(text: str, chunk_chars: int, overlap_chars: int, max_chunks: int) -> Tuple[List[str], int]:
+    """
+    Divide un texto en fragmentos superpuestos, cortando en saltos de línea
+
+    Args:
+        text: Texto completo del documento
+        chunk_chars: Caracteres por fragmento
+        overlap_chars: Caracteres que cada fragmento repite del anterior
+            (para no partir un ítem o un total entre dos fragmentos)
+        max_chunks: Cantidad máxima de fragmentos
+
+    Returns:
+        Tupla (fragmentos en orden, caracteres del texto cubiertos por ellos)
+    """
+    chunks: List[str] = []
+    start = 0
+    end = 0
+    while start < len(text) and len(chunks) < max_chunks:
+        end = min(len(text), start + chunk_chars)
+        if end < len(text):
+            # Cortar en el último salto de línea de la segunda mitad del fragmento
+            newline = text.rfind("\n", start + chunk_chars // 2, end)
+            if newline != -1:
+                end = newline + 1
+        chunks.append(text[start:end])
+        if end >= len(text):
+            break
+        start = max(end - overlap_chars, start + 1)
+        # Empezar el fragmento siguiente al comienzo de una línea
+        newline = text.find("\n", start, end - 1)
+        if newline != -1:
+            start = newline + 1
+    return chunks, end
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _merge_lists(values: List[list]) -> list:
+    """
+    Concatena las listas de fragmentos consecutivos sin repetir los
+    elementos de la superposición
+
+    Solo se descartan los elementos del comienzo de cada lista que repiten
+    el final de la anterior (el texto repetido entre fragmentos); los
+    repetidos dentro de un mismo fragmento (ej: dos ítems iguales de una
+    factura) se conservan.
+    """
+    merged = []
+    previous: List[str] = []
+    for value in values:
+        keys = [json.dumps(item, sort_keys=True, ensure_ascii=False, default=str) for item in value]
+        overlap = next(
+            (size for size in range(min(len(previous), len(keys)), 0, -1) if previous[-size:] == keys[:size]),
+            0
+        )
+        merged.extend(value[overlap:])
+        previous = keys
+    return merged
+
+
+def _merge_values(key: str, values: List[Any], conflicts: List[str], path: str) -> Any:
+    present = [value for value in values if not _is_empty(value)]
+    if not present:
+        return values[0] if values else None
+
+    if all(isinstance(value, list) for value in present):
+        return _merge_lists(present)
+    if all(isinstance(value, dict) for value in present):
+        return _merge_dicts(present, conflicts, f"{path}.")
+
+    distinct = {json.dumps(value, sort_keys=True, ensure_ascii=False, default=str) for value in present}
+    if len(distinct) > 1:
+        conflicts.append(f"{path}")
+    return present[-1] if key in LAST_VALUE_FIELDS else present[0]
+
+
+def _merge_dicts(partials: List[Dict[str, Any]], conflicts: List[str], prefix: str = "") -> Dict[str, Any]:
+    keys = list(dict.fromkeys(key for partial in partials for key in partial))
+    return {
+        key: _merge_values(key, [partial[key] for partial in partials if key in partial], conflicts, prefix + key)
+        for key in keys
+    }
+
+
+def merge_extractions(partials: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Combina los datos extraídos de cada fragmento de un documento
+
+    Reglas por campo:
+
+    - Listas (ej: items): se concatenan en orden, sin repetir los elementos
+      de la superposición entre fragmentos consecutivos
+    - Objetos: se combinan campo por campo con estas mismas reglas
+    - Totales (LAST_VALUE_FIELDS): el último valor no nulo
+    - Resto (encabezados: número, fecha, emisor, ...): el primer valor no nulo
+
+    Args:
+        partials: Datos extraídos de cada fragmento, en orden (sin los que
+            fallaron)
+
+    Returns:
+        Tupla (datos combinados, campos con valores distintos entre fragmentos)
+    """
+    conflicts: List[str] = []
+    return _merge_dicts(partials, conflicts), conflicts
@@ -0,0 +1,275 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import re
+
+from .text_normalization import normalize_text, parse_number
+
+# Campos que se extraen con expresiones regulares, por nombre del campo a
+# extraer (del prompt o de primer nivel de un atributo configurable): el
+# valor fiscal que le corresponde
+FISCAL_FIELDS: Dict[str, str] = {
+    "cuit": "cuit_emisor",
+    "cuit_emisor": "cuit_emisor",
+    "cuit_proveedor": "cuit_emisor",
+    "cuit_vendedor": "cuit_emisor",
+    "cuit_exportador": "cuit_emisor",
+    "cuit_cliente": "cuit_receptor",
+    "cuit_receptor": "cuit_receptor",
+    "cuit_comprador": "cuit_receptor",
+    "cae": "cae",
+    "numero_cae": "cae",
+    "vencimiento_cae": "vencimiento_cae",
+    "fecha_vencimiento_cae": "vencimiento_cae",
+    "vto_cae": "vencimiento_cae",
+    "punto_venta": "punto_venta",
+    "numero_comprobante": "numero_comprobante",
+    "numero_factura": "numero_factura",
+    "letra": "letra",
+    "letra_factura": "letra",
+    "tipo_factura": "letra",
+    "codigo_comprobante": "codigo_comprobante",
+    "neto_gravado": "neto_gravado",
+    "importe_neto_gravado": "neto_gravado",
+    "iva": "iva",
+    "importe_iva": "iva",
+    "monto_iva": "iva",
+    "monto_total": "monto_total",
+    "importe_total": "monto_total",
+    "total": "monto_total",
+}
+
+# Códigos de comprobante de AFIP y su letra (facturas, notas de débito y
+# de crédito A/B/C/E/M, remito R)
+AFIP_VOUCHER_CODES = {
+    1: "A", 2: "A", 3: "A",
+    6: "B", 7: "B", 8: "B",
+    11: "C", 12: "C", 13: "C",
+    19: "E", 20: "E", 21: "E",
+    51: "M", 52: "M", 53: "M",
+    91: "R",
+}
+
+# Pesos del dígito verificador del CUIT/CUIL (módulo 11)
+CUIT_WEIGHTS = (5, 4, 3, 2, 7, 6, 5, 4, 3, 2)
+
+# Palabras que indican que un CUIT es el del receptor (en su línea o la anterior)
+RECEIVER_WORDS = re.compile(r"\b(?:cliente|senor(?:es)?|sr(?:es)?\b|receptor|comprador|destinatario|adquirente)")
+
+_NUMBER = r"(\d[\d.,]*\d|\d)"
+# Comienzo de una línea o de una columna (3 o más espacios, con pdftotext -layout)
+_CELL = r"(?:^|\s{3,})\W*"
+_NUMBER_PREFIX = r"\s*(?:\$|ars|usd|u\$s)?\s*:?\s*\$?\s*"
+_NUMBER_LABEL = r"n(?:ro|umero|°|o)?\.?\s*:?\s*"
+
+_CUIT = re.compile(r"(?<![\d-])(20|23|24|27|30|33|34)[- .]?(\d{8})[- .]?(\d)(?![\d-])")
+_CAE = re.compile(r"\bc\.?a\.?e\.?\s*(?:" + _NUMBER_LABEL + r")?:?\s*(\d{14})(?!\d)")
+_CAE_DUE = re.compile(
+    r"(?:\b(?:vto|venc(?:imiento)?)\.?\s*(?:de\s+|del\s+)?c\.?a\.?e\.?|\bc\.?a\.?e\.?\s*(?:vto|venc(?:imiento)?)\.?)"
+    r"\s*:?\s*(\d{2}[/-]\d{2}[/-]\d{4})"
+)
+_POINT_OF_SALE = re.compile(r"\bp(?:unto|to)\.?\s*(?:de\s+)?venta\s*:?\s*(?:" + _NUMBER_LABEL + r")?(\d{1,5})\b")
+_VOUCHER_NUMBER = re.compile(r"\bcomp(?:robante)?\.?\s*" + _NUMBER_LABEL + r"(\d{1,8})\b")
+_FULL_NUMBER = re.compile(r"(?<![\d-])(\d{4,5})\s*-\s*(\d{8})(?![\d-])")
+_LETTER = re.compile(
+    r"^\W*factura[ \t]+(?:de credito electronica[ \t]+(?:mipymes[ \t]+)?(?:\(fce\)[ \t]+)?)?([abcem])\b(?!\s*:)",
+    re.MULTILINE
+)
+_VOUCHER_CODE = re.compile(r"\bcod(?:igo)?\.?\s*(?:n\W?\s*)?(\d{1,3})\b")
+_NET = re.compile(_CELL + r"(?:importe\s+)?neto\s+gravado" + _NUMBER_PREFIX + _NUMBER, re.MULTILINE)
+_VAT = re.compile(
+    _CELL + r"(?:importe\s+)?iva\s+(\d{1,2}(?:[.,]\d{1,2})?)\s*%" + _NUMBER_PREFIX + _NUMBER, re.MULTILINE
+)
+_TOTAL = re.compile(
+    _CELL + r"(?:importe\s+)?total(?:\s+(?:general|a pagar|facturado))?" + _NUMBER_PREFIX + _NUMBER + r"(?!\s*%)",
+    re.MULTILINE
+)
+
+
+def valid_cuit(digits: str) -> bool:
+    """
+    Verifica el dígito verificador de un CUIT/CUIL
+
+    Args:
+        digits: Los 11 dígitos, sin guiones
+
+    Returns:
+        True si el último dígito coincide con el calculado (módulo 11)
+    """
+    if not re.fullmatch(r"\d{11}", digits):
+        return False
+    remainder = 11 - sum(int(digit) * weight for digit, weight in zip(digits, CUIT_WEIGHTS)) % 11
+    check = {11: 0, 10: None}.get(remainder, remainder)
+    return check is not None and check == int(digits[10])
+
+
+def _valid_date(text: str) -> bool:
+    try:
+        datetime.strptime(text.replace("-", "/"), "%d/%m/%Y")
+        return True
+    except ValueError:
+        return False
+
+
+def _cuits(lines: List[str]) -> Tuple[Optional[str], Optional[str], int]:
+    """
+    CUIT del emisor y del receptor
+
+    El del receptor es el primero con una palabra como "cliente" o
+    "señor" en su línea o en la anterior; si ninguno la tiene, el segundo
+    CUIT distinto. El del emisor es el primero que no es del receptor.
+
+    Returns:
+        Tupla (CUIT del emisor, CUIT del receptor, CUITs descartados por
+        el dígito verificador)
+    """
+    found: List[Tuple[str, bool]] = []
+    rejected = 0
+    for i, line in enumerate(lines):
+        for match in _CUIT.finditer(line):
+            digits = "".join(match.groups())
+            if not valid_cuit(digits):
+                rejected += 1
+                continue
+            cuit = f"{digits[:2]}-{digits[2:10]}-{digits[10]}"
+            context = line[:match.start()] + " " + (lines[i - 1] if i > 0 else "")
+            found.append((cuit, bool(RECEIVER_WORDS.search(context))))
+
+    distinct = list(dict.fromkeys(cuit for cuit, _ in found))
+    receiver = next((cuit for cuit, is_receiver in found if is_receiver), None)
+    if receiver is None and len(distinct) > 1:
+        receiver = distinct[1]
+    issuer = next((cuit for cuit in distinct if cuit != receiver), None)
+    return issuer, receiver, rejected
+
+
+def _voucher_number(text: str) -> Tuple[Optional[int], Optional[int]]:
+    """Punto de venta y número de comprobante (rotulados o como 0001-00012345)"""
+    point_of_sale = _POINT_OF_SALE.search(text)
+    number = _VOUCHER_NUMBER.search(text)
+    if point_of_sale and number:
+        return int(point_of_sale.group(1)), int(number.group(1))
+    full = _FULL_NUMBER.search(text)
+    if full:
+        return int(full.group(1)), int(full.group(2))
+    return None, None
+
+
+def _totals(text: str) -> Tuple[Dict[str, float], int]:
+    """
+    Neto gravado, IVA (suma de las alícuotas) y total del comprobante
+
+    Se toma la última aparición de cada uno (antes puede haber subtotales
+    por página). Si el total es menor que neto + IVA (las percepciones e
+    impuestos solo pueden sumar) se descartan los tres.
+
+    Returns:
+        Tupla (importes encontrados, importes descartados)
+    """
+    totals: Dict[str, float] = {}
+    net = [parse_number(match.group(1)) for match in _NET.finditer(text)]
+    if net and net[-1] is not None:
+        totals["neto_gravado"] = net[-1]
+
+    vat_by_rate: Dict[str, float] = {}
+    for match in _VAT.finditer(text):
+        amount = parse_number(match.group(2))
+        if amount is not None:
+            vat_by_rate[match.group(1).replace(",", ".")] = amount
+    if vat_by_rate:
+        totals["iva"] = round(sum(vat_by_rate.values()), 2)
+
+    total = [parse_number(match.group(1)) for match in _TOTAL.finditer(text)]
+    if total and total[-1] is not None:
+        totals["monto_total"] = total[-1]
+
+    taxed = totals.get("neto_gravado", 0) + totals.get("iva", 0)
+    if "monto_total" in totals and totals["monto_total"] + 0.01 < taxed:
+        return {}, len(totals)
+    return totals, 0
+
+
+def fiscal_values(text: str) -> Tuple[Dict[str, Any], int]:
+    """
+    Valores fiscales argentinos que tienen un formato fijo
+
+    CUIT (con dígito verificador), CAE (14 dígitos) y su vencimiento (fecha
+    válida), punto de venta y número de comprobante, letra y código de
+    comprobante de AFIP (deben coincidir entre sí) y, si el documento tiene
+    CAE o código de AFIP, neto gravado, IVA y total.
+
+    Args:
+        text: Texto del documento
+
+    Returns:
+        Tupla (valores encontrados y válidos, por nombre de FISCAL_FIELDS;
+        valores que coincidieron con el formato pero no pasaron la
+        validación)
+    """
+    normalized = normalize_text(text)
+    lines = normalized.splitlines()
+    values: Dict[str, Any] = {}
+
+    issuer, receiver, rejected = _cuits(lines)
+    if issuer:
+        values["cuit_emisor"] = issuer
+    if receiver:
+        values["cuit_receptor"] = receiver
+
+    cae = _CAE.search(normalized)
+    if cae:
+        values["cae"] = cae.group(1)
+    cae_due = _CAE_DUE.search(normalized)
+    if cae_due:
+        if _valid_date(cae_due.group(1)):
+            values["vencimiento_cae"] = cae_due.group(1)
+        else:
+            rejected += 1
+
+    point_of_sale, number = _voucher_number(normalized)
+    if point_of_sale and number:
+        values["punto_venta"] = str(point_of_sale).zfill(4)
+        values["numero_comprobante"] = str(number).zfill(8)
+        values["numero_factura"] = f"{values['punto_venta']}-{values['numero_comprobante']}"
+
+    code = next(
+        (int(match.group(1)) for match in _VOUCHER_CODE.finditer(normalized)
+         if int(match.group(1)) in AFIP_VOUCHER_CODES),
+        None
+    )
+    letter = _LETTER.search(normalized)
+    letter = letter.group(1).upper() if letter else None
+    if code is not None and letter is not None and AFIP_VOUCHER_CODES[code] != letter:
+        rejected += 2
+    else:
+        if code is not None:
+            values["codigo_comprobante"] = str(code).zfill(3)
+        if letter or code is not None:
+            values["letra"] = letter or AFIP_VOUCHER_CODES[code]
+
+    if "cae" in values or "codigo_comprobante" in values:
+        totals, rejected_totals = _totals(normalized)
+        values.update(totals)
+        rejected += rejected_totals
+
+    return values, rejected
+
+
+def extract_fiscal_fields(text: str, fields: List[str]) -> Tuple[Dict[str, Any], int]:
+    """
+    Extrae los campos fiscales de una lista de campos a extraer
+
+    Args:
+        text: Texto del documento
+        fields: Campos a extraer (los que no están en FISCAL_FIELDS se ignoran)
+
+    Returns:
+        Tupla (valores de los campos encontrados, valores descartados por
+        la validación)
+    """
+    if not any(field in FISCAL_FIELDS for field in fields):
+        return {}, 0
+    values, rejected = fiscal_values(text)
+    return {
+        field: values[FISCAL_FIELDS[field]] for field in fields
+        if field in FISCAL_FIELDS and FISCAL_FIELDS[field] in values
+    }, rejected
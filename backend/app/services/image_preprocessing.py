@@ -0,0 +1,253 @@
+from PIL import Image
+from typing import Optional, Tuple
+import numpy as np
+
+from ..core.config import settings
+
+
+# Pasos disponibles, en el orden en que se aplican
+PREPROCESSING_STEPS = ["grayscale", "downscale", "binarize", "deskew", "crop"]
+
+# Perfiles con nombre que se pueden usar en lugar de la lista de pasos
+PREPROCESSING_PROFILES = {
+    "none": [],
+    "fast": ["grayscale", "downscale"],
+    "default": ["grayscale", "downscale", "binarize", "deskew", "crop"],
+}
+
+# Ancho de página asumido (en pulgadas, A4) para estimar el DPI de fotos sin metadatos
+ASSUMED_PAGE_WIDTH_IN = 8.27
+
+
+def parse_preprocessing_steps(value: Optional[str]) -> Tuple[str, ...]:
+    """
+    Interpreta una selección de preprocesamiento
+
+    Args:
+        value: Nombre de perfil (none, fast, default) o lista de pasos
+            separados por coma (ej: "grayscale,deskew"). Si es None se
+            usa OCR_PREPROCESSING.
+
+    Returns:
+        Tupla de pasos en orden de aplicación
+
+    Raises:
+        ValueError: Si el perfil o algún paso no existe
+    """
+    if value is None:
+        value = settings.OCR_PREPROCESSING
+
+    value = value.strip().lower()
+    if value in PREPROCESSING_PROFILES:
+        return tuple(PREPROCESSING_PROFILES[value])
+
+    steps = {step.strip() for step in value.split(",") if step.strip()}
+    unknown = steps - set(PREPROCESSING_STEPS)
+    if unknown:
+        raise ValueError(
+            f"Preprocesamiento no soportado: {', '.join(sorted(unknown))}. "
+            f"Use un perfil ({', '.join(PREPROCESSING_PROFILES)}) o pasos ({', '.join(PREPROCESSING_STEPS)})"
+        )
+
+    return tuple(step for step in PREPROCESSING_STEPS if step in steps)
+
+
+def estimate_dpi(image: Image.Image) -> float:
+    """
+    Estima el DPI de una imagen
+
+    Usa los metadatos de la imagen si existen; las fotos de celular suelen
+    no tenerlos (o informar 72), así que en ese caso se asume que el lado
+    corto de la imagen corresponde al ancho de una página A4.
+    """
+    dpi = image.info.get("dpi")
+    if dpi and dpi[0] and float(dpi[0]) > 72:
+        return float(dpi[0])
+    return min(image.size) / ASSUMED_PAGE_WIDTH_IN
+
+
+def _to_grayscale(image: Image.Image) -> Image.Image:
+    return image if image.mode == "L" else image.convert("L")
+
+
+def _downscale(image: Image.Image, source_dpi: float) -> Image.Image:
+    """Reduce la imagen al DPI objetivo (OCR_PREPROCESS_TARGET_DPI); nunca la agranda"""
+    target_dpi = settings.OCR_PREPROCESS_TARGET_DPI
+    if source_dpi <= target_dpi:
+        return image
+
+    scale = target_dpi / source_dpi
+    size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def _box_sum(values: np.ndarray, half: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Suma de cada ventana de (2 * half + 1) píxeles de lado, con imagen integral
+
+    Returns:
+        Tupla (suma de la ventana, área efectiva de la ventana en los bordes)
+    """
+    height, width = values.shape
+    integral = np.zeros((height + 1, width + 1), dtype=np.int64)
+    integral[1:, 1:] = values.cumsum(axis=0, dtype=np.int64).cumsum(axis=1)
+
+    rows = np.arange(height)
+    cols = np.arange(width)
+    y0 = np.clip(rows - half, 0, height)[:, None]
+    y1 = np.clip(rows + half + 1, 0, height)[:, None]
+    x0 = np.clip(cols - half, 0, width)[None, :]
+    x1 = np.clip(cols + half + 1, 0, width)[None, :]
+
+    window_sum = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+    return window_sum, (y1 - y0) * (x1 - x0)
+
+
+def _binarize(gray: np.ndarray) -> np.ndarray:
+    """
+    Umbral adaptativo por media local (método de Bradley)
+
+    La media de cada ventana se calcula con una imagen integral, de modo que
+    el costo es lineal en la cantidad de píxeles sin importar la ventana.
+    Un píxel es tinta si es un 15% más oscuro que la media de su entorno.
+    """
+    half = max(7, min(gray.shape) // 32)
+    window_sum, window_area = _box_sum(gray, half)
+
+    ink = gray * window_area * 100 < window_sum * 85
+    return np.where(ink, 0, 255).astype(np.uint8)
+
+
+def _content_mask(ink: np.ndarray) -> np.ndarray:
+    """
+    Quita de la máscara de tinta los bordes oscuros (del escaneo o la mesa
+    alrededor del papel en una foto), que de lo contrario dominan la
+    estimación de inclinación y el recorte
+
+    Se descartan las filas/columnas casi totalmente oscuras y las zonas
+    sólidas: ventanas con más del 95% de tinta, que los trazos de texto no
+    llegan a llenar, junto con su entorno inmediato.
+    """
+    half = max(4, min(ink.shape) // 200)
+    ink_sum, area = _box_sum(ink.astype(np.uint8), half)
+    solid = ink_sum * 100 > area * 95
+    near_solid, _ = _box_sum(solid.astype(np.uint8), half)
+
+    content = ink & (near_solid == 0)
+    content[ink.mean(axis=1) > 0.5, :] = False
+    content[:, ink.mean(axis=0) > 0.5] = False
+    return content
+
+
+def _estimate_skew(ink: np.ndarray, max_angle: float = 5.0) -> float:
+    """
+    Estima cuántos grados (antihorario) hay que rotar la imagen para
+    enderezar el texto, por perfil de proyección
+
+    Para cada ángulo candidato se proyectan las coordenadas de los píxeles
+    de tinta sobre el eje vertical rotado; con el ángulo correcto las
+    líneas de texto quedan concentradas y la varianza del histograma es
+    máxima. Se busca primero con paso de 1° y luego se refina a 0.1°.
+    """
+    # Submuestrear a ~1000 px de ancho: sobra para estimar el ángulo
+    step = max(1, ink.shape[1] // 1000)
+    ys, xs = np.nonzero(_content_mask(ink[::step, ::step]))
+    if len(ys) < 100:
+        return 0.0
+    ys = ys.astype(np.float64)
+    xs = xs.astype(np.float64)
+
+    def score(angle: float) -> float:
+        radians = np.deg2rad(angle)
+        projected = ys * np.cos(radians) - xs * np.sin(radians)
+        histogram = np.bincount((projected - projected.min()).astype(np.int64))
+        return float(np.sum(np.diff(histogram.astype(np.float64)) ** 2))
+
+    coarse = np.arange(-max_angle, max_angle + 0.001, 1.0)
+    best = max(coarse, key=score)
+    fine = np.arange(best - 1.0, best + 1.001, 0.1)
+    return float(max(fine, key=score))
+
+
+def _deskew(image: Image.Image, ink: np.ndarray) -> Image.Image:
+    angle = _estimate_skew(ink)
+    if abs(angle) < 0.1:
+        return image
+    fill = 255 if image.mode == "L" else (255, 255, 255)
+    return image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+
+
+def _crop_borders(image: Image.Image, ink: np.ndarray, margin: int = 10) -> Image.Image:
+    """
+    Recorta los márgenes sin contenido
+
+    Los bordes oscuros se tratan como fondo (ver _content_mask) para no
+    incluirlos en el recorte.
+    """
+    content = _content_mask(ink)
+    rows = np.nonzero(content.mean(axis=1) > 0.001)[0]
+    cols = np.nonzero(content.mean(axis=0) > 0.001)[0]
+    if len(rows) == 0 or len(cols) == 0:
+        return image
+
+    box = (
+        max(0, int(cols[0]) - margin),
+        max(0, int(rows[0]) - margin),
+        min(image.width, int(cols[-1]) + margin + 1),
+        min(image.height, int(rows[-1]) + margin + 1),
+    )
+    return image.crop(box)
+
+
+def _ink_mask(image: Image.Image) -> np.ndarray:
+    """Máscara booleana de tinta (umbral global) para imágenes sin binarizar"""
+    gray = np.asarray(_to_grayscale(image), dtype=np.float32)
+    return gray < gray.mean() * 0.75
+
+
+def preprocess_image(
+    image: Image.Image,
+    steps: Tuple[str, ...],
+    source_dpi: Optional[float] = None
+) -> Image.Image:
+    """
+    Prepara una imagen para OCR
+
+    Args:
+        image: Imagen original
+        steps: Pasos a aplicar (ver parse_preprocessing_steps)
+        source_dpi: Resolución de la imagen, si se conoce (ej: páginas de PDF
+            rasterizadas); si no, se estima
+
+    Returns:
+        Imagen preprocesada (la original si no hay pasos)
+    """
+    if not steps:
+        return image
+
+    if "grayscale" in steps or "binarize" in steps:
+        image = _to_grayscale(image)
+
+    if "downscale" in steps:
+        image = _downscale(image, source_dpi or estimate_dpi(image))
+
+    ink: Optional[np.ndarray] = None
+    if "binarize" in steps:
+        binary = _binarize(np.asarray(image, dtype=np.uint8))
+        image = Image.fromarray(binary, mode="L")
+        ink = binary == 0
+
+    if "deskew" in steps:
+        if ink is None:
+            ink = _ink_mask(image)
+        rotated = _deskew(image, ink)
+        if rotated is not image:
+            image = rotated
+            ink = None
+
+    if "crop" in steps:
+        if ink is None:
+            ink = np.asarray(image, dtype=np.uint8) < 128 if image.mode == "L" else _ink_mask(image)
+        image = _crop_borders(image, ink)
+
+    return image
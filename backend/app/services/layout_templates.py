@@ -0,0 +1,541 @@
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import re
+import threading
+import time
+
+from ..core.config import settings
+from ..models.document import LayoutTemplate
+from .text_normalization import normalize_text, parse_number
+
+# Líneas no vacías del comienzo del documento que definen su diseño
+LAYOUT_HEADER_LINES = 40
+
+# Palabras de una línea que forman su etiqueta (ej: "fecha de emision")
+LABEL_WORDS = 3
+
+# Segundos entre recargas de las plantillas desde la BD (otros procesos
+# pueden haber aprendido plantillas nuevas)
+RELOAD_SECONDS = 60
+
+_WORD = re.compile(r"[^\W\d_]{2,}")
+_COLUMN_GAP = re.compile(r"\s{3,}")
+_NUMBER = r"\d[\d.,]*\d|\d"
+
+
+def layout_features(text: str) -> List[str]:
+    """
+    Rasgos del diseño de un documento
+
+    De las primeras LAYOUT_HEADER_LINES líneas: las palabras (sin números
+    ni valores) y la estructura de cada línea: sus primeras palabras, si
+    tiene números, si tiene columnas (3 o más espacios, con pdftotext
+    -layout) y su sangría. Dos documentos del mismo proveedor comparten casi
+    todos los rasgos aunque cambien el cliente, los ítems y los importes.
+
+    Args:
+        text: Texto del documento
+
+    Returns:
+        Rasgos ordenados, sin repetir
+    """
+    lines = [line.rstrip() for line in text.splitlines() if line.strip()][:LAYOUT_HEADER_LINES]
+    features = set()
+    for line in lines:
+        normalized = normalize_text(line)
+        words = _WORD.findall(normalized)
+        features.update(words)
+        if not words:
+            continue
+        shape = " ".join(words[:LABEL_WORDS])
+        if re.search(r"\d", normalized):
+            shape += " #"
+        if _COLUMN_GAP.search(line.strip()):
+            shape += " |"
+        shape += f" @{(len(line) - len(line.lstrip())) // 8}"
+        features.add(f"L:{shape}")
+    return sorted(features)
+
+
+def layout_fingerprint(features: List[str]) -> str:
+    return hashlib.sha1("\n".join(features).encode("utf-8")).hexdigest()
+
+
+def _similarity(a: frozenset, b: frozenset) -> float:
+    """Índice de Jaccard entre dos conjuntos de rasgos"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _flatten(data: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Objetos anidados a claves con notación de punto (las listas quedan como valor)"""
+    flat: Dict[str, Any] = {}
+    for key, value in data.items():
+        if isinstance(value, dict) and value:
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def _unflatten(flat: Dict[str, Any]) -> Dict[str, Any]:
+    data: Dict[str, Any] = {}
+    for key, value in flat.items():
+        node = data
+        parts = key.split(".")
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return data
+
+
+def _label(text: str) -> str:
+    """Últimas LABEL_WORDS palabras de un texto, sin acentos y en minúsculas"""
+    return " ".join(_WORD.findall(normalize_text(text))[-LABEL_WORDS:])
+
+
+def _label_lines(normalized_lines: List[str], label: str) -> List[int]:
+    """Índices de las líneas que contienen la etiqueta (como palabras completas)"""
+    pattern = re.compile(r"(?<!\w)" + r"\W+".join(map(re.escape, label.split())) + r"(?!\w)")
+    return [i for i, line in enumerate(normalized_lines) if pattern.search(line)]
+
+
+def _number_variants(value: float) -> List[str]:
+    """Formas en que un importe puede aparecer en el texto (34.152,25, 34,152.25, 34152.25, ...)"""
+    fixed = f"{value:,.2f}"
+    variants = [
+        fixed.replace(",", "_").replace(".", ",").replace("_", "."),
+        fixed,
+        fixed.replace(",", ""),
+        fixed.replace(",", "").replace(".", ","),
+    ]
+    if float(value).is_integer():
+        variants.insert(0, str(int(value)))
+    return list(dict.fromkeys(variants))
+
+
+def _value_shape(matched: str) -> str:
+    """Patrón de un valor con números: dígitos y letras variables, separadores fijos"""
+    parts = []
+    for token in re.findall(r"\d+|[^\W\d_]+|\s+|.", matched):
+        if token.isdigit():
+            parts.append(r"\d+")
+        elif token.isspace():
+            parts.append(r"\s+")
+        elif token.isalpha():
+            parts.append(r"[^\W\d_]+")
+        else:
+            parts.append(re.escape(token))
+    return "".join(parts)
+
+
+def _segment_at(line: str, column: int) -> Optional[str]:
+    """Columna de una línea (separadas por 3 o más espacios) más cercana a `column`"""
+    segments = [(match.start(), match.group(0)) for match in re.finditer(r"\S+(?:\s{1,2}\S+)*", line)]
+    if not segments:
+        return None
+    return min(segments, key=lambda segment: abs(segment[0] - column))[1]
+
+
+def _learn_locator(lines: List[str], normalized_lines: List[str], value: Any) -> Optional[Dict[str, Any]]:
+    """
+    Ubicación de un valor extraído por el modelo en el texto
+
+    El valor se busca en el texto (los importes en sus distintos formatos).
+    La etiqueta es lo que lo precede en su línea o, si está solo, la línea
+    anterior (encabezado de una tabla); se guarda además la columna y cuál
+    de las líneas con esa etiqueta es (desde el final si es de la segunda
+    mitad: los totales van después de los subtotales).
+
+    Returns:
+        Localizador, o None si el valor no está en el texto o no tiene etiqueta
+    """
+    is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+    candidates = _number_variants(float(value)) if is_number else [str(value).strip()]
+
+    for candidate in candidates:
+        if not candidate:
+            continue
+        pattern = re.compile(
+            r"(?<!\w)" + r"\s+".join(map(re.escape, candidate.split())) + r"(?!\w)", re.IGNORECASE
+        )
+        for i, line in enumerate(lines):
+            match = pattern.search(line)
+            if not match:
+                continue
+            label, offset = _label(line[:match.start()]), 0
+            if not label and i > 0:
+                label, offset = _label(lines[i - 1]), 1
+            if not label:
+                continue
+
+            label_lines = _label_lines(normalized_lines, label)
+            if i - offset not in label_lines:
+                continue
+            occurrence = label_lines.index(i - offset)
+            if occurrence >= len(label_lines) / 2:
+                occurrence -= len(label_lines)
+
+            matched = match.group(0)
+            if is_number:
+                kind, value_pattern = "number", _NUMBER
+            elif re.search(r"\d", matched):
+                kind, value_pattern = "pattern", _value_shape(matched)
+            else:
+                kind, value_pattern = "text", None
+            return {
+                "label": label,
+                "offset": offset,
+                "occurrence": occurrence,
+                "column": match.start(),
+                "kind": kind,
+                "pattern": value_pattern,
+                "integer": is_number and isinstance(value, int),
+            }
+    return None
+
+
+def _locate(lines: List[str], normalized_lines: List[str], locator: Dict[str, Any]) -> Optional[Any]:
+    """Valor de un campo según su localizador, o None si no se encuentra"""
+    label_lines = _label_lines(normalized_lines, locator["label"])
+    occurrence = locator["occurrence"]
+    if not -len(label_lines) <= occurrence < len(label_lines):
+        return None
+    i = label_lines[occurrence] + locator["offset"]
+    if i >= len(lines):
+        return None
+
+    line = lines[i]
+    if locator["offset"] == 0:
+        # Lo que sigue a la etiqueta (el texto normalizado conserva las
+        # posiciones salvo caracteres que se descomponen, como ligaduras)
+        normalized = normalized_lines[i]
+        label_match = re.search(r"\W+".join(map(re.escape, locator["label"].split())), normalized)
+        if label_match and len(normalized) == len(line):
+            line = line[label_match.end():]
+        else:
+            line = line[max(0, locator["column"] - 1):]
+
+    if locator["kind"] == "text":
+        if locator["offset"] == 0:
+            text = _COLUMN_GAP.split(line.strip(" \t:.-"))[0].strip()
+        else:
+            text = _segment_at(line, locator["column"])
+        return text or None
+
+    matches = list(re.finditer(locator["pattern"], line))
+    if not matches:
+        return None
+    # En la línea de la etiqueta, el primer valor; debajo de un encabezado, el de la misma columna
+    match = matches[0] if locator["offset"] == 0 else min(matches, key=lambda m: abs(m.start() - locator["column"]))
+    if locator["kind"] != "number":
+        return match.group(0)
+    number = parse_number(match.group(0))
+    if number is not None and locator.get("integer") and number.is_integer():
+        return int(number)
+    return number
+
+
+def _same_value(located: Any, expected: Any) -> bool:
+    if isinstance(expected, (int, float)) and not isinstance(expected, bool):
+        return isinstance(located, (int, float)) and abs(located - expected) < 0.01
+    return " ".join(str(located or "").split()).casefold() == " ".join(str(expected or "").split()).casefold()
+
+
+def learn_template(text: str, data: Dict[str, Any]) -> Tuple[Dict[str, Optional[Dict[str, Any]]], List[str]]:
+    """
+    Localizadores de los campos de una extracción del modelo
+
+    Los campos nulos se guardan como ausentes (None). Las listas, los
+    valores que no aparecen en el texto y los que no tienen etiqueta se
+    siguen pidiendo al modelo (por su campo de primer nivel).
+
+    Args:
+        text: Texto del documento
+        data: Datos extraídos por el modelo
+
+    Returns:
+        Tupla (localizadores por clave con notación de punto, campos de
+        primer nivel que se piden al modelo)
+    """
+    lines = text.splitlines()
+    normalized_lines = [normalize_text(line) for line in lines]
+    locators: Dict[str, Optional[Dict[str, Any]]] = {}
+    llm_fields: List[str] = []
+
+    for key, value in _flatten(data).items():
+        if key.startswith("_"):
+            continue
+        if value is None or value == "" or value == {}:
+            locators[key] = None
+            continue
+        locator = None
+        if not isinstance(value, (list, bool)):
+            locator = _learn_locator(lines, normalized_lines, value)
+        if locator is None:
+            llm_fields.append(key.split(".")[0])
+        else:
+            locators[key] = locator
+
+    llm_fields = list(dict.fromkeys(llm_fields))
+    # Si el modelo devuelve un objeto completo, no se mezcla con partes ubicadas
+    locators = {key: locator for key, locator in locators.items() if key.split(".")[0] not in llm_fields}
+    return locators, llm_fields
+
+
+def apply_template(text: str, locators: Dict[str, Optional[Dict[str, Any]]]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Extrae los campos de un documento con los localizadores de su plantilla
+
+    Args:
+        text: Texto del documento
+        locators: Localizadores (ver learn_template)
+
+    Returns:
+        Tupla (datos extraídos, con objetos anidados; claves de los campos
+        que no se encontraron)
+    """
+    lines = text.splitlines()
+    normalized_lines = [normalize_text(line) for line in lines]
+    values: Dict[str, Any] = {}
+    missing: List[str] = []
+    for key, locator in locators.items():
+        if locator is None:
+            values[key] = None
+            continue
+        value = _locate(lines, normalized_lines, locator)
+        if value is None:
+            missing.append(key)
+        values[key] = value
+    return _unflatten(values), missing
+
+
+class LayoutTemplateStore:
+    """
+    Plantillas de diseño aprendidas de las extracciones del modelo
+
+    Cada proveedor con un formato fijo genera una plantilla: el tipo de
+    documento y la ubicación de cada campo. Un documento nuevo se compara
+    con las plantillas por sus rasgos de diseño (ver layout_features); si
+    se parece lo suficiente a una confirmada, el tipo y los campos salen de
+    la plantilla sin consultar al modelo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._templates: List[Dict[str, Any]] = []
+        self._loaded_at: Optional[float] = None
+        self._stats = {"lookups": 0, "matches": 0, "hits": 0, "failures": 0, "learned": 0}
+
+    def _cached(self, db: Session) -> List[Dict[str, Any]]:
+        """Plantillas en memoria, recargadas de la BD cada RELOAD_SECONDS"""
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < RELOAD_SECONDS:
+                return self._templates
+        templates = [self._entry(template) for template in db.query(LayoutTemplate).all()]
+        with self._lock:
+            self._templates = templates
+            self._loaded_at = time.monotonic()
+        return templates
+
+    @staticmethod
+    def _entry(template: LayoutTemplate) -> Dict[str, Any]:
+        return {
+            "id": template.id,
+            "document_type": template.document_type,
+            "features": frozenset(template.features or []),
+            "field_locators": template.field_locators or {},
+            "llm_fields": template.llm_fields or [],
+            "samples": template.samples or 0,
+        }
+
+    def _replace(self, template: LayoutTemplate):
+        entry = self._entry(template)
+        with self._lock:
+            self._templates = [item for item in self._templates if item["id"] != entry["id"]] + [entry]
+
+    def match(self, text: str, db: Session, document_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Plantilla más parecida a un documento
+
+        Args:
+            text: Texto del documento
+            db: Sesión de base de datos
+            document_type: Tipo conocido del documento (solo se buscan
+                plantillas de ese tipo)
+
+        Returns:
+            Plantilla (con "similarity" y "confirmed", que indica si ya se
+            puede usar sin el modelo), o None si ninguna alcanza
+            LAYOUT_TEMPLATE_MIN_SIMILARITY
+        """
+        features = frozenset(layout_features(text))
+        best, best_similarity = None, 0.0
+        for template in self._cached(db):
+            if document_type is not None and template["document_type"] != document_type:
+                continue
+            similarity = _similarity(features, template["features"])
+            if similarity > best_similarity:
+                best, best_similarity = template, similarity
+
+        matched = best is not None and best_similarity >= settings.LAYOUT_TEMPLATE_MIN_SIMILARITY
+        with self._lock:
+            self._stats["lookups"] += 1
+            if matched:
+                self._stats["matches"] += 1
+        if not matched:
+            return None
+        return {
+            **best,
+            "similarity": round(best_similarity, 3),
+            "confirmed": best["samples"] >= settings.LAYOUT_TEMPLATE_MIN_SAMPLES,
+        }
+
+    def apply(self, template: Dict[str, Any], text: str, db: Session) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Extrae los campos de un documento con una plantilla y registra el uso
+
+        Returns:
+            Tupla (datos extraídos, claves de los campos que no se
+            encontraron; si hay alguna el documento debe ir al modelo)
+        """
+        data, missing = apply_template(text, template["field_locators"])
+        db_template = db.query(LayoutTemplate).filter(LayoutTemplate.id == template["id"]).first()
+        if db_template is not None:
+            db_template.hits = (db_template.hits or 0) + 1
+            if missing:
+                db_template.failures = (db_template.failures or 0) + 1
+            db.commit()
+        with self._lock:
+            self._stats["hits"] += 1
+            if missing:
+                self._stats["failures"] += 1
+        return data, missing
+
+    def learn(
+        self,
+        db: Session,
+        text: str,
+        document_type: str,
+        data: Dict[str, Any],
+        template: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Aprende de una extracción del modelo
+
+        Sin plantilla parecida crea una nueva. Con una del mismo tipo compara
+        lo que ubica la plantilla con lo que extrajo el modelo (para la
+        precisión de la plantilla), vuelve a aprender los campos que no
+        coinciden y suma una muestra (con LAYOUT_TEMPLATE_MIN_SAMPLES
+        muestras la plantilla se empieza a usar).
+
+        Args:
+            db: Sesión de base de datos
+            text: Texto del documento
+            document_type: Tipo de documento según el modelo
+            data: Datos extraídos por el modelo
+            template: Plantilla que coincidió con el documento, si hubo
+        """
+        if not isinstance(data, dict) or "error" in data or document_type in (None, "", "desconocido"):
+            return
+
+        locators, llm_fields = learn_template(text, data)
+        if template is None:
+            features = layout_features(text)
+            fingerprint = layout_fingerprint(features)
+            if db.query(LayoutTemplate).filter(LayoutTemplate.fingerprint == fingerprint).first():
+                return
+            db_template = LayoutTemplate(
+                fingerprint=fingerprint,
+                document_type=document_type,
+                features=features,
+                field_locators=locators,
+                llm_fields=llm_fields,
+                samples=1
+            )
+            db.add(db_template)
+            db.commit()
+            db.refresh(db_template)
+            self._replace(db_template)
+            with self._lock:
+                self._stats["learned"] += 1
+            return
+
+        db_template = db.query(LayoutTemplate).filter(LayoutTemplate.id == template["id"]).first()
+        if db_template is None or db_template.document_type != document_type:
+            return
+
+        located, _ = apply_template(text, db_template.field_locators or {})
+        located, expected = _flatten(located), _flatten(data)
+        compared = matched = 0
+        field_locators = dict(db_template.field_locators or {})
+        for key in list(field_locators):
+            if key not in expected:
+                continue
+            compared += 1
+            if _same_value(located.get(key), expected[key]):
+                matched += 1
+            elif key in locators:
+                field_locators[key] = locators[key]
+            else:
+                del field_locators[key]
+                llm_fields.append(key.split(".")[0])
+        # Campos que la plantilla no tenía y el modelo encontró ahora
+        for key, locator in locators.items():
+            field_locators.setdefault(key, locator)
+
+        llm_fields = list(dict.fromkeys((db_template.llm_fields or []) + llm_fields))
+        db_template.field_locators = {
+            key: locator for key, locator in field_locators.items() if key.split(".")[0] not in llm_fields
+        }
+        db_template.llm_fields = llm_fields
+        db_template.samples = (db_template.samples or 0) + 1
+        db_template.compared_fields = (db_template.compared_fields or 0) + compared
+        db_template.matched_fields = (db_template.matched_fields or 0) + matched
+        db.commit()
+        self._replace(db_template)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Uso de las plantillas desde el inicio del proceso
+
+        hit_ratio es la fracción de documentos procesados con una plantilla
+        (sin clasificar ni extraer con el modelo los campos ubicados);
+        failures, los usos en que algún campo no se encontró y se recurrió
+        al modelo.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["templates"] = len(self._templates)
+        succeeded = stats["hits"] - stats["failures"]
+        stats["hit_ratio"] = round(succeeded / stats["lookups"], 4) if stats["lookups"] else None
+        return stats
+
+    @staticmethod
+    def get_template_stats(db: Session) -> List[Dict[str, Any]]:
+        """
+        Precisión de cada plantilla
+
+        accuracy es la fracción de campos ubicados por la plantilla que
+        coincidieron con la extracción del modelo (al confirmarla y en las
+        verificaciones de LAYOUT_TEMPLATE_AUDIT_RATE).
+        """
+        return [
+            {
+                "id": template.id,
+                "document_type": template.document_type,
+                "samples": template.samples,
+                "hits": template.hits,
+                "failures": template.failures,
+                "fields": len(template.field_locators or {}),
+                "llm_fields": template.llm_fields or [],
+                "accuracy": round(template.matched_fields / template.compared_fields, 4)
+                if template.compared_fields else None,
+            }
+            for template in db.query(LayoutTemplate).order_by(LayoutTemplate.hits.desc()).all()
+        ]
+
+
+layout_template_store = LayoutTemplateStore()
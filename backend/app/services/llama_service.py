@@ -1,168 +1,1529 @@
 import ollama
-from typing import Dict, Any, Optional
+import httpx
+from typing import Dict, Any, Callable, List, Optional, Tuple, Union
 from sqlalchemy.orm import Session
+from ..core.cache import DiskCache
 from ..core.config import settings
-from .prompt_service import PromptService
+from ..core.json_stream import JSONObjectScanner
+from ..models.document import ConfigurableAttribute
+from .prompt_service import (
+    PromptService,
+    PROMPT_PREFIX,
+    DEFAULT_CLASSIFICATION_PROMPT,
+    DEFAULT_CLASSIFICATION_EXTRACTION_PROMPT,
+    default_extraction_prompt
+)
+from .output_schema import (
+    CLASSIFICATION_SCHEMA,
+    all_extraction_fields,
+    build_classification_extraction_schema,
+    build_extraction_schema,
+    estimate_classification_extraction_tokens,
+    estimate_output_tokens,
+    extraction_fields,
+    get_attributes,
+    restrict_attributes,
+    restrict_extraction_prompt,
+    missing_required_attributes,
+)
+from .extraction_merge import merge_extractions, split_into_chunks
+from .fiscal_fields import extract_fiscal_fields
+from .llm_scheduler import llm_scheduler, LLMRequestCancelled
+from .rule_classifier import classify_by_rules
+from .text_selection import CLASSIFICATION_KEYWORDS, field_keywords, select_relevant_text
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import json
+import math
+import random
+import threading
+import time
+
+
+# Versión del formato de resultados guardados en caché; incrementarla
+# invalida las entradas existentes cuando cambia el parseo de respuestas
+LLM_CACHE_VERSION = 1
+
+# Texto máximo de una respuesta inválida que se reenvía al pedir su corrección
+REPAIR_MAX_CHARS = 2000
+
+# Políticas de LLM_MODEL_ROUTING: modelo chico con escalamiento al grande,
+# solo el chico (OLLAMA_FAST_MODEL) o solo el grande (OLLAMA_MODEL)
+MODEL_POLICIES = ("tiered", "fast", "large")
+
+
+class _StreamedResponse:
+    """Acumula una respuesta en streaming y detecta el cierre del objeto JSON"""
+
+    def __init__(self):
+        self.scanner = JSONObjectScanner()
+        self.parts = []
+        self.tokens = 0
+        self.done = False
+        self.final: Dict[str, Any] = {}
+
+    def feed(self, chunk: Dict[str, Any]) -> bool:
+        """Agrega un fragmento del stream; True si ya se puede cortar la generación"""
+        self.done = bool(chunk.get('done'))
+        if self.done:
+            # El último fragmento trae los conteos de tokens de Ollama
+            self.final = chunk
+            return True
+        # Ollama envía un token por fragmento
+        self.tokens += 1
+        self.parts.append(chunk.get('response', ''))
+        return self.scanner.feed(self.parts[-1])
+
+    @property
+    def stopped_early(self) -> bool:
+        return self.scanner.complete and not self.done
+
+    def text(self) -> str:
+        if self.scanner.complete:
+            return self.scanner.text
+        return "".join(self.parts).strip()
 
 
 class LlamaService:
     """Servicio para interactuar con el modelo Phi-4 a través de Ollama"""
 
     def __init__(self):
-        self.client = ollama.Client(host=settings.OLLAMA_HOST)
+        self.client = ollama.Client(host=settings.OLLAMA_HOST, timeout=self._http_timeout())
         self.model = settings.OLLAMA_MODEL
+        # El cliente asíncrono se crea en el event loop que lo usa
+        self._async_client: Optional[ollama.AsyncClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._warm_up_task: Optional[asyncio.Task] = None
+        self._warm_up_seconds: Optional[float] = None
+        self._stats_lock = threading.Lock()
+        self._stream_stats = {"calls": 0, "early_stops": 0, "tokens": 0}
+        self._output_stats: Dict[str, Dict[str, int]] = {}
+        self._token_stats = {
+            "calls": 0, "estimated_prompt": 0, "measured_calls": 0, "measured_estimated_prompt": 0,
+            "measured_actual_prompt": 0, "num_predict": 0, "output": 0, "truncated": 0
+        }
+        self._rule_stats = {
+            "documents": 0, "fast_path": 0, "audited": 0, "audit_agreements": 0,
+            "llm_compared": 0, "llm_agreements": 0
+        }
+        self._fiscal_stats = {
+            "documents": 0, "requested_fields": 0, "prefilled_fields": 0, "rejected_values": 0, "llm_skipped": 0
+        }
+        # Verificaciones de las reglas con el modelo que corren en segundo plano
+        self._audit_tasks = set()
+        self._tier_stats: Dict[str, Dict[str, Any]] = {}
+        self.cache: Optional[DiskCache] = None
+        if settings.LLM_CACHE_ENABLED:
+            self.cache = DiskCache(
+                settings.LLM_CACHE_DIR,
+                settings.LLM_CACHE_MAX_MB * 1024 * 1024,
+                settings.LLM_CACHE_TTL_SECONDS
+            )
 
-    def classify_document(self, text_content: str, db: Session) -> Dict[str, Any]:
+    @staticmethod
+    def _http_timeout() -> httpx.Timeout:
+        """Timeout de las requests HTTP a Ollama (LLM_TIMEOUT_SECONDS, 0 = sin límite)"""
+        return httpx.Timeout(settings.LLM_TIMEOUT_SECONDS or None, connect=10.0)
+
+    @staticmethod
+    def _keep_alive() -> Union[int, str]:
+        """keep_alive de Ollama: duración ("24h") o segundos (-1 = sin descargar el modelo)"""
+        try:
+            return int(settings.OLLAMA_KEEP_ALIVE)
+        except ValueError:
+            return settings.OLLAMA_KEEP_ALIVE
+
+    def _get_async_client(self) -> ollama.AsyncClient:
         """
-        Clasifica un documento comercial usando Phi-4 con prompt de BD
+        Cliente asíncrono (con pool de conexiones) del event loop actual
+
+        Las generaciones en curso las limita llm_scheduler (a
+        OLLAMA_NUM_PARALLEL por defecto), así que alcanzan pocas conexiones.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_client = ollama.AsyncClient(
+                host=settings.OLLAMA_HOST,
+                timeout=self._http_timeout(),
+                limits=httpx.Limits(max_connections=llm_scheduler.max_in_flight() * 2)
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    def _models(self) -> List[str]:
+        """Modelos que usa el servicio: OLLAMA_FAST_MODEL (si hay) y OLLAMA_MODEL"""
+        models = [settings.OLLAMA_FAST_MODEL] if settings.OLLAMA_FAST_MODEL else []
+        return list(dict.fromkeys(models + [self.model]))
+
+    async def warm_up(self, retry_seconds: float = 10.0):
+        """
+        Carga los modelos en Ollama con una generación mínima y los fija en
+        memoria por OLLAMA_KEEP_ALIVE
+
+        Reintenta hasta lograrlo: al arrancar, Ollama puede estar iniciando
+        o descargando el modelo.
 
         Args:
-            text_content: Contenido de texto extraído del documento
-            db: Sesión de base de datos
+            retry_seconds: Espera entre intentos
+        """
+        started = time.perf_counter()
+        for model in self._models():
+            await self._warm_up_model(model, retry_seconds)
+        self._warm_up_seconds = round(time.perf_counter() - started, 3)
+
+    async def _warm_up_model(self, model: str, retry_seconds: float):
+        client = self._get_async_client()
+        while True:
+            started = time.perf_counter()
+            try:
+                async with llm_scheduler.slot(1):
+                    await client.generate(
+                        model=model,
+                        # Con el orden "prefix" se evalúa ya el comienzo común de los prompts
+                        prompt=PROMPT_PREFIX if settings.LLM_PROMPT_LAYOUT == "prefix" else "Hola",
+                        # Mismo num_ctx que las generaciones chicas: otro valor haría recargar el modelo
+                        options={"num_predict": 1, "num_ctx": settings.LLM_NUM_CTX_MIN},
+                        keep_alive=self._keep_alive()
+                    )
+            except Exception as e:
+                print(f"Error cargando el modelo {model}: {str(e)}. Reintento en {retry_seconds:.0f} s")
+                await asyncio.sleep(retry_seconds)
+                continue
+
+            print(f"Modelo {model} cargado en {time.perf_counter() - started:.3f} s")
+            return
+
+    def start_warm_up(self):
+        """Lanza warm_up en segundo plano, si no hay uno en curso"""
+        if self._warm_up_task is None or self._warm_up_task.done():
+            self._warm_up_task = asyncio.create_task(self.warm_up())
+
+    def stop_warm_up(self):
+        if self._warm_up_task is not None:
+            self._warm_up_task.cancel()
+
+    @staticmethod
+    def _is_model(name: str, model: str) -> bool:
+        """Si un nombre de modelo de Ollama ("phi3:latest") corresponde a un modelo configurado ("phi3")"""
+        return name == model or (":" not in model and name == f"{model}:latest")
+
+    async def get_readiness(self) -> Dict[str, Any]:
+        """
+        Indica si el modelo (y OLLAMA_FAST_MODEL, si se usa) está cargado en
+        memoria de Ollama (GET /api/ps)
+
+        Si no lo está (primer arranque, o Ollama lo descargó por
+        inactividad) y LLM_WARMUP_ENABLED está activo, se lanza la carga en
+        segundo plano.
 
         Returns:
-            Dict con el tipo de documento y confianza de la clasificación
+            Dict con ready, model y, si está cargado, expires_at (cuándo lo
+            descargaría Ollama); si no, reason
         """
-        # Obtener el prompt de clasificación desde la BD
-        prompt_template = PromptService.get_classification_prompt(db)
+        try:
+            async with httpx.AsyncClient(base_url=settings.OLLAMA_HOST, timeout=5.0) as http:
+                response = await http.get("/api/ps")
+                response.raise_for_status()
+                models = response.json().get("models") or []
+        except Exception as e:
+            return {"ready": False, "model": self.model, "reason": f"Ollama no disponible: {str(e)}"}
 
-        if not prompt_template:
-            # Fallback al prompt por defecto si no hay uno en la BD
-            prompt = f"""Analiza el siguiente contenido de documento y clasifícalo en una de estas categorías:
-- factura
-- orden_compra
-- certificado_origen
-- especificacion_tecnica
-- contrato
-- remito
-- otro
-
-Contenido del documento:
-{text_content[:3000]}
-
-Responde ÚNICAMENTE con un JSON en el siguiente formato:
-{{"document_type": "tipo_de_documento", "confidence": 0.95, "reasoning": "breve explicación"}}
-"""
-        else:
-            # Usar el prompt de la BD
-            variables = {
-                "text_content": text_content[:3000]
+        missing = [
+            name for name in self._models()
+            if not any(self._is_model(model.get("name", ""), name) for model in models)
+        ]
+        if missing:
+            warming_up = settings.LLM_WARMUP_ENABLED
+            if warming_up:
+                self.start_warm_up()
+            return {
+                "ready": False,
+                "model": self.model,
+                "reason": f"Modelo no cargado en Ollama: {', '.join(missing)}",
+                "warming_up": warming_up
             }
-            prompt = PromptService.render_prompt(prompt_template.prompt_template, variables)
 
-        try:
+        loaded = next(model for model in models if self._is_model(model.get("name", ""), self.model))
+        return {
+            "ready": True,
+            "model": self.model,
+            "expires_at": loaded.get("expires_at"),
+            "warm_up_seconds": self._warm_up_seconds
+        }
+
+    def _generate(
+        self,
+        prompt: str,
+        options: Dict[str, Any],
+        output_format: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None
+    ) -> str:
+        """
+        Genera una respuesta del modelo y devuelve su texto
+
+        Con `output_format` (esquema JSON) Ollama restringe la generación a
+        respuestas que cumplen el esquema. `model` es el modelo de Ollama a
+        usar (por defecto OLLAMA_MODEL).
+
+        Con LLM_STREAMING_ENABLED la respuesta se recibe en streaming y la
+        generación se corta en cuanto se cierra un objeto JSON válido: los
+        modelos chicos suelen seguir con explicaciones después de la llave
+        final, y ese texto se descartaría igual.
+
+        Antes de llamar a Ollama espera su lugar en llm_scheduler, en el
+        carril del contexto actual (llm_scheduler.priority).
+        """
+        with llm_scheduler.sync_slot(self._request_cost(prompt, options)):
+            return self._request(prompt, options, output_format, model or self.model)
+
+    def _request(
+        self,
+        prompt: str,
+        options: Dict[str, Any],
+        output_format: Optional[Dict[str, Any]],
+        model: str
+    ) -> str:
+        if not settings.LLM_STREAMING_ENABLED:
             response = self.client.generate(
-                model=self.model,
+                model=model,
                 prompt=prompt,
-                options={
-                    "temperature": 0.3,
-                    "top_p": 0.9,
-                }
+                format=output_format or '',
+                keep_alive=self._keep_alive(),
+                options=options
             )
+            self._record_tokens(prompt, options, response.get('prompt_eval_count'), response.get('eval_count'))
+            return response['response'].strip()
+
+        streamed = _StreamedResponse()
+        chunks = self.client.generate(
+            model=model,
+            prompt=prompt,
+            format=output_format or '',
+            keep_alive=self._keep_alive(),
+            options=options,
+            stream=True
+        )
+        try:
+            for chunk in chunks:
+                if streamed.feed(chunk):
+                    break
+        finally:
+            # Cerrar el stream corta la conexión y Ollama deja de generar
+            chunks.close()
+        return self._finish_stream(streamed, prompt, options)
+
+    async def _agenerate(
+        self,
+        prompt: str,
+        options: Dict[str, Any],
+        output_format: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None
+    ) -> str:
+        """
+        Versión asíncrona de _generate, sin bloquear el event loop
+
+        Raises:
+            TimeoutError: Si la generación supera LLM_TIMEOUT_SECONDS
+            LLMRequestCancelled: Si la llamada se canceló en la cola del planificador
+        """
+        client = self._get_async_client()
+        async with llm_scheduler.slot(self._request_cost(prompt, options)):
+            try:
+                return await asyncio.wait_for(
+                    self._arequest(client, prompt, options, output_format, model or self.model),
+                    timeout=settings.LLM_TIMEOUT_SECONDS or None
+                )
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"La generación superó {settings.LLM_TIMEOUT_SECONDS} segundos")
+
+    async def _arequest(
+        self,
+        client: ollama.AsyncClient,
+        prompt: str,
+        options: Dict[str, Any],
+        output_format: Optional[Dict[str, Any]],
+        model: str
+    ) -> str:
+        if not settings.LLM_STREAMING_ENABLED:
+            response = await client.generate(
+                model=model,
+                prompt=prompt,
+                format=output_format or '',
+                keep_alive=self._keep_alive(),
+                options=options
+            )
+            self._record_tokens(prompt, options, response.get('prompt_eval_count'), response.get('eval_count'))
+            return response['response'].strip()
+
+        streamed = _StreamedResponse()
+        chunks = await client.generate(
+            model=model,
+            prompt=prompt,
+            format=output_format or '',
+            keep_alive=self._keep_alive(),
+            options=options,
+            stream=True
+        )
+        try:
+            async for chunk in chunks:
+                if streamed.feed(chunk):
+                    break
+        finally:
+            await chunks.aclose()
+        return self._finish_stream(streamed, prompt, options)
+
+    def _finish_stream(self, streamed: _StreamedResponse, prompt: str, options: Dict[str, Any]) -> str:
+        """Registra los tokens de una generación en streaming y devuelve su texto"""
+        with self._stats_lock:
+            self._stream_stats["calls"] += 1
+            self._stream_stats["tokens"] += streamed.tokens
+            if streamed.stopped_early:
+                self._stream_stats["early_stops"] += 1
+        # Si se cortó antes del final, Ollama no llega a informar los tokens del prompt
+        self._record_tokens(prompt, options, streamed.final.get('prompt_eval_count'), streamed.tokens)
+        return streamed.text()
+
+    def _request_cost(self, prompt: str, options: Dict[str, Any]) -> int:
+        """Costo de una generación para el planificador: tokens estimados de prompt y respuesta"""
+        return self.estimate_tokens(prompt) + options.get("num_predict", 0)
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Tokens estimados de un texto (LLM_CHARS_PER_TOKEN caracteres por token)"""
+        return math.ceil(len(text) / settings.LLM_CHARS_PER_TOKEN)
+
+    def _sized_options(self, prompt: str, options: Dict[str, Any], output_tokens: int) -> Dict[str, Any]:
+        """
+        Agrega a las opciones num_ctx y num_predict según el tamaño del prompt
+        y de la respuesta esperada
+
+        num_ctx se redondea a potencias de dos desde LLM_NUM_CTX_MIN hasta
+        LLM_NUM_CTX_MAX: Ollama recarga el modelo cuando cambia num_ctx, así
+        que solo se usan unos pocos tamaños (con el mínimo por defecto, uno
+        solo salvo para prompts largos).
+
+        Args:
+            prompt: Prompt renderizado
+            options: Opciones de generación
+            output_tokens: Tokens esperados de la respuesta (ver estimate_output_tokens)
+        """
+        num_predict = min(output_tokens, settings.LLM_NUM_PREDICT_MAX)
+        required = self.estimate_tokens(prompt) + num_predict
+
+        num_ctx = settings.LLM_NUM_CTX_MIN
+        while num_ctx < required and num_ctx < settings.LLM_NUM_CTX_MAX:
+            num_ctx *= 2
+        num_ctx = min(num_ctx, settings.LLM_NUM_CTX_MAX)
+        if required > num_ctx:
+            print(f"El prompt ({required} tokens estimados con la respuesta) supera LLM_NUM_CTX_MAX ({num_ctx}); "
+                  f"Ollama lo recortará")
+
+        return {**options, "num_ctx": num_ctx, "num_predict": num_predict}
 
-            response_text = response['response'].strip()
+    def _record_tokens(
+        self,
+        prompt: str,
+        options: Dict[str, Any],
+        prompt_tokens: Optional[int],
+        output_tokens: Optional[int]
+    ):
+        """Registra (y con LLM_LOG_TOKENS imprime) los tokens estimados y los reales"""
+        estimated = self.estimate_tokens(prompt)
+        num_predict = options.get("num_predict")
+        truncated = bool(num_predict and output_tokens and output_tokens >= num_predict)
 
-            # Intentar extraer JSON de la respuesta
-            if '```json' in response_text:
-                json_start = response_text.find('```json') + 7
-                json_end = response_text.find('```', json_start)
-                response_text = response_text[json_start:json_end].strip()
-            elif '```' in response_text:
-                json_start = response_text.find('```') + 3
-                json_end = response_text.find('```', json_start)
-                response_text = response_text[json_start:json_end].strip()
+        with self._stats_lock:
+            stats = self._token_stats
+            stats["calls"] += 1
+            stats["estimated_prompt"] += estimated
+            if prompt_tokens:
+                stats["measured_calls"] += 1
+                stats["measured_estimated_prompt"] += estimated
+                stats["measured_actual_prompt"] += prompt_tokens
+            stats["num_predict"] += num_predict or 0
+            stats["output"] += output_tokens or 0
+            if truncated:
+                stats["truncated"] += 1
 
-            result = json.loads(response_text)
+        if settings.LLM_LOG_TOKENS:
+            print(f"Tokens LLM: prompt estimado {estimated} / real {prompt_tokens if prompt_tokens else '-'}, "
+                  f"salida máx. {num_predict} / real {output_tokens if output_tokens is not None else '-'}, "
+                  f"num_ctx {options.get('num_ctx')}" + (" (respuesta cortada por num_predict)" if truncated else ""))
+
+    def get_token_stats(self) -> Dict[str, Any]:
+        """
+        Tokens estimados vs. reales de las generaciones
+
+        prompt_ratio (reales / estimados, sobre las generaciones en que Ollama
+        informó los tokens del prompt) cerca de 1 indica que
+        LLM_CHARS_PER_TOKEN es adecuado; truncated cuenta las respuestas
+        que llegaron a num_predict (la estimación de salida fue corta).
+        """
+        with self._stats_lock:
+            stats = dict(self._token_stats)
+        calls = stats["calls"]
+        measured = stats["measured_calls"]
+        return {
+            "calls": calls,
+            "avg_estimated_prompt": round(stats["estimated_prompt"] / calls, 1) if calls else None,
+            "avg_actual_prompt": round(stats["measured_actual_prompt"] / measured, 1) if measured else None,
+            "prompt_ratio": None if not measured else round(
+                stats["measured_actual_prompt"] / stats["measured_estimated_prompt"], 3
+            ),
+            "avg_num_predict": round(stats["num_predict"] / calls, 1) if calls else None,
+            "avg_output": round(stats["output"] / calls, 1) if calls else None,
+            "truncated": stats["truncated"],
+        }
+
+    def get_stream_stats(self) -> Dict[str, Any]:
+        """
+        Estadísticas de las generaciones en streaming
+
+        Los tokens que el modelo habría generado después del corte no se
+        pueden observar; app.benchmarks.llm_streaming los mide comparando
+        con la generación completa.
+        """
+        if not settings.LLM_STREAMING_ENABLED:
+            return {"enabled": False}
+        with self._stats_lock:
+            stats = dict(self._stream_stats)
+        stats["avg_tokens"] = round(stats["tokens"] / stats["calls"], 1) if stats["calls"] else None
+        return {"enabled": True, **stats}
+
+    def _generate_json(
+        self,
+        prompt: str,
+        options: Dict[str, Any],
+        output_format: Optional[Dict[str, Any]] = None,
+        validate: Optional[Callable[[Any], bool]] = None,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Genera una respuesta del modelo y la interpreta como JSON, usando la
+        caché de resultados
+
+        La clave es el hash de (modelo, prompt renderizado, opciones,
+        esquema): si se modifica un PromptTemplate el prompt renderizado
+        cambia y las entradas anteriores dejan de usarse (vencen por TTL o
+        se desalojan por tamaño). Solo se guardan respuestas que se pudieron
+        interpretar (y que cumplen `validate`, si se indica).
+
+        Si la respuesta no es un JSON válido (o no cumple `validate`) se
+        pide al modelo que la corrija, hasta LLM_REPAIR_ATTEMPTS veces.
+
+        Raises:
+            ValueError: Si ninguna respuesta es un JSON válido
+        """
+        cache_key, cached = self._cache_lookup(prompt, options, output_format, model)
+        if cached is not None:
+            return cached
+
+        response_text = self._generate(prompt, options, output_format, model)
+        result, valid = self._parse_output(response_text, validate)
+        attempts = 0
+        while not valid and attempts < settings.LLM_REPAIR_ATTEMPTS:
+            attempts += 1
+            response_text = self._generate(
+                self._repair_prompt(response_text, output_format), options, output_format, model
+            )
+            repaired, valid = self._parse_output(response_text, validate)
+            result = repaired if repaired is not None else result
+
+        return self._finish_json(cache_key, result, valid, attempts, output_format)
+
+    async def _agenerate_json(
+        self,
+        prompt: str,
+        options: Dict[str, Any],
+        output_format: Optional[Dict[str, Any]] = None,
+        validate: Optional[Callable[[Any], bool]] = None,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Versión asíncrona de _generate_json"""
+        cache_key, cached = self._cache_lookup(prompt, options, output_format, model)
+        if cached is not None:
+            return cached
+
+        response_text = await self._agenerate(prompt, options, output_format, model)
+        result, valid = self._parse_output(response_text, validate)
+        attempts = 0
+        while not valid and attempts < settings.LLM_REPAIR_ATTEMPTS:
+            attempts += 1
+            response_text = await self._agenerate(
+                self._repair_prompt(response_text, output_format), options, output_format, model
+            )
+            repaired, valid = self._parse_output(response_text, validate)
+            result = repaired if repaired is not None else result
+
+        return self._finish_json(cache_key, result, valid, attempts, output_format)
+
+    def _parse_output(self, response_text: str, validate: Optional[Callable[[Any], bool]]) -> Tuple[Any, bool]:
+        """Respuesta interpretada (None si no es JSON) y si es válida"""
+        try:
+            result = self._parse_json_response(response_text)
+        except ValueError:
+            return None, False
+        return result, validate is None or validate(result)
+
+    @staticmethod
+    def _repair_prompt(response_text: str, output_format: Optional[Dict[str, Any]]) -> str:
+        """Prompt para que el modelo corrija una respuesta que no es el JSON esperado"""
+        schema = ""
+        if output_format:
+            schema = f" con este esquema:\n{json.dumps(output_format, ensure_ascii=False)}\n"
+        return f"""La siguiente respuesta debía ser un objeto JSON{schema or " "}pero no se pudo interpretar o le faltan campos:
+
+{response_text[:REPAIR_MAX_CHARS]}
+
+Responde ÚNICAMENTE con el JSON corregido, sin explicaciones."""
+
+    def _finish_json(
+        self,
+        cache_key: Optional[str],
+        result: Any,
+        valid: bool,
+        attempts: int,
+        output_format: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Registra el resultado de una generación JSON y lo guarda en caché si es válido"""
+        mode = "schema" if output_format else "free"
+        with self._stats_lock:
+            stats = self._output_stats.setdefault(
+                mode, {"generations": 0, "parse_failures": 0, "repaired": 0, "repair_generations": 0, "failed": 0}
+            )
+            stats["generations"] += 1
+            stats["repair_generations"] += attempts
+            if attempts:
+                stats["parse_failures"] += 1
+                if valid:
+                    stats["repaired"] += 1
+            if not valid:
+                stats["failed"] += 1
+
+        if result is None:
+            raise ValueError("La respuesta del modelo no es un JSON válido")
+        if valid:
+            self._cache_store(cache_key, result)
+        return result
+
+    def _cache_lookup(
+        self,
+        prompt: str,
+        options: Dict[str, Any],
+        output_format: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None
+    ) -> Tuple[Optional[str], Optional[Any]]:
+        """Clave de caché de una generación y el resultado guardado, si lo hay"""
+        if self.cache is None:
+            return None, None
+        cache_key = DiskCache.make_key(LLM_CACHE_VERSION, model or self.model, prompt, options, output_format)
+        return cache_key, self.cache.get(cache_key)
+
+    def _cache_store(self, cache_key: Optional[str], result: Any):
+        if cache_key is not None:
+            self.cache.set(cache_key, result)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Estadísticas de la caché de respuestas del modelo"""
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.get_stats()}
+
+    def get_output_stats(self) -> Dict[str, Any]:
+        """
+        Tasa de respuestas que no se pudieron interpretar, por modo
+
+        "schema" son las generaciones restringidas por esquema JSON
+        (LLM_STRUCTURED_OUTPUT) y "free" las de texto libre, para comparar
+        ambos modos. parse_failure_rate es la fracción de generaciones cuya
+        primera respuesta no sirvió; failure_rate, la de las que siguieron
+        sin servir después de las correcciones.
+        """
+        with self._stats_lock:
+            stats = {mode: dict(values) for mode, values in self._output_stats.items()}
+        for values in stats.values():
+            values["parse_failure_rate"] = round(values["parse_failures"] / values["generations"], 4)
+            values["failure_rate"] = round(values["failed"] / values["generations"], 4)
+        return stats
+
+    @staticmethod
+    def _parse_json_response(response_text: str) -> Dict[str, Any]:
+        """
+        Interpreta la respuesta del modelo como JSON, quitando los bloques
+        de código markdown (```json ... ```) si los hay
+
+        Si no es un JSON válido se usa el primer objeto JSON válido que
+        contenga (los modelos a veces agregan texto antes o después).
+
+        Raises:
+            ValueError: Si la respuesta no es un JSON válido
+        """
+        if '```json' in response_text:
+            json_start = response_text.find('```json') + 7
+            json_end = response_text.find('```', json_start)
+            response_text = response_text[json_start:json_end].strip()
+        elif '```' in response_text:
+            json_start = response_text.find('```') + 3
+            json_end = response_text.find('```', json_start)
+            response_text = response_text[json_start:json_end].strip()
+
+        try:
+            return json.loads(response_text)
+        except ValueError:
+            scanner = JSONObjectScanner()
+            if scanner.feed(response_text):
+                return scanner.value
+            raise
+
+    def _model_policy(self, prompt_type: str, document_type: Optional[str] = None) -> str:
+        """
+        Política de modelo de un tipo de prompt según LLM_MODEL_ROUTING
+
+        Se busca primero "<tipo de prompt>:<tipo de documento>" (ej:
+        "extraction:contrato") y luego el tipo de prompt; sin entrada la
+        política es "tiered". Sin OLLAMA_FAST_MODEL siempre es "large".
+
+        Returns:
+            "tiered", "fast" o "large" (ver MODEL_POLICIES)
+        """
+        if not settings.OLLAMA_FAST_MODEL:
+            return "large"
+        routing = settings.LLM_MODEL_ROUTING
+        policy = routing.get(f"{prompt_type}:{document_type}", routing.get(prompt_type, "tiered"))
+        if policy not in MODEL_POLICIES:
+            print(f"Política de modelo desconocida para {prompt_type}: {policy}; se usa tiered")
+            return "tiered"
+        return policy
+
+    @staticmethod
+    def _low_confidence(result: Dict[str, Any]) -> bool:
+        try:
+            return float(result.get("confidence") or 0.0) < settings.LLM_ESCALATION_CONFIDENCE
+        except (TypeError, ValueError):
+            return True
+
+    def _classification_escalation(self, result: Any) -> Optional[str]:
+        """Motivo para repetir una clasificación con el modelo grande, o None"""
+        if not isinstance(result, dict) or not result.get("document_type"):
+            return "invalid_response"
+        if self._low_confidence(result):
+            return "low_confidence"
+        return None
+
+    @staticmethod
+    def _extraction_escalation(result: Any, attributes: List[ConfigurableAttribute]) -> Optional[str]:
+        """Motivo para repetir una extracción con el modelo grande, o None"""
+        if not isinstance(result, dict):
+            return "invalid_response"
+        if settings.LLM_ESCALATE_ON_MISSING_REQUIRED and missing_required_attributes(result, attributes):
+            return "missing_required"
+        return None
+
+    def _combined_escalation(self, result: Any, attributes: List[ConfigurableAttribute]) -> Optional[str]:
+        """Motivo para repetir la clasificación y extracción combinadas con el modelo grande, o None"""
+        if not self._is_combined_response(result):
+            return "invalid_response"
+        if self._low_confidence(result):
+            return "low_confidence"
+        return self._extraction_escalation(result["fields"], attributes)
+
+    def _tier_model(self, policy: str) -> str:
+        return settings.OLLAMA_FAST_MODEL if policy == "fast" else self.model
+
+    def _tiered_json(
+        self,
+        prompt_type: str,
+        document_type: Optional[str],
+        request: Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]],
+        escalation: Callable[[Any], Optional[str]],
+        validate: Optional[Callable[[Any], bool]] = None
+    ) -> Dict[str, Any]:
+        """
+        Genera una respuesta JSON con el modelo que corresponde al prompt
+
+        Con la política "tiered" (ver _model_policy) responde primero
+        OLLAMA_FAST_MODEL; si la respuesta no es un JSON válido, falla la
+        generación o `escalation` devuelve un motivo (confianza baja,
+        atributos requeridos en null), se repite con OLLAMA_MODEL y se usa
+        esa respuesta.
+
+        Args:
+            prompt_type: "classification", "extraction" o "classification_extraction"
+            document_type: Tipo de documento (para las políticas por tipo)
+            request: (prompt, opciones, esquema)
+            escalation: Motivo para escalar una respuesta, o None si sirve
+            validate: Ver _generate_json
+
+        Raises:
+            ValueError: Si la respuesta del modelo que decide no es un JSON válido
+        """
+        prompt, options, output_format = request
+        policy = self._model_policy(prompt_type, document_type)
+        if policy != "tiered":
+            return self._generate_json(prompt, options, output_format, validate, self._tier_model(policy))
+
+        try:
+            result = self._generate_json(prompt, options, output_format, validate, settings.OLLAMA_FAST_MODEL)
+            reason = escalation(result)
+        except LLMRequestCancelled:
+            raise
+        except Exception as e:
+            print(f"Error con el modelo {settings.OLLAMA_FAST_MODEL}: {str(e)}")
+            result, reason = None, "invalid_json" if isinstance(e, ValueError) else "error"
+
+        self._record_tier(prompt_type, reason)
+        if reason is None:
             return result
+        return self._generate_json(prompt, options, output_format, validate, self.model)
 
+    async def _atiered_json(
+        self,
+        prompt_type: str,
+        document_type: Optional[str],
+        request: Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]],
+        escalation: Callable[[Any], Optional[str]],
+        validate: Optional[Callable[[Any], bool]] = None
+    ) -> Dict[str, Any]:
+        """Versión asíncrona de _tiered_json"""
+        prompt, options, output_format = request
+        policy = self._model_policy(prompt_type, document_type)
+        if policy != "tiered":
+            return await self._agenerate_json(prompt, options, output_format, validate, self._tier_model(policy))
+
+        try:
+            result = await self._agenerate_json(
+                prompt, options, output_format, validate, settings.OLLAMA_FAST_MODEL
+            )
+            reason = escalation(result)
+        except LLMRequestCancelled:
+            raise
         except Exception as e:
-            print(f"Error en clasificación: {str(e)}")
-            return {
-                "document_type": "desconocido",
-                "confidence": 0.0,
-                "reasoning": f"Error: {str(e)}"
+            print(f"Error con el modelo {settings.OLLAMA_FAST_MODEL}: {str(e)}")
+            result, reason = None, "invalid_json" if isinstance(e, ValueError) else "error"
+
+        self._record_tier(prompt_type, reason)
+        if reason is None:
+            return result
+        return await self._agenerate_json(prompt, options, output_format, validate, self.model)
+
+    def _record_tier(self, prompt_type: str, reason: Optional[str]):
+        with self._stats_lock:
+            stats = self._tier_stats.setdefault(prompt_type, {"calls": 0, "escalated": 0, "reasons": {}})
+            stats["calls"] += 1
+            if reason is not None:
+                stats["escalated"] += 1
+                stats["reasons"][reason] = stats["reasons"].get(reason, 0) + 1
+
+    def get_tier_stats(self) -> Dict[str, Any]:
+        """
+        Escalamientos al modelo grande por tipo de prompt (política "tiered")
+
+        escalation_rate es la fracción de generaciones del modelo chico que
+        se repitieron con OLLAMA_MODEL; reasons, la cantidad por motivo
+        (low_confidence, missing_required, invalid_json, invalid_response,
+        error).
+        """
+        with self._stats_lock:
+            stats = {
+                prompt_type: {**values, "reasons": dict(values["reasons"])}
+                for prompt_type, values in self._tier_stats.items()
             }
+        for values in stats.values():
+            values["escalation_rate"] = round(values["escalated"] / values["calls"], 4)
+        return {"fast_model": settings.OLLAMA_FAST_MODEL or None, "model": self.model, "prompt_types": stats}
+
+    def classify_document(self, text_content: str, db: Session) -> Dict[str, Any]:
+        """
+        Clasifica un documento comercial usando Phi-4 con prompt de BD
+
+        Args:
+            text_content: Contenido de texto extraído del documento
+            db: Sesión de base de datos
+
+        Returns:
+            Dict con el tipo de documento y confianza de la clasificación
+            (con "method": "rules" si lo clasificaron las reglas)
+        """
+        rules = self._classify_by_rules(text_content, db)
+        if self._rules_accepted(rules):
+            return rules
+
+        classification = self._llm_classify(text_content, db)
+        self._record_rule_agreement(rules, classification, audited=False)
+        return classification
+
+    async def aclassify_document(self, text_content: str, db: Session) -> Dict[str, Any]:
+        """Versión asíncrona de classify_document"""
+        rules = await self._aclassify_by_rules(text_content, db)
+        if self._rules_accepted(rules):
+            return rules
+
+        classification = await self._allm_classify(text_content, db)
+        self._record_rule_agreement(rules, classification, audited=False)
+        return classification
+
+    def _llm_classify(self, text_content: str, db: Session) -> Dict[str, Any]:
+        """Clasifica un documento con el modelo (o los modelos, ver _tiered_json)"""
+        request = self._classification_request(text_content, db)
+
+        try:
+            return self._tiered_json("classification", None, request, self._classification_escalation)
+
+        except LLMRequestCancelled:
+            raise
+        except Exception as e:
+            return self._classification_error(e)
 
-    def extract_structured_data(self, text_content: str, document_type: str, db: Session) -> Dict[str, Any]:
+    async def _allm_classify(self, text_content: str, db: Session) -> Dict[str, Any]:
+        """Versión asíncrona de _llm_classify"""
+        request = self._classification_request(text_content, db)
+
+        try:
+            return await self._atiered_json("classification", None, request, self._classification_escalation)
+
+        except LLMRequestCancelled:
+            raise
+        except Exception as e:
+            return self._classification_error(e)
+
+    def _rule_result(self, text_content: str) -> Optional[Dict[str, Any]]:
+        """
+        Clasificación por reglas del comienzo del documento (ver
+        classify_by_rules), o None si no se cumple ninguna regla o
+        LLM_RULE_CLASSIFIER_ENABLED está desactivado
+        """
+        if not settings.LLM_RULE_CLASSIFIER_ENABLED:
+            return None
+
+        rules = classify_by_rules(text_content[:settings.LLM_RULE_CLASSIFIER_CHARS])
+        accepted = self._rules_accepted(rules)
+        with self._stats_lock:
+            self._rule_stats["documents"] += 1
+            if accepted:
+                self._rule_stats["fast_path"] += 1
+        if rules is not None:
+            rules["method"] = "rules"
+        return rules
+
+    @staticmethod
+    def _rules_accepted(rules: Optional[Dict[str, Any]]) -> bool:
+        """Si la clasificación por reglas alcanza LLM_RULE_CLASSIFIER_THRESHOLD"""
+        return rules is not None and rules["confidence"] >= settings.LLM_RULE_CLASSIFIER_THRESHOLD
+
+    @staticmethod
+    def _should_audit() -> bool:
+        return random.random() < settings.LLM_RULE_CLASSIFIER_AUDIT_RATE
+
+    def _classify_by_rules(self, text_content: str, db: Session) -> Optional[Dict[str, Any]]:
+        """
+        Clasifica por reglas; una fracción (LLM_RULE_CLASSIFIER_AUDIT_RATE)
+        de lo que las reglas clasifican solas se clasifica también con el
+        modelo para medir el acuerdo entre ambos
+        """
+        rules = self._rule_result(text_content)
+        if self._rules_accepted(rules) and self._should_audit():
+            self._record_rule_agreement(rules, self._llm_classify(text_content, db), audited=True)
+        return rules
+
+    async def _aclassify_by_rules(self, text_content: str, db: Session) -> Optional[Dict[str, Any]]:
+        """
+        Versión asíncrona de _classify_by_rules: la verificación con el
+        modelo corre en segundo plano, sin demorar el documento
+        """
+        rules = self._rule_result(text_content)
+        if self._rules_accepted(rules) and self._should_audit():
+            # El prompt se arma ahora: la sesión de BD no sobrevive al request
+            request = self._classification_request(text_content, db)
+            # Nadie espera la verificación: va en el carril de menor prioridad
+            with llm_scheduler.priority("bulk"):
+                task = asyncio.create_task(self._audit_rules(rules, request))
+            self._audit_tasks.add(task)
+            task.add_done_callback(self._audit_tasks.discard)
+        return rules
+
+    async def _audit_rules(
+        self,
+        rules: Dict[str, Any],
+        request: Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]
+    ):
+        try:
+            classification = await self._atiered_json(
+                "classification", None, request, self._classification_escalation
+            )
+        except Exception as e:
+            print(f"Error verificando la clasificación por reglas: {str(e)}")
+            return
+        self._record_rule_agreement(rules, classification, audited=True)
+
+    def _record_rule_agreement(
+        self,
+        rules: Optional[Dict[str, Any]],
+        classification: Dict[str, Any],
+        audited: bool
+    ):
+        """
+        Compara el tipo de las reglas con el del modelo
+
+        Args:
+            rules: Clasificación por reglas (None si no hubo)
+            classification: Clasificación del modelo
+            audited: True si las reglas alcanzaron el umbral (verificación),
+                False si quedaron por debajo y decidió el modelo
+        """
+        # Sin reglas cumplidas o con error del modelo no hay nada que comparar
+        if rules is None or classification.get("document_type") in (None, "", "desconocido"):
+            return
+        agrees = rules["document_type"] == classification["document_type"]
+        with self._stats_lock:
+            if audited:
+                self._rule_stats["audited"] += 1
+                self._rule_stats["audit_agreements"] += int(agrees)
+            else:
+                self._rule_stats["llm_compared"] += 1
+                self._rule_stats["llm_agreements"] += int(agrees)
+
+    def get_rule_stats(self) -> Dict[str, Any]:
+        """
+        Estadísticas de la clasificación por reglas
+
+        avoidance_rate es la fracción de documentos que las reglas
+        clasificaron sin consultar al modelo; agreement_rate, la fracción de
+        los verificados (LLM_RULE_CLASSIFIER_AUDIT_RATE) en que el modelo
+        eligió el mismo tipo. below_threshold_agreement_rate es lo mismo
+        para los documentos en que las reglas quedaron por debajo del umbral
+        (sirve para ajustar LLM_RULE_CLASSIFIER_THRESHOLD).
+        """
+        with self._stats_lock:
+            stats = dict(self._rule_stats)
+        stats["avoidance_rate"] = round(stats["fast_path"] / stats["documents"], 4) if stats["documents"] else None
+        stats["agreement_rate"] = round(stats["audit_agreements"] / stats["audited"], 4) if stats["audited"] else None
+        stats["below_threshold_agreement_rate"] = round(
+            stats["llm_agreements"] / stats["llm_compared"], 4
+        ) if stats["llm_compared"] else None
+        return stats
+
+    def _classification_request(
+        self,
+        text_content: str,
+        db: Session
+    ) -> Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]:
+        """Prompt, opciones de generación y esquema de la respuesta para clasificar un documento"""
+        # Obtener el prompt de clasificación desde la BD
+        prompt_template = PromptService.get_classification_prompt(db)
+        document_text = self._document_text(text_content, CLASSIFICATION_KEYWORDS, settings.LLM_CLASSIFICATION_CHARS)
+
+        # Fallback al prompt por defecto si no hay uno en la BD
+        template = prompt_template.prompt_template if prompt_template else DEFAULT_CLASSIFICATION_PROMPT
+        prompt = self._render(template, {"text_content": document_text})
+
+        options = self._sized_options(
+            prompt, {"temperature": 0.3, "top_p": 0.9}, estimate_output_tokens(CLASSIFICATION_SCHEMA)
+        )
+        return prompt, options, self._output_format(CLASSIFICATION_SCHEMA)
+
+    @staticmethod
+    def _classification_error(error: Exception) -> Dict[str, Any]:
+        print(f"Error en clasificación: {str(error)}")
+        return {
+            "document_type": "desconocido",
+            "confidence": 0.0,
+            "reasoning": f"Error: {str(error)}"
+        }
+
+    def extract_structured_data(
+        self,
+        text_content: str,
+        document_type: str,
+        db: Session,
+        fields: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
         """
         Extrae datos estructurados del documento según su tipo usando prompt de BD
 
+        Con LLM_FISCAL_EXTRACTORS_ENABLED, los campos fiscales con formato
+        fijo (CUIT, CAE, número de comprobante, ...; ver fiscal_fields) se
+        extraen primero con expresiones regulares y validación, y se quitan
+        de los campos que se piden al modelo. Si se encuentran todos, no se
+        consulta al modelo.
+
         Args:
             text_content: Contenido de texto del documento
             document_type: Tipo de documento clasificado
             db: Sesión de base de datos
+            fields: Campos de primer nivel a extraer (ej: los que una
+                plantilla de diseño no ubica); None extrae todos
 
         Returns:
-            Dict con los datos extraídos
+            Dict con los datos extraídos. Si se procesó por fragmentos
+            (documento largo con LLM_MAP_REDUCE_ENABLED), incluye además
+            "_map_reduce" con los tiempos y la cobertura
         """
-        # Obtener el prompt de extracción específico para este tipo de documento
-        prompt_template = PromptService.get_extraction_prompt(db, document_type)
+        prefilled, fields = self._prefill_fiscal(text_content, document_type, db, fields)
+        if fields == []:
+            return prefilled
+        return {**self._llm_extract(text_content, document_type, db, fields), **prefilled}
 
-        if not prompt_template:
-            # Fallback a campos por defecto si no hay prompt en la BD
-            fields_by_type = {
-                "factura": ["numero_factura", "fecha", "proveedor", "cliente", "monto_total", "moneda", "items"],
-                "orden_compra": ["numero_orden", "fecha", "proveedor", "cliente", "items", "monto_total"],
-                "certificado_origen": ["numero_certificado", "fecha", "pais_origen", "producto", "exportador"],
-                "especificacion_tecnica": ["producto", "modelo", "especificaciones", "normas"],
-                "contrato": ["numero_contrato", "fecha", "partes", "objeto", "monto"],
-                "remito": ["numero_remito", "fecha", "origen", "destino", "items"]
-            }
+    async def aextract_structured_data(
+        self,
+        text_content: str,
+        document_type: str,
+        db: Session,
+        fields: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Versión asíncrona de extract_structured_data"""
+        prefilled, fields = self._prefill_fiscal(text_content, document_type, db, fields)
+        if fields == []:
+            return prefilled
+        return {**await self._allm_extract(text_content, document_type, db, fields), **prefilled}
 
-            fields = fields_by_type.get(document_type, ["fecha", "numero_documento", "emisor", "receptor"])
+    def _llm_extract(
+        self,
+        text_content: str,
+        document_type: str,
+        db: Session,
+        fields: Optional[List[str]]
+    ) -> Dict[str, Any]:
+        """Extrae los datos con el modelo, por fragmentos si el documento es largo"""
+        if self._use_map_reduce(text_content):
+            started = time.perf_counter()
+            chunks, covered_chars = self._split_document(text_content)
+            # Los prompts se arman antes: la sesión de BD no se comparte entre hilos
+            requests = [self._extraction_request(chunk, document_type, db, fields) for chunk in chunks]
+            # Los hilos no heredan el carril del planificador
+            lane = llm_scheduler.current_lane()
 
-            prompt = f"""Extrae la siguiente información del documento de tipo "{document_type}":
+            def extract(request: Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+                with llm_scheduler.priority(lane):
+                    # Un fragmento no tiene por qué contener los atributos requeridos
+                    return self._extract_chunk(request, document_type, [])
 
-Campos a extraer: {', '.join(fields)}
+            with ThreadPoolExecutor(max_workers=max(1, settings.LLM_MAP_REDUCE_CONCURRENCY)) as executor:
+                futures = [executor.submit(extract, request) for request in requests]
+                try:
+                    partials = [future.result() for future in futures]
+                except BaseException:
+                    # El documento ya falló: los fragmentos que no empezaron
+                    # no se generan (los que están en curso no se pueden cortar)
+                    for future in futures:
+                        future.cancel()
+                    raise
+            return self._merge_chunks(text_content, covered_chars, partials, started)
 
-Contenido del documento:
-{text_content[:4000]}
+        return self._extract_chunk(
+            self._extraction_request(text_content, document_type, db, fields),
+            document_type,
+            self._requested_attributes(db, fields)
+        )
 
-Responde ÚNICAMENTE con un JSON con los campos encontrados. Si un campo no está presente, usa null.
-Formato de respuesta:
-{{
-  "campo1": "valor1",
-  "campo2": "valor2",
-  ...
-}}
-"""
-        else:
-            # Usar el prompt de la BD
-            variables = {
-                "text_content": text_content[:4000],
-                "document_type": document_type
-            }
-            prompt = PromptService.render_prompt(prompt_template.prompt_template, variables)
+    async def _allm_extract(
+        self,
+        text_content: str,
+        document_type: str,
+        db: Session,
+        fields: Optional[List[str]]
+    ) -> Dict[str, Any]:
+        if self._use_map_reduce(text_content):
+            started = time.perf_counter()
+            chunks, covered_chars = self._split_document(text_content)
+            requests = [self._extraction_request(chunk, document_type, db, fields) for chunk in chunks]
+            # Además del límite global (llm_scheduler), un documento no
+            # ocupa más de LLM_MAP_REDUCE_CONCURRENCY generaciones a la vez
+            semaphore = asyncio.Semaphore(max(1, settings.LLM_MAP_REDUCE_CONCURRENCY))
+
+            async def extract(request: Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+                async with semaphore:
+                    return await self._aextract_chunk(request, document_type, [])
+
+            tasks = [asyncio.create_task(extract(request)) for request in requests]
+            try:
+                partials = await asyncio.gather(*tasks)
+            except BaseException:
+                # Si un fragmento falla (o se cancela la extracción) los demás
+                # se cancelan y liberan sus lugares en el planificador
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+            return self._merge_chunks(text_content, covered_chars, list(partials), started)
+
+        return await self._aextract_chunk(
+            self._extraction_request(text_content, document_type, db, fields),
+            document_type,
+            self._requested_attributes(db, fields)
+        )
 
+    def _prefill_fiscal(
+        self,
+        text_content: str,
+        document_type: str,
+        db: Session,
+        fields: Optional[List[str]]
+    ) -> Tuple[Dict[str, Any], Optional[List[str]]]:
+        """
+        Extrae los campos fiscales de la extracción pedida
+
+        Returns:
+            Tupla (valores fiscales encontrados, campos de primer nivel que
+            quedan para el modelo; None si no se encontró ninguno y se
+            extrae todo como se pidió)
+        """
+        if not settings.LLM_FISCAL_EXTRACTORS_ENABLED:
+            return {}, fields
+        requested = fields if fields is not None else self._requested_fields(document_type, db)
+        prefilled, rejected = extract_fiscal_fields(text_content, requested)
+        remaining = [field for field in requested if field not in prefilled]
+        with self._stats_lock:
+            self._fiscal_stats["documents"] += 1
+            self._fiscal_stats["requested_fields"] += len(requested)
+            self._fiscal_stats["prefilled_fields"] += len(prefilled)
+            self._fiscal_stats["rejected_values"] += rejected
+            if prefilled and not remaining:
+                self._fiscal_stats["llm_skipped"] += 1
+        if not prefilled:
+            return {}, fields
+        return prefilled, remaining
+
+    @staticmethod
+    def _requested_fields(document_type: str, db: Session) -> List[str]:
+        """Campos de primer nivel de una extracción: los del prompt y los de los atributos configurables"""
+        prompt_template = PromptService.get_extraction_prompt(db, document_type)
+        fields = extraction_fields(document_type, prompt_template.prompt_template if prompt_template else None)
+        return list(dict.fromkeys(fields + [attribute.attribute_key.split(".")[0] for attribute in get_attributes(db)]))
+
+    def get_fiscal_stats(self) -> Dict[str, Any]:
+        """
+        Estadísticas de los extractores de campos fiscales
+
+        prefill_rate es la fracción de los campos pedidos que se extrajeron
+        sin el modelo; llm_skip_rate, la fracción de extracciones que no
+        consultaron al modelo. rejected_values cuenta los valores con el
+        formato esperado que no pasaron la validación (ej: dígito
+        verificador del CUIT) y quedaron para el modelo.
+        """
+        with self._stats_lock:
+            stats = dict(self._fiscal_stats)
+        stats["prefill_rate"] = round(
+            stats["prefilled_fields"] / stats["requested_fields"], 4
+        ) if stats["requested_fields"] else None
+        stats["llm_skip_rate"] = round(stats["llm_skipped"] / stats["documents"], 4) if stats["documents"] else None
+        return stats
+
+    @staticmethod
+    def _requested_attributes(db: Session, fields: Optional[List[str]]) -> List[ConfigurableAttribute]:
+        """Atributos configurables que se piden al modelo (los de `fields` si se restringe la extracción)"""
+        attributes = get_attributes(db)
+        return attributes if fields is None else restrict_attributes(attributes, fields)
+
+    def _extract_chunk(
+        self,
+        request: Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]],
+        document_type: str,
+        attributes: List[ConfigurableAttribute]
+    ) -> Dict[str, Any]:
+        """
+        Extrae los datos de un texto a partir de su (prompt, opciones,
+        esquema); con la política "tiered" se escala al modelo grande si
+        falta alguno de los atributos requeridos de `attributes`
+        """
         try:
-            response = self.client.generate(
-                model=self.model,
-                prompt=prompt,
-                options={
-                    "temperature": 0.2,
-                    "top_p": 0.9,
-                }
+            return self._tiered_json(
+                "extraction", document_type, request,
+                lambda result: self._extraction_escalation(result, attributes)
             )
 
-            response_text = response['response'].strip()
-
-            # Extraer JSON
-            if '```json' in response_text:
-                json_start = response_text.find('```json') + 7
-                json_end = response_text.find('```', json_start)
-                response_text = response_text[json_start:json_end].strip()
-            elif '```' in response_text:
-                json_start = response_text.find('```') + 3
-                json_end = response_text.find('```', json_start)
-                response_text = response_text[json_start:json_end].strip()
+        except LLMRequestCancelled:
+            raise
+        except Exception as e:
+            print(f"Error en extracción de datos: {str(e)}")
+            return {"error": str(e)}
 
-            extracted_data = json.loads(response_text)
-            return extracted_data
+    async def _aextract_chunk(
+        self,
+        request: Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]],
+        document_type: str,
+        attributes: List[ConfigurableAttribute]
+    ) -> Dict[str, Any]:
+        try:
+            return await self._atiered_json(
+                "extraction", document_type, request,
+                lambda result: self._extraction_escalation(result, attributes)
+            )
 
+        except LLMRequestCancelled:
+            raise
         except Exception as e:
             print(f"Error en extracción de datos: {str(e)}")
             return {"error": str(e)}
 
+    @staticmethod
+    def _use_map_reduce(text_content: str) -> bool:
+        """Si el documento se extrae por fragmentos: no entra en un solo prompt de extracción"""
+        return settings.LLM_MAP_REDUCE_ENABLED and len(text_content) > settings.LLM_EXTRACTION_CHARS
+
+    @staticmethod
+    def _split_document(text_content: str) -> Tuple[List[str], int]:
+        return split_into_chunks(
+            text_content,
+            settings.LLM_EXTRACTION_CHARS,
+            settings.LLM_MAP_REDUCE_OVERLAP_CHARS,
+            settings.LLM_MAP_REDUCE_MAX_CHUNKS
+        )
+
+    @staticmethod
+    def _merge_chunks(
+        text_content: str,
+        covered_chars: int,
+        partials: List[Dict[str, Any]],
+        started: float
+    ) -> Dict[str, Any]:
+        """
+        Combina los datos extraídos de los fragmentos (ver merge_extractions)
+        y agrega "_map_reduce": fragmentos, fallidos, segundos, fracción del
+        texto cubierta, campos con valor y campos con valores en conflicto
+        """
+        succeeded = [partial for partial in partials if isinstance(partial, dict) and "error" not in partial]
+        if not succeeded:
+            return partials[0]
+
+        merged, conflicts = merge_extractions(succeeded)
+        merged["_map_reduce"] = {
+            "chunks": len(partials),
+            "failed_chunks": len(partials) - len(succeeded),
+            "seconds": round(time.perf_counter() - started, 3),
+            "text_coverage": round(covered_chars / len(text_content), 3),
+            "fields_found": sum(1 for value in merged.values() if value not in (None, "", [], {})),
+            "fields_total": len(merged),
+            "conflicts": conflicts,
+        }
+        return merged
+
+    def _extraction_request(
+        self,
+        text_content: str,
+        document_type: str,
+        db: Session,
+        only_fields: Optional[List[str]] = None
+    ) -> Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        Prompt, opciones de generación y esquema de la respuesta para extraer
+        los datos de un documento
+
+        El esquema tiene los campos del prompt y las claves de los atributos
+        configurables (ConfigurableAttribute.attribute_key), que son las que
+        usa la comparación. Los mismos campos guían la selección del texto.
+        Con `only_fields` se piden solo esos campos de primer nivel.
+        """
+        # Obtener el prompt de extracción específico para este tipo de documento
+        prompt_template = PromptService.get_extraction_prompt(db, document_type)
+        fields = extraction_fields(document_type, prompt_template.prompt_template if prompt_template else None)
+        attributes = self._requested_attributes(db, only_fields)
+        if only_fields is not None:
+            fields = [field for field in fields if field in only_fields]
+            fields += [field for field in only_fields if field not in fields and field not in {
+                attribute.attribute_key.split(".")[0] for attribute in attributes
+            }]
+        schema = build_extraction_schema(fields, attributes)
+        document_text = self._document_text(
+            text_content,
+            field_keywords(fields + [attribute.attribute_key for attribute in attributes]),
+            settings.LLM_EXTRACTION_CHARS
+        )
+
+        # Fallback a campos por defecto si no hay prompt en la BD
+        template = prompt_template.prompt_template if prompt_template \
+            else default_extraction_prompt(document_type, fields)
+        if only_fields is not None:
+            template = restrict_extraction_prompt(template, fields)
+        prompt = self._render(template, {"text_content": document_text, "document_type": document_type})
+
+        options = self._sized_options(prompt, {"temperature": 0.2, "top_p": 0.9}, estimate_output_tokens(schema))
+        return prompt, options, self._output_format(schema)
+
+    def classify_and_extract(self, text_content: str, db: Session) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Clasifica un documento y extrae sus datos en una sola generación
+
+        Si las reglas (LLM_RULE_CLASSIFIER_ENABLED) clasifican el documento
+        con confianza suficiente, solo se extraen sus datos. Si no, usa el
+        prompt activo de tipo "classification_extraction", de modo que
+        el texto del documento se envía (y se evalúa) una sola vez. Si el modo
+        combinado está desactivado (LLM_COMBINED_CLASSIFICATION), el
+        documento se extrae por fragmentos (LLM_MAP_REDUCE_ENABLED) o la
+        respuesta no tiene el formato esperado, se vuelve a las dos llamadas
+        de classify_document y extract_structured_data.
+
+        Args:
+            text_content: Contenido de texto extraído del documento
+            db: Sesión de base de datos
+
+        Returns:
+            Tupla (clasificación, datos extraídos). La clasificación incluye
+            "mode" ("rules", "combined" o "two_call") y "llm_seconds"
+        """
+        started = time.perf_counter()
+
+        rules = self._classify_by_rules(text_content, db)
+        if self._rules_accepted(rules):
+            extracted_data = self.extract_structured_data(text_content, rules["document_type"], db)
+            return self._with_timing((rules, extracted_data), "rules", started)
+
+        # Los documentos largos se extraen por fragmentos: se clasifican aparte
+        if settings.LLM_COMBINED_CLASSIFICATION and not self._use_map_reduce(text_content):
+            try:
+                attributes = get_attributes(db)
+                result = self._tiered_json(
+                    "classification_extraction", None, self._combined_request(text_content, db),
+                    lambda result: self._combined_escalation(result, attributes), validate=self._is_combined_response
+                )
+            except LLMRequestCancelled:
+                raise
+            except Exception as e:
+                print(f"Error en clasificación y extracción combinadas: {str(e)}")
+                result = None
+
+            combined = self._combined_result(result)
+            if combined is not None:
+                self._record_rule_agreement(rules, combined[0], audited=False)
+                return self._with_timing(self._with_fiscal(text_content, combined, db), "combined", started)
+
+        classification = self._llm_classify(text_content, db)
+        self._record_rule_agreement(rules, classification, audited=False)
+        extracted_data = self.extract_structured_data(
+            text_content, classification.get("document_type", "desconocido"), db
+        )
+        return self._with_timing((classification, extracted_data), "two_call", started)
+
+    async def aclassify_and_extract(self, text_content: str, db: Session) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Versión asíncrona de classify_and_extract"""
+        started = time.perf_counter()
+
+        rules = await self._aclassify_by_rules(text_content, db)
+        if self._rules_accepted(rules):
+            extracted_data = await self.aextract_structured_data(text_content, rules["document_type"], db)
+            return self._with_timing((rules, extracted_data), "rules", started)
+
+        # Los documentos largos se extraen por fragmentos: se clasifican aparte
+        if settings.LLM_COMBINED_CLASSIFICATION and not self._use_map_reduce(text_content):
+            try:
+                attributes = get_attributes(db)
+                result = await self._atiered_json(
+                    "classification_extraction", None, self._combined_request(text_content, db),
+                    lambda result: self._combined_escalation(result, attributes), validate=self._is_combined_response
+                )
+            except LLMRequestCancelled:
+                raise
+            except Exception as e:
+                print(f"Error en clasificación y extracción combinadas: {str(e)}")
+                result = None
+
+            combined = self._combined_result(result)
+            if combined is not None:
+                self._record_rule_agreement(rules, combined[0], audited=False)
+                return self._with_timing(self._with_fiscal(text_content, combined, db), "combined", started)
+
+        classification = await self._allm_classify(text_content, db)
+        self._record_rule_agreement(rules, classification, audited=False)
+        extracted_data = await self.aextract_structured_data(
+            text_content, classification.get("document_type", "desconocido"), db
+        )
+        return self._with_timing((classification, extracted_data), "two_call", started)
+
+    def _combined_request(
+        self,
+        text_content: str,
+        db: Session
+    ) -> Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]:
+        """Prompt, opciones de generación y esquema para clasificar y extraer en una sola llamada"""
+        prompt_template = PromptService.get_classification_extraction_prompt(db)
+        template = prompt_template.prompt_template if prompt_template else DEFAULT_CLASSIFICATION_EXTRACTION_PROMPT
+        attributes = get_attributes(db)
+        keywords = CLASSIFICATION_KEYWORDS + field_keywords(
+            all_extraction_fields() + [attribute.attribute_key for attribute in attributes]
+        )
+        variables = {
+            "text_content": self._document_text(text_content, keywords, settings.LLM_EXTRACTION_CHARS)
+        }
+        schema = build_classification_extraction_schema(attributes)
+        prompt = self._render(template, variables)
+        options = self._sized_options(
+            prompt, {"temperature": 0.2, "top_p": 0.9}, estimate_classification_extraction_tokens(attributes)
+        )
+        return prompt, options, self._output_format(schema)
+
+    @staticmethod
+    def _render(prompt_template: str, variables: Dict[str, Any]) -> str:
+        """Renderiza un template con el orden de LLM_PROMPT_LAYOUT (ver PromptService.apply_layout)"""
+        return PromptService.render_prompt(PromptService.apply_layout(prompt_template), variables)
+
+    @staticmethod
+    def _document_text(text_content: str, keywords: List[str], max_chars: int) -> str:
+        """
+        Texto del documento que se envía al modelo, de hasta max_chars caracteres
+
+        Con LLM_TEXT_SELECTION se eligen, entre los primeros
+        LLM_SOURCE_MAX_CHARS caracteres, los bloques más relevantes para las
+        palabras clave (ver select_relevant_text); si no, el comienzo del
+        texto.
+        """
+        if settings.LLM_TEXT_SELECTION:
+            return select_relevant_text(text_content[:settings.LLM_SOURCE_MAX_CHARS], keywords, max_chars)
+        return text_content[:max_chars]
+
+    @staticmethod
+    def _output_format(schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Esquema a enviar como format, o None si LLM_STRUCTURED_OUTPUT está desactivado"""
+        return schema if settings.LLM_STRUCTURED_OUTPUT else None
+
+    @staticmethod
+    def _is_combined_response(result: Any) -> bool:
+        """Si la respuesta combinada tiene document_type y el objeto fields"""
+        return isinstance(result, dict) and bool(result.get("document_type")) and isinstance(result.get("fields"), dict)
+
+    def _combined_result(self, result: Any) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Separa la respuesta combinada; None si no sirve y hay que usar dos llamadas"""
+        if result is None:
+            return None
+        if not self._is_combined_response(result):
+            print("Respuesta combinada sin document_type o fields; se usan dos llamadas")
+            return None
+
+        classification = {
+            "document_type": result["document_type"],
+            "confidence": result.get("confidence", 0.0),
+            "reasoning": result.get("reasoning", "")
+        }
+        return classification, result["fields"]
+
+    def _with_fiscal(
+        self,
+        text_content: str,
+        result: Tuple[Dict[str, Any], Dict[str, Any]],
+        db: Session
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Reemplaza en la respuesta combinada los campos fiscales por los
+        validados (la llamada combinada pide todos los campos de una vez, así
+        que no se acortan, pero no quedan valores inventados por el modelo)
+        """
+        classification, extracted_data = result
+        if settings.LLM_FISCAL_EXTRACTORS_ENABLED:
+            fiscal, _ = extract_fiscal_fields(
+                text_content, self._requested_fields(classification["document_type"], db)
+            )
+            extracted_data.update(fiscal)
+        return classification, extracted_data
+
+    @staticmethod
+    def _with_timing(
+        result: Tuple[Dict[str, Any], Dict[str, Any]],
+        mode: str,
+        started: float
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        classification, extracted_data = result
+        classification.pop("method", None)
+        classification["mode"] = mode
+        classification["llm_seconds"] = round(time.perf_counter() - started, 3)
+        return classification, extracted_data
+
 
 llama_service = LlamaService()
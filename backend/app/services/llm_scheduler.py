@@ -0,0 +1,272 @@
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional
+import asyncio
+import threading
+import time
+
+from ..core.config import settings
+
+# Carriles de prioridad: validaciones con el despachante esperando en
+# pantalla, documentos comerciales y cargas masivas o tareas de fondo
+LANES = ("interactive", "normal", "bulk")
+
+# Carril de las llamadas al modelo del contexto actual (se hereda en las
+# tareas de asyncio y en asyncio.to_thread)
+_current_lane: ContextVar[str] = ContextVar("llm_lane", default="normal")
+
+
+class LLMRequestCancelled(Exception):
+    """
+    La llamada al modelo se canceló mientras esperaba en la cola
+
+    Los servicios la dejan pasar en vez de convertirla en {"error": ...}:
+    el documento no se procesó.
+    """
+
+
+class _Ticket:
+    """Una llamada al modelo en la cola del planificador"""
+
+    def __init__(self, lane: str, cost: float, loop: Optional[asyncio.AbstractEventLoop]):
+        self.lane = lane
+        self.cost = cost
+        self.start = 0.0
+        self.finish = 0.0
+        self.enqueued_at = time.perf_counter()
+        self.cancelled = False
+        # Las llamadas asíncronas esperan un future de su event loop; las
+        # sincrónicas (hilos), un Event
+        self.loop = loop
+        self.future: Optional[asyncio.Future] = loop.create_future() if loop is not None else None
+        self.event: Optional[threading.Event] = threading.Event() if loop is None else None
+
+    def wake(self) -> bool:
+        """Despierta a quien espera el ticket (desde cualquier hilo); False si su event loop ya se cerró"""
+        if self.future is None:
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(self._resolve)
+            return True
+        except RuntimeError:
+            return False
+
+    def _resolve(self):
+        if self.future.done():
+            return
+        if self.cancelled:
+            self.future.set_exception(LLMRequestCancelled(f"Llamada al modelo cancelada en la cola {self.lane}"))
+        else:
+            self.future.set_result(None)
+
+
+class LLMScheduler:
+    """
+    Planificador de las llamadas al modelo
+
+    Todas las generaciones (asíncronas y sincrónicas) piden un lugar antes
+    de llamar a Ollama. Hay a lo sumo LLM_SCHEDULER_MAX_IN_FLIGHT en curso
+    (por defecto OLLAMA_NUM_PARALLEL: Ollama no atiende más en paralelo);
+    las demás esperan en la cola de su carril (LANES).
+
+    Los carriles se atienden con weighted fair queuing: cada llamada recibe
+    una marca de fin virtual = max(tiempo virtual, fin de la anterior de su
+    carril) + costo / peso (LLM_SCHEDULER_WEIGHTS; el costo son los tokens
+    estimados de prompt y respuesta) y se despacha la de menor marca. Con
+    todos los carriles ocupados, cada uno recibe tokens en proporción a su
+    peso, y una llamada interactiva pasa delante de la cola masiva sin que
+    esta se detenga del todo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues: Dict[str, Deque[_Ticket]] = {lane: deque() for lane in LANES}
+        self._last_finish = {lane: 0.0 for lane in LANES}
+        self._virtual_time = 0.0
+        self._in_flight = 0
+        self._stats = {
+            lane: {"dispatched": 0, "cancelled": 0, "max_depth": 0, "waits": []} for lane in LANES
+        }
+
+    @staticmethod
+    def max_in_flight() -> int:
+        return settings.LLM_SCHEDULER_MAX_IN_FLIGHT or max(1, settings.OLLAMA_NUM_PARALLEL)
+
+    @staticmethod
+    def current_lane() -> str:
+        return _current_lane.get()
+
+    @contextmanager
+    def priority(self, lane: str) -> Iterator[None]:
+        """
+        Asigna un carril a las llamadas al modelo del bloque (y de las
+        tareas que se lancen dentro)
+
+        Raises:
+            ValueError: Si el carril no existe
+        """
+        if lane not in LANES:
+            raise ValueError(f"Prioridad no válida: {lane}. Use: {', '.join(LANES)}")
+        token = _current_lane.set(lane)
+        try:
+            yield
+        finally:
+            _current_lane.reset(token)
+
+    @staticmethod
+    def _weight(lane: str) -> float:
+        return max(float(settings.LLM_SCHEDULER_WEIGHTS.get(lane, 1)), 0.001)
+
+    def _enqueue(self, ticket: _Ticket) -> bool:
+        """Encola un ticket; True si obtuvo lugar sin esperar"""
+        with self._lock:
+            if self._in_flight < self.max_in_flight() and not any(self._queues.values()):
+                self._in_flight += 1
+                self._record_dispatch(ticket)
+                return True
+            ticket.start = max(self._virtual_time, self._last_finish[ticket.lane])
+            ticket.finish = ticket.start + ticket.cost / self._weight(ticket.lane)
+            self._last_finish[ticket.lane] = ticket.finish
+            queue = self._queues[ticket.lane]
+            queue.append(ticket)
+            stats = self._stats[ticket.lane]
+            stats["max_depth"] = max(stats["max_depth"], len(queue))
+            return False
+
+    def _record_dispatch(self, ticket: _Ticket):
+        stats = self._stats[ticket.lane]
+        stats["dispatched"] += 1
+        stats["waits"].append(time.perf_counter() - ticket.enqueued_at)
+        # Solo se conservan las últimas mediciones
+        del stats["waits"][:-1000]
+
+    def _release(self):
+        """Libera un lugar y despacha las llamadas en espera que entran"""
+        granted: List[_Ticket] = []
+        with self._lock:
+            self._in_flight -= 1
+            while self._in_flight < self.max_in_flight():
+                heads = [queue[0] for queue in self._queues.values() if queue]
+                if not heads:
+                    break
+                ticket = min(heads, key=lambda head: head.finish)
+                self._queues[ticket.lane].popleft()
+                self._virtual_time = max(self._virtual_time, ticket.start)
+                self._in_flight += 1
+                self._record_dispatch(ticket)
+                granted.append(ticket)
+        for ticket in granted:
+            if not ticket.wake():
+                # Nadie va a usar el lugar
+                self._release()
+
+    def _withdraw(self, ticket: _Ticket) -> bool:
+        """Saca de la cola un ticket abandonado; False si ya había obtenido lugar"""
+        with self._lock:
+            if ticket.cancelled:
+                return True
+            queue = self._queues[ticket.lane]
+            if ticket not in queue:
+                return False
+            queue.remove(ticket)
+            self._stats[ticket.lane]["cancelled"] += 1
+            return True
+
+    @asynccontextmanager
+    async def slot(self, cost: float) -> AsyncIterator[None]:
+        """
+        Espera un lugar para una llamada al modelo del carril actual
+
+        Si la tarea se cancela mientras espera, la llamada sale de la cola
+        (y si el lugar llegó al mismo tiempo, se libera).
+
+        Args:
+            cost: Tokens estimados de la llamada (prompt + respuesta)
+
+        Raises:
+            LLMRequestCancelled: Si la llamada se canceló en la cola (cancel_queued)
+        """
+        ticket = _Ticket(self.current_lane(), cost, asyncio.get_running_loop())
+        if not self._enqueue(ticket):
+            try:
+                await ticket.future
+            except asyncio.CancelledError:
+                if not self._withdraw(ticket):
+                    self._release()
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    @contextmanager
+    def sync_slot(self, cost: float) -> Iterator[None]:
+        """Versión sincrónica de slot, para las llamadas desde hilos"""
+        ticket = _Ticket(self.current_lane(), cost, None)
+        if not self._enqueue(ticket):
+            ticket.event.wait()
+            if ticket.cancelled:
+                raise LLMRequestCancelled(f"Llamada al modelo cancelada en la cola {ticket.lane}")
+        try:
+            yield
+        finally:
+            self._release()
+
+    def cancel_queued(self, lane: Optional[str] = None) -> int:
+        """
+        Cancela las llamadas que esperan en la cola (las que están en curso
+        terminan normalmente); quien las esperaba recibe LLMRequestCancelled
+
+        Args:
+            lane: Carril a vaciar; None vacía todos
+
+        Returns:
+            Llamadas canceladas
+
+        Raises:
+            ValueError: Si el carril no existe
+        """
+        if lane is not None and lane not in LANES:
+            raise ValueError(f"Prioridad no válida: {lane}. Use: {', '.join(LANES)}")
+        cancelled: List[_Ticket] = []
+        with self._lock:
+            for name in ([lane] if lane else LANES):
+                queue = self._queues[name]
+                for ticket in queue:
+                    ticket.cancelled = True
+                cancelled.extend(queue)
+                self._stats[name]["cancelled"] += len(queue)
+                queue.clear()
+        for ticket in cancelled:
+            ticket.wake()
+        return len(cancelled)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Estado de la cola por carril
+
+        queued es la cantidad que espera ahora y max_depth la máxima
+        observada; wait_seconds, el tiempo de espera hasta obtener lugar
+        (promedio y percentil 95 de las últimas llamadas).
+        """
+        with self._lock:
+            stats: Dict[str, Any] = {"in_flight": self._in_flight, "max_in_flight": self.max_in_flight(), "lanes": {}}
+            for lane in LANES:
+                waits = sorted(self._stats[lane]["waits"])
+                stats["lanes"][lane] = {
+                    "weight": self._weight(lane),
+                    "queued": len(self._queues[lane]),
+                    "max_depth": self._stats[lane]["max_depth"],
+                    "dispatched": self._stats[lane]["dispatched"],
+                    "cancelled": self._stats[lane]["cancelled"],
+                    "wait_seconds": {
+                        "avg": round(sum(waits) / len(waits), 3) if waits else None,
+                        "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else None,
+                    },
+                }
+        return stats
+
+
+llm_scheduler = LLMScheduler()
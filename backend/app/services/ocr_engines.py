@@ -0,0 +1,203 @@
+import pytesseract
+from PIL import Image
+from typing import Dict, Optional, Tuple
+import queue
+import threading
+
+from ..core.config import settings
+
+try:
+    import tesserocr
+except ImportError:  # Dependencia opcional: requiere libtesseract-dev para compilarse
+    tesserocr = None
+
+
+class OCREngine:
+    """Interfaz común de los motores de OCR"""
+
+    name = "base"
+
+    def image_to_string(self, image: Image.Image, lang: str) -> str:
+        """Aplica OCR a una imagen y devuelve el texto reconocido"""
+        raise NotImplementedError
+
+    def image_to_text_and_confidence(self, image: Image.Image, lang: str) -> Tuple[str, Optional[float]]:
+        """
+        Aplica OCR a una imagen y devuelve el texto junto con la confianza
+        media por palabra (0-100), o None si no se reconoció ninguna palabra
+        """
+        raise NotImplementedError
+
+    def version(self) -> str:
+        """Versión del motor (forma parte de la clave de caché de OCR)"""
+        raise NotImplementedError
+
+
+class PytesseractEngine(OCREngine):
+    """
+    Motor basado en pytesseract
+
+    Ejecuta un proceso `tesseract` por llamada, escribiendo la imagen a un
+    archivo temporal. Es el motor por defecto y el fallback del resto.
+    """
+
+    name = "pytesseract"
+
+    # Formatos sin compresión en los que se escribe el archivo temporal
+    UNCOMPRESSED_MODES = ("1", "L", "RGB")
+
+    @classmethod
+    def _prepare(cls, image: Image.Image) -> Image.Image:
+        # pytesseract guarda las imágenes sin formato (rasterizadas) como PNG;
+        # PNM evita comprimir y descomprimir la página completa en cada llamada
+        if image.format is None and image.mode in cls.UNCOMPRESSED_MODES:
+            image.format = "PPM"
+        return image
+
+    def image_to_string(self, image: Image.Image, lang: str) -> str:
+        return pytesseract.image_to_string(self._prepare(image), lang=lang)
+
+    def image_to_text_and_confidence(self, image: Image.Image, lang: str) -> Tuple[str, Optional[float]]:
+        # Una sola llamada a image_to_data: el texto se rearma a partir de
+        # las palabras para no ejecutar tesseract dos veces
+        data = pytesseract.image_to_data(self._prepare(image), lang=lang, output_type=pytesseract.Output.DICT)
+
+        lines: Dict[Tuple[int, int, int], list] = {}
+        confidences = []
+        for i, word in enumerate(data["text"]):
+            if not word or not word.strip():
+                continue
+            line_key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(line_key, []).append(word)
+            confidence = float(data["conf"][i])
+            if confidence >= 0:
+                confidences.append(confidence)
+
+        text = "\n".join(" ".join(words) for words in lines.values())
+        mean_confidence = sum(confidences) / len(confidences) if confidences else None
+        return text, mean_confidence
+
+    def version(self) -> str:
+        try:
+            return f"tesseract-{pytesseract.get_tesseract_version()}"
+        except Exception:
+            return "tesseract-unknown"
+
+
+class TesserocrEngine(OCREngine):
+    """
+    Motor basado en la API de Tesseract en proceso (tesserocr)
+
+    Mantiene un pool de handles PyTessBaseAPI ya inicializados, de modo que
+    los traineddata se cargan una sola vez por handle y las imágenes se
+    pasan en memoria sin lanzar procesos ni escribir archivos temporales.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, pool_size: int):
+        self.pool_size = max(1, pool_size)
+        self._handles: Dict[str, queue.Queue] = {}
+        self._created: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, lang: str):
+        """Obtiene un handle para `lang`, creándolo si el pool aún no está lleno"""
+        with self._lock:
+            handles = self._handles.setdefault(lang, queue.Queue())
+            try:
+                return handles.get_nowait()
+            except queue.Empty:
+                if self._created.get(lang, 0) < self.pool_size:
+                    self._created[lang] = self._created.get(lang, 0) + 1
+                    create = True
+                else:
+                    create = False
+
+        if create:
+            try:
+                return tesserocr.PyTessBaseAPI(lang=lang)
+            except Exception:
+                with self._lock:
+                    self._created[lang] -= 1
+                raise
+        return handles.get()
+
+    def _release(self, lang: str, api):
+        self._handles[lang].put(api)
+
+    @staticmethod
+    def _set_image(api, image: Image.Image):
+        # SetImage codifica la imagen como BMP y Leptonica la vuelve a
+        # decodificar; con los píxeles crudos se evita ese ida y vuelta
+        bytes_per_pixel = {"L": 1, "RGB": 3}.get(image.mode)
+        if bytes_per_pixel is None:
+            api.SetImage(image)
+            return
+        width, height = image.size
+        api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+
+    def image_to_string(self, image: Image.Image, lang: str) -> str:
+        api = self._acquire(lang)
+        try:
+            self._set_image(api, image)
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+            self._release(lang, api)
+
+    def image_to_text_and_confidence(self, image: Image.Image, lang: str) -> Tuple[str, Optional[float]]:
+        api = self._acquire(lang)
+        try:
+            self._set_image(api, image)
+            text = api.GetUTF8Text()
+            confidences = api.AllWordConfidences()
+            mean_confidence = sum(confidences) / len(confidences) if confidences else None
+            return text, mean_confidence
+        finally:
+            api.Clear()
+            self._release(lang, api)
+
+    def version(self) -> str:
+        return f"tesserocr-{tesserocr.tesseract_version().splitlines()[0]}"
+
+    def close(self):
+        """Libera los handles del pool"""
+        with self._lock:
+            for handles in self._handles.values():
+                while not handles.empty():
+                    handles.get_nowait().End()
+            self._handles.clear()
+            self._created.clear()
+
+
+_engines: Dict[str, OCREngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_ocr_engine(name: Optional[str] = None) -> OCREngine:
+    """
+    Obtiene el motor de OCR configurado (OCR_ENGINE), uno por proceso
+
+    Si se pide tesserocr y no está instalado se usa pytesseract.
+
+    Args:
+        name: Nombre del motor (pytesseract o tesserocr)
+
+    Returns:
+        Instancia compartida del motor
+    """
+    name = name or settings.OCR_ENGINE
+
+    with _engines_lock:
+        if name not in _engines:
+            if name == "tesserocr" and tesserocr is None:
+                print("tesserocr no está instalado; se usa pytesseract como motor de OCR")
+                _engines[name] = PytesseractEngine()
+            elif name == "tesserocr":
+                _engines[name] = TesserocrEngine(settings.OCR_ENGINE_POOL_SIZE)
+            elif name == "pytesseract":
+                _engines[name] = PytesseractEngine()
+            else:
+                raise ValueError(f"Motor de OCR no soportado: {name}")
+        return _engines[name]
@@ -1,110 +1,811 @@
-import pytesseract
 from PIL import Image
-from pdf2image import convert_from_path
-import PyPDF2
-from typing import Optional, List
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+import hashlib
+import multiprocessing
 import os
 import tempfile
+import threading
+
+from ..core.cache import DiskCache
+from ..core.config import settings
+from .image_preprocessing import parse_preprocessing_steps, preprocess_image
+from .ocr_engines import get_ocr_engine
+from .text_layer import get_text_layer_backend
+from .pdf_rasterizer import (
+    get_page_count,
+    plan_rasterization,
+    iter_pdf_pages,
+    iter_pdf_page_buffers,
+    image_from_buffer,
+    render_pdf_page
+)
+
+
+# Versión del formato de resultados guardados en caché; incrementarla
+# invalida las entradas existentes cuando cambia el pipeline de extracción
+OCR_CACHE_VERSION = 1
+
+_ocr_executor: Optional[ProcessPoolExecutor] = None
+_ocr_executor_lock = threading.Lock()
+
+
+def _init_ocr_worker():
+    """Inicializa un proceso del pool de OCR"""
+    # Tesseract usa OpenMP internamente; con varios procesos en paralelo
+    # limitarlo a un hilo evita sobresuscribir los núcleos
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def recognize_image(
+    image: Image.Image,
+    lang: str,
+    engine: str,
+    preprocessing: Tuple[str, ...] = (),
+    source_dpi: Optional[float] = None
+) -> str:
+    """
+    Preprocesa una imagen y le aplica OCR con el motor indicado
+
+    Args:
+        image: Imagen a reconocer
+        lang: Idiomas de Tesseract
+        engine: Motor de OCR
+        preprocessing: Pasos de preprocesamiento (ver image_preprocessing)
+        source_dpi: Resolución de la imagen, si se conoce
+
+    Returns:
+        Texto reconocido
+    """
+    image = preprocess_image(image, preprocessing, source_dpi)
+    return get_ocr_engine(engine).image_to_string(image, lang)
+
+
+def ocr_pdf_page(
+    file_path: str,
+    page_number: int,
+    dpi: int,
+    lang: str,
+    engine: str,
+    preprocessing: Tuple[str, ...] = (),
+    adaptive: Optional[Tuple[int, float]] = None,
+    image: Optional[Image.Image] = None
+) -> Dict[str, Any]:
+    """
+    Aplica OCR a una página de un PDF, opcionalmente con DPI adaptativo
+
+    En modo adaptativo la página se reconoce primero a baja resolución y
+    solo se vuelve a rasterizar a `dpi` si la confianza media por palabra
+    de Tesseract queda por debajo del umbral.
+
+    Args:
+        file_path: Ruta al archivo PDF
+        page_number: Número de página (comenzando en 1)
+        dpi: Resolución de rasterización (la alta, en modo adaptativo)
+        lang: Idiomas de Tesseract
+        engine: Motor de OCR
+        preprocessing: Pasos de preprocesamiento de la imagen
+        adaptive: Tupla (DPI bajo, confianza mínima) o None para DPI fijo
+        image: Página ya rasterizada (a DPI bajo en modo adaptativo), si
+            la hay; si no, se rasteriza aquí
+
+    Returns:
+        Dict con text, dpi (la resolución usada finalmente), confidence y
+        escalated (si hubo que volver a rasterizar)
+    """
+    if adaptive is None:
+        if image is None:
+            image = render_pdf_page(file_path, page_number, dpi)
+        if image is None:
+            return {"text": "", "dpi": dpi, "confidence": None, "escalated": False}
+        text = recognize_image(image, lang, engine, preprocessing, source_dpi=dpi)
+        return {"text": text, "dpi": dpi, "confidence": None, "escalated": False}
+
+    low_dpi, min_confidence = adaptive
+    if image is None:
+        image = render_pdf_page(file_path, page_number, low_dpi)
+    if image is None:
+        return {"text": "", "dpi": low_dpi, "confidence": None, "escalated": False}
+
+    text, confidence = get_ocr_engine(engine).image_to_text_and_confidence(
+        preprocess_image(image, preprocessing, low_dpi), lang
+    )
+    if low_dpi >= dpi or (confidence is not None and confidence >= min_confidence):
+        return {"text": text, "dpi": low_dpi, "confidence": confidence, "escalated": False}
+
+    high_image = render_pdf_page(file_path, page_number, dpi)
+    if high_image is None:
+        # No se pudo volver a rasterizar: queda el resultado de baja resolución
+        return {"text": text, "dpi": low_dpi, "confidence": confidence, "escalated": False}
+    try:
+        high_text, high_confidence = get_ocr_engine(engine).image_to_text_and_confidence(
+            preprocess_image(high_image, preprocessing, dpi), lang
+        )
+    finally:
+        high_image.close()
+
+    return {
+        "text": high_text,
+        "dpi": dpi,
+        "confidence": high_confidence,
+        "low_dpi_confidence": confidence,
+        "escalated": True,
+    }
+
+
+def _ocr_pdf_page(
+    file_path: str,
+    page_number: int,
+    dpi: int,
+    lang: str,
+    engine: str,
+    preprocessing: Tuple[str, ...] = (),
+    adaptive: Optional[Tuple[int, float]] = None
+) -> Dict[str, Any]:
+    """
+    Rasteriza y aplica OCR a una única página de un PDF
+
+    Se ejecuta en un proceso del pool, por lo que cada worker renderiza
+    solo su página y no se transfieren imágenes entre procesos.
+    Ver ocr_pdf_page para los argumentos y el resultado.
+    """
+    return ocr_pdf_page(file_path, page_number, dpi, lang, engine, preprocessing, adaptive)
+
+
+def _ocr_shared_page(
+    shared_memory_name: str,
+    mode: str,
+    size: Tuple[int, int],
+    file_path: str,
+    page_number: int,
+    dpi: int,
+    lang: str,
+    engine: str,
+    preprocessing: Tuple[str, ...] = (),
+    adaptive: Optional[Tuple[int, float]] = None
+) -> Dict[str, Any]:
+    """
+    Aplica OCR a una página ya rasterizada en memoria compartida
+
+    Se ejecuta en un proceso del pool: la imagen se arma sobre los píxeles
+    del segmento, sin copiarlos. El segmento lo libera el proceso principal.
+    Ver ocr_pdf_page para los argumentos y el resultado.
+    """
+    shared_memory = SharedMemory(name=shared_memory_name)
+    # El proceso principal es el dueño del segmento: sin esto el
+    # resource_tracker lo daría por filtrado al terminar el worker
+    resource_tracker.unregister(shared_memory._name, "shared_memory")
+    try:
+        image = image_from_buffer(mode, size, shared_memory.buf)
+        try:
+            return ocr_pdf_page(
+                file_path, page_number, dpi, lang, engine, preprocessing, adaptive, image=image
+            )
+        finally:
+            image.close()
+            del image
+    finally:
+        shared_memory.close()
+
+
+class _SharedPageBuffers:
+    """Reserva en memoria compartida los buffers de las páginas rasterizadas"""
+
+    def __init__(self):
+        self._last: Optional[SharedMemory] = None
+
+    def __call__(self, size: int):
+        self._last = SharedMemory(create=True, size=size)
+        return self._last.buf
+
+    def take(self) -> Optional[SharedMemory]:
+        """Devuelve (y olvida) el último segmento reservado"""
+        shared_memory, self._last = self._last, None
+        return shared_memory
+
+
+def _release_shared_memory(shared_memory: Optional[SharedMemory]):
+    """Cierra y elimina un segmento de memoria compartida"""
+    if shared_memory is None:
+        return
+    try:
+        shared_memory.close()
+        shared_memory.unlink()
+    except (BufferError, FileNotFoundError) as e:
+        print(f"Error liberando memoria compartida {shared_memory.name}: {str(e)}")
+
+
+def get_ocr_executor() -> ProcessPoolExecutor:
+    """
+    Obtiene el pool de procesos de OCR compartido por todos los documentos
+
+    El tamaño del pool es el tope global de workers (OCR_MAX_WORKERS).
+    """
+    global _ocr_executor
+
+    with _ocr_executor_lock:
+        if _ocr_executor is None:
+            max_workers = settings.OCR_MAX_WORKERS or os.cpu_count() or 1
+            # "spawn" evita heredar locks tomados por los hilos del servidor
+            _ocr_executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_ocr_worker
+            )
+        return _ocr_executor
+
+
+def shutdown_ocr_executor():
+    """Libera el pool de procesos de OCR si fue creado"""
+    global _ocr_executor
+
+    with _ocr_executor_lock:
+        if _ocr_executor is not None:
+            _ocr_executor.shutdown(wait=False, cancel_futures=True)
+            _ocr_executor = None
+
+
+def _format_page_text(page_report: Dict[str, Any], page_text: str) -> str:
+    """Fragmento de texto de una página tal como se incorpora al documento"""
+    if page_report["source"] == "ocr":
+        return f"\n--- Página {page_report['page']} ---\n{page_text}\n"
+    if page_report["source"] == "text_layer":
+        return page_text + "\n"
+    return ""
+
+
+def hash_file(file_path: str) -> str:
+    """Calcula el SHA-256 del contenido de un archivo"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TextStream:
+    """
+    Texto de un documento que se va extrayendo página por página
+
+    Iterar el stream produce el reporte de cada página (con su fragmento de
+    texto en "text") a medida que se extrae, lo que permite empezar a usar
+    el texto antes de terminar el OCR. complete() extrae las páginas que
+    falten, guarda el resultado en la caché y lo devuelve; puede llamarse
+    más tarde (por ejemplo, en una tarea en segundo plano) para completar
+    un documento cuyo consumo se cortó antes.
+    """
+
+    def __init__(
+        self,
+        pages: Iterator[Dict[str, Any]],
+        preprocessing: Tuple[str, ...],
+        cache: Optional[DiskCache] = None,
+        cache_key: Optional[str] = None,
+        cached_result: Optional[Dict[str, Any]] = None
+    ):
+        self._pages = pages
+        self._reports: List[Dict[str, Any]] = []
+        self._preprocessing = preprocessing
+        self._cache = cache
+        self._cache_key = cache_key
+        self._result = cached_result
+        self.text = cached_result["text"] if cached_result else ""
+        self.cached = cached_result is not None
+
+    @property
+    def finished(self) -> bool:
+        """Si ya se extrajeron todas las páginas"""
+        return self._result is not None
+
+    @property
+    def pages_done(self) -> int:
+        """Cantidad de páginas extraídas hasta el momento"""
+        if self._result is not None:
+            return self._result.get("page_count", 0)
+        return len(self._reports)
+
+    @property
+    def pages(self) -> List[Dict[str, Any]]:
+        """Detalle de las páginas extraídas hasta el momento"""
+        if self._result is not None:
+            return list(self._result.get("pages", []))
+        return list(self._reports)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if self._result is not None:
+            # Resultado completo (de la caché): un único fragmento con todo el texto
+            yield {"page": None, "source": "cache", "text": self.text}
+            return
+
+        for page_report in self._pages:
+            self._reports.append({k: v for k, v in page_report.items() if k != "text"})
+            self.text += page_report["text"]
+            yield page_report
+
+        self._finish()
+
+    def complete(self) -> Dict[str, Any]:
+        """
+        Extrae las páginas restantes y devuelve el resultado completo
+
+        Returns:
+            Dict con el texto ("text"), el detalle por página ("pages") y
+            si el resultado provino de la caché ("cached")
+        """
+        if self._result is None:
+            for _ in self:
+                pass
+        result = dict(self._result)
+        result["cached"] = self.cached
+        return result
+
+    def close(self):
+        """Descarta las páginas pendientes (cancela el OCR en curso)"""
+        if self._result is None:
+            self._pages.close()
+
+    def _finish(self):
+        ocr_reports = [page for page in self._reports if page["source"] == "ocr"]
+        self._result = {
+            "text": self.text.strip(),
+            "page_count": len(self._reports),
+            "text_layer_pages": sum(1 for page in self._reports if page["source"] == "text_layer"),
+            "ocr_pages": len(ocr_reports),
+            "escalated_pages": sum(1 for page in ocr_reports if page.get("escalated")),
+            "pages": self._reports,
+            "preprocessing": list(self._preprocessing),
+        }
+        self.text = self._result["text"]
+
+        # No se guardan extracciones vacías: suelen ser errores transitorios
+        if self._cache is not None and self._cache_key and self._result["text"]:
+            self._cache.set(self._cache_key, self._result)
 
 
 class OCRService:
     """Servicio para extraer texto de PDFs e imágenes"""
 
-    def extract_text_from_pdf(self, file_path: str) -> str:
+    def __init__(self):
+        self.engine = get_ocr_engine()
+        self.text_layer = get_text_layer_backend()
+        self.cache: Optional[DiskCache] = None
+        if settings.OCR_CACHE_ENABLED:
+            self.cache = DiskCache(settings.OCR_CACHE_DIR, settings.OCR_CACHE_MAX_MB * 1024 * 1024)
+
+    def extract_text_from_pdf(self, file_path: str, preprocessing: Tuple[str, ...] = ()) -> str:
         """
         Extrae texto de un archivo PDF
 
         Args:
             file_path: Ruta al archivo PDF
+            preprocessing: Pasos de preprocesamiento para las páginas con OCR
 
         Returns:
             Texto extraído del PDF
         """
-        text_content = ""
+        return TextStream(self._iter_pdf_pages(file_path, preprocessing), preprocessing).complete()["text"]
+
+    def _iter_pdf_pages(self, file_path: str, preprocessing: Tuple[str, ...] = ()) -> Iterator[Dict[str, Any]]:
+        """
+        Extrae el texto de un PDF página por página, en orden
+
+        Las páginas cuya capa de texto tiene al menos OCR_MIN_PAGE_TEXT_CHARS
+        caracteres se usan tal cual; solo las demás se rasterizan y pasan
+        por OCR. Así el costo de OCR depende de las páginas escaneadas y no
+        del total de páginas del documento.
+
+        Args:
+            file_path: Ruta al archivo PDF
+            preprocessing: Pasos de preprocesamiento para las páginas con OCR
+
+        Yields:
+            Reporte de cada página: page, source (text_layer, ocr o skipped),
+            chars, text (fragmento a agregar al documento) y, para las
+            páginas con OCR, el DPI usado y la confianza
+        """
+        layer_texts: Dict[int, str] = {}
+        page_count = None
 
         try:
             # Intentar extraer texto directamente del PDF
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_content += page_text + "\n"
-
-            # Si no se extrajo mucho texto, probablemente sea un PDF con imágenes
-            if len(text_content.strip()) < 100:
-                text_content = self._extract_text_from_pdf_images(file_path)
+            page_texts = self.text_layer.extract_pages(file_path)
+            page_count = len(page_texts)
+            for page_number, page_text in enumerate(page_texts, start=1):
+                if page_text is not None:
+                    layer_texts[page_number] = page_text
 
         except Exception as e:
             print(f"Error extrayendo texto de PDF: {str(e)}")
-            # Intentar con OCR si falla la extracción directa
-            text_content = self._extract_text_from_pdf_images(file_path)
 
-        return text_content.strip()
+        # Si no se pudo leer el PDF se aplica OCR a todas las páginas
+        if page_count is None:
+            try:
+                page_count = get_page_count(file_path)
+            except Exception as e:
+                print(f"Error en OCR de PDF: {str(e)}")
+                return
+
+        text_pages = {
+            page_number for page_number, page_text in layer_texts.items()
+            if len(page_text.strip()) >= settings.OCR_MIN_PAGE_TEXT_CHARS
+        }
+        ocr_candidates = [n for n in range(1, page_count + 1) if n not in text_pages]
 
-    def _extract_text_from_pdf_images(self, file_path: str) -> str:
+        # El OCR se inicia recién cuando se necesita la primera página escaneada
+        ocr_results = self._iter_ocr_results(file_path, ocr_candidates, preprocessing=preprocessing)
+        next_ocr = None
+
+        try:
+            for page_number in range(1, page_count + 1):
+                page_report: Dict[str, Any] = {"page": page_number}
+                page_text = ""
+
+                if page_number in text_pages:
+                    page_text = layer_texts[page_number]
+                    page_report["source"] = "text_layer"
+                else:
+                    if next_ocr is None or next_ocr[0] < page_number:
+                        next_ocr = next(ocr_results, None)
+                    if next_ocr is not None and next_ocr[0] == page_number:
+                        page_ocr = next_ocr[1]
+                        page_text = page_ocr["text"]
+                        page_report["source"] = "ocr"
+                        page_report.update({k: v for k, v in page_ocr.items() if k != "text"})
+                    else:
+                        # Fuera del presupuesto de páginas o error de OCR
+                        page_report["source"] = "skipped"
+
+                page_report["chars"] = len(page_text.strip())
+                page_report["text"] = _format_page_text(page_report, page_text)
+                yield page_report
+        finally:
+            ocr_results.close()
+
+    def _extract_text_from_pdf_images(
+        self,
+        file_path: str,
+        parallel: Optional[bool] = None,
+        preprocessing: Tuple[str, ...] = ()
+    ) -> str:
         """
-        Extrae texto de un PDF usando OCR en las imágenes de cada página
+        Extrae texto de un PDF usando OCR en las imágenes de todas sus páginas
 
         Args:
             file_path: Ruta al archivo PDF
+            parallel: Forzar (True) o desactivar (False) el OCR en paralelo.
+                Por defecto usa OCR_PARALLEL_ENABLED.
+            preprocessing: Pasos de preprocesamiento de las páginas
 
         Returns:
             Texto extraído mediante OCR
         """
         text_content = ""
+        for page_number, page_ocr in self._iter_ocr_results(file_path, parallel=parallel, preprocessing=preprocessing):
+            text_content += f"\n--- Página {page_number} ---\n{page_ocr['text']}\n"
+
+        return text_content
+
+    def _iter_ocr_results(
+        self,
+        file_path: str,
+        page_numbers: Optional[List[int]] = None,
+        parallel: Optional[bool] = None,
+        preprocessing: Tuple[str, ...] = ()
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Aplica OCR a páginas de un PDF, entregando los resultados en orden
+
+        Las páginas se rasterizan de forma perezosa y se liberan apenas se
+        les aplica OCR, respetando los presupuestos de páginas y memoria
+        por documento (ver pdf_rasterizer.plan_rasterization). Con
+        OCR_ADAPTIVE_DPI se reconocen primero a OCR_LOW_DPI y solo se
+        vuelven a rasterizar las páginas con confianza baja.
+
+        Args:
+            file_path: Ruta al archivo PDF
+            page_numbers: Páginas a procesar (por defecto todas)
+            parallel: Forzar (True) o desactivar (False) el OCR en paralelo.
+                Por defecto usa OCR_PARALLEL_ENABLED.
+            preprocessing: Pasos de preprocesamiento de las páginas
+
+        Yields:
+            Tuplas (número de página, resultado de ocr_pdf_page)
+        """
+        if page_numbers is not None and not page_numbers:
+            return
+
+        if parallel is None:
+            parallel = settings.OCR_PARALLEL_ENABLED
 
         try:
-            # Convertir PDF a imágenes
-            images = convert_from_path(file_path, dpi=300)
+            plan = plan_rasterization(file_path, page_numbers=page_numbers)
+            if plan["truncated"]:
+                print(f"OCR limitado a {len(plan['pages'])} páginas por documento: {file_path}")
+
+            plan["adaptive"] = None
+            if settings.OCR_ADAPTIVE_DPI:
+                plan["adaptive"] = (min(settings.OCR_LOW_DPI, plan["dpi"]), settings.OCR_MIN_CONFIDENCE)
 
-            # Aplicar OCR a cada imagen
-            for i, image in enumerate(images):
-                page_text = pytesseract.image_to_string(image, lang='spa+eng')
-                text_content += f"\n--- Página {i+1} ---\n{page_text}\n"
+            if parallel and len(plan["pages"]) > 1:
+                yield from self._ocr_pages_parallel(file_path, plan, preprocessing)
+            else:
+                yield from self._ocr_pages_serial(file_path, plan, preprocessing)
 
         except Exception as e:
             print(f"Error en OCR de PDF: {str(e)}")
 
-        return text_content
+    def _ocr_pages_serial(
+        self,
+        file_path: str,
+        plan: Dict[str, Any],
+        preprocessing: Tuple[str, ...] = ()
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Aplica OCR a las páginas de un PDF en el proceso actual
 
-    def extract_text_from_image(self, file_path: str) -> str:
+        Args:
+            file_path: Ruta al archivo PDF
+            plan: Plan de rasterización (ver plan_rasterization)
+            preprocessing: Pasos de preprocesamiento de las páginas
+
+        Yields:
+            Tuplas (número de página, resultado), en el orden del plan
+        """
+        adaptive = plan.get("adaptive")
+        render_dpi = adaptive[0] if adaptive else plan["dpi"]
+
+        for page_number, image in iter_pdf_pages(file_path, plan["pages"], render_dpi, plan["max_pages_in_memory"]):
+            yield page_number, ocr_pdf_page(
+                file_path, page_number, plan["dpi"], settings.OCR_LANG, settings.OCR_ENGINE,
+                preprocessing, adaptive, image=image
+            )
+
+    def _ocr_pages_parallel(
+        self,
+        file_path: str,
+        plan: Dict[str, Any],
+        preprocessing: Tuple[str, ...] = ()
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Aplica OCR a las páginas de un PDF usando el pool de procesos
+
+        Como máximo hay OCR_MAX_WORKERS_PER_DOCUMENT páginas del documento en
+        vuelo a la vez (y nunca más de las que permite el presupuesto de
+        memoria), de modo que un documento largo no acapara todo el pool.
+        Si el consumidor deja de iterar, las páginas pendientes se cancelan.
+
+        Con OCR_RASTER_BACKEND=pipe las páginas se rasterizan aquí con un
+        único pdftoppm, directamente en memoria compartida, y los workers
+        las leen de ahí sin copias; con pdf2image cada worker rasteriza su
+        página.
+
+        Args:
+            file_path: Ruta al archivo PDF
+            plan: Plan de rasterización (ver plan_rasterization)
+            preprocessing: Pasos de preprocesamiento de las páginas
+
+        Yields:
+            Tuplas (número de página, resultado), en el orden del plan
+        """
+        executor = get_ocr_executor()
+        max_in_flight = max(1, min(settings.OCR_MAX_WORKERS_PER_DOCUMENT, plan["max_pages_in_memory"]))
+        adaptive = plan.get("adaptive")
+
+        page_results: Dict[int, Dict[str, Any]] = {}
+        pending: Dict[Any, Tuple[int, Optional[SharedMemory]]] = {}
+        next_index = 0
+
+        if settings.OCR_RASTER_BACKEND == "pipe":
+            segments = _SharedPageBuffers()
+            rendered_pages = iter_pdf_page_buffers(
+                file_path, plan["pages"], adaptive[0] if adaptive else plan["dpi"], allocate=segments
+            )
+
+            def submit_next():
+                page = next(rendered_pages, None)
+                if page is None:
+                    return None
+                page_number, mode, size, _ = page
+                shared_memory = segments.take()
+                future = executor.submit(
+                    _ocr_shared_page, shared_memory.name, mode, size, file_path, page_number, plan["dpi"],
+                    settings.OCR_LANG, settings.OCR_ENGINE, preprocessing, adaptive
+                )
+                return future, page_number, shared_memory
+        else:
+            rendered_pages = None
+            queued_pages = list(plan["pages"])
+
+            def submit_next():
+                if not queued_pages:
+                    return None
+                page_number = queued_pages.pop(0)
+                future = executor.submit(
+                    _ocr_pdf_page, file_path, page_number, plan["dpi"],
+                    settings.OCR_LANG, settings.OCR_ENGINE, preprocessing, adaptive
+                )
+                return future, page_number, None
+
+        try:
+            exhausted = False
+            while next_index < len(plan["pages"]):
+                while not exhausted and len(pending) < max_in_flight:
+                    submitted = submit_next()
+                    if submitted is None:
+                        exhausted = True
+                        break
+                    future, page_number, shared_memory = submitted
+                    pending[future] = (page_number, shared_memory)
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page_number, shared_memory = pending.pop(future)
+                    _release_shared_memory(shared_memory)
+                    try:
+                        page_results[page_number] = future.result()
+                    except Exception as e:
+                        print(f"Error en OCR de la página {page_number}: {str(e)}")
+                        page_results[page_number] = {
+                            "text": "", "dpi": plan["dpi"], "confidence": None, "escalated": False
+                        }
+
+                # Entregar en orden las páginas consecutivas ya terminadas
+                while next_index < len(plan["pages"]) and plan["pages"][next_index] in page_results:
+                    page_number = plan["pages"][next_index]
+                    next_index += 1
+                    yield page_number, page_results.pop(page_number)
+        finally:
+            for future, (_, shared_memory) in pending.items():
+                future.cancel()
+                # En Linux el segmento sigue accesible para un worker que ya lo abrió
+                _release_shared_memory(shared_memory)
+            if rendered_pages is not None:
+                rendered_pages.close()
+                _release_shared_memory(segments.take())
+
+    def extract_text_from_image(self, file_path: str, preprocessing: Tuple[str, ...] = ()) -> str:
         """
         Extrae texto de una imagen usando OCR
 
         Args:
             file_path: Ruta al archivo de imagen
+            preprocessing: Pasos de preprocesamiento de la imagen
 
         Returns:
             Texto extraído de la imagen
         """
         try:
             image = Image.open(file_path)
-            text = pytesseract.image_to_string(image, lang='spa+eng')
+            text = recognize_image(image, settings.OCR_LANG, settings.OCR_ENGINE, preprocessing)
             return text.strip()
         except Exception as e:
             print(f"Error en OCR de imagen: {str(e)}")
             return ""
 
-    def extract_text(self, file_path: str, file_extension: str) -> str:
+    def _iter_image_pages(self, file_path: str, preprocessing: Tuple[str, ...] = ()) -> Iterator[Dict[str, Any]]:
+        """Reporte de la única "página" de una imagen (ver _iter_pdf_pages)"""
+        text = self.extract_text_from_image(file_path, preprocessing)
+        yield {"page": 1, "source": "ocr", "chars": len(text), "text": text}
+
+    def extract_text(self, file_path: str, file_extension: str, preprocessing: Optional[str] = None) -> str:
         """
         Extrae texto de un archivo según su extensión
 
         Args:
             file_path: Ruta al archivo
             file_extension: Extensión del archivo (.pdf, .png, .jpg, etc.)
+            preprocessing: Perfil o pasos de preprocesamiento de imágenes
+                (por defecto OCR_PREPROCESSING)
 
         Returns:
             Texto extraído del archivo
         """
+        return self.extract_text_detailed(file_path, file_extension, preprocessing)["text"]
+
+    def extract_text_detailed(
+        self,
+        file_path: str,
+        file_extension: str,
+        preprocessing: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Extrae texto de un archivo según su extensión, informando cómo se
+        obtuvo el texto de cada página
+
+        El resultado se guarda en una caché direccionada por contenido, de
+        modo que volver a subir el mismo archivo no repite la extracción.
+
+        Args:
+            file_path: Ruta al archivo
+            file_extension: Extensión del archivo (.pdf, .png, .jpg, etc.)
+            preprocessing: Perfil o pasos de preprocesamiento de imágenes
+                (por defecto OCR_PREPROCESSING)
+
+        Returns:
+            Dict con el texto ("text"), el detalle por página ("pages") y
+            si el resultado provino de la caché ("cached")
+
+        Raises:
+            ValueError: Si la extensión o el preprocesamiento no son válidos
+        """
+        return self.open_text_stream(file_path, file_extension, preprocessing).complete()
+
+    def open_text_stream(
+        self,
+        file_path: str,
+        file_extension: str,
+        preprocessing: Optional[str] = None
+    ) -> TextStream:
+        """
+        Abre un stream que extrae el texto de un archivo página por página
+
+        Si el archivo ya está en la caché, el stream entrega todo el texto de
+        una vez sin extraer nada.
+
+        Args:
+            file_path: Ruta al archivo
+            file_extension: Extensión del archivo (.pdf, .png, .jpg, etc.)
+            preprocessing: Perfil o pasos de preprocesamiento de imágenes
+                (por defecto OCR_PREPROCESSING)
+
+        Returns:
+            TextStream del documento
+
+        Raises:
+            ValueError: Si la extensión o el preprocesamiento no son válidos
+        """
         file_extension = file_extension.lower()
+        steps = parse_preprocessing_steps(preprocessing)
 
         if file_extension == '.pdf':
-            return self.extract_text_from_pdf(file_path)
+            pages = self._iter_pdf_pages(file_path, steps)
         elif file_extension in ['.png', '.jpg', '.jpeg']:
-            return self.extract_text_from_image(file_path)
+            pages = self._iter_image_pages(file_path, steps)
         else:
             raise ValueError(f"Extensión de archivo no soportada: {file_extension}")
 
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(file_path, file_extension, steps)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                pages.close()
+                return TextStream(pages, steps, cached_result=cached)
+
+        return TextStream(pages, steps, self.cache, cache_key)
+
+    def _cache_key(self, file_path: str, file_extension: str, preprocessing: Tuple[str, ...]) -> str:
+        """
+        Clave de caché: SHA-256 del archivo más los parámetros que afectan
+        el texto extraído
+        """
+        return DiskCache.make_key(
+            hash_file(file_path),
+            file_extension,
+            OCR_CACHE_VERSION,
+            self.engine.version(),
+            self.text_layer.version(),
+            settings.OCR_DPI,
+            settings.OCR_RASTER_BACKEND,
+            settings.OCR_LANG,
+            settings.OCR_MIN_PAGE_TEXT_CHARS,
+            settings.OCR_MAX_PAGES,
+            settings.OCR_MAX_RASTER_MEMORY_MB,
+            preprocessing,
+            settings.OCR_PREPROCESS_TARGET_DPI if "downscale" in preprocessing else None,
+            (settings.OCR_LOW_DPI, settings.OCR_MIN_CONFIDENCE) if settings.OCR_ADAPTIVE_DPI else None,
+        )
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Estadísticas de la caché de extracción de texto"""
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.get_stats()}
+
 
 ocr_service = OCRService()
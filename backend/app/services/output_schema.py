@@ -0,0 +1,217 @@
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+import re
+
+from ..models.document import ConfigurableAttribute
+from .prompt_service import DEFAULT_EXTRACTION_FIELDS
+
+# Campos a extraer cuando el tipo de documento no tiene campos por defecto
+FALLBACK_EXTRACTION_FIELDS = ["fecha", "numero_documento", "emisor", "receptor"]
+
+# Campos que suelen contener listas (ítems, partes, normas, ...)
+LIST_FIELDS = {"items", "partes", "normas", "especificaciones"}
+
+# Tokens estimados de la respuesta: por campo, por campo con lista, por
+# texto libre (reasoning) y de la estructura del objeto
+OUTPUT_TOKENS_PER_FIELD = 32
+OUTPUT_TOKENS_PER_LIST = 256
+OUTPUT_TOKENS_PER_TEXT = 96
+OUTPUT_TOKENS_OVERHEAD = 32
+
+# Esquema de la respuesta de clasificación
+CLASSIFICATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "document_type": {"type": "string"},
+        "confidence": {"type": "number"},
+        "reasoning": {"type": "string"}
+    },
+    "required": ["document_type", "confidence", "reasoning"]
+}
+
+
+def default_extraction_fields(document_type: str) -> List[str]:
+    """Campos por defecto a extraer de un tipo de documento"""
+    return DEFAULT_EXTRACTION_FIELDS.get(document_type, FALLBACK_EXTRACTION_FIELDS)
+
+
+def all_extraction_fields() -> List[str]:
+    """Campos por defecto de todos los tipos de documento, sin repetir"""
+    return list(dict.fromkeys(
+        field for document_fields in [*DEFAULT_EXTRACTION_FIELDS.values(), FALLBACK_EXTRACTION_FIELDS]
+        for field in document_fields
+    ))
+
+
+def extraction_fields(document_type: str, prompt_template: Optional[str] = None) -> List[str]:
+    """
+    Campos a extraer de un documento
+
+    Si el prompt de extracción de la BD tiene una línea "Campos a extraer:"
+    (como los prompts por defecto) se usan esos campos; si no, los campos
+    por defecto del tipo de documento.
+
+    Args:
+        document_type: Tipo de documento
+        prompt_template: Template del prompt de extracción activo, si hay uno
+
+    Returns:
+        Lista de nombres de campos
+    """
+    if prompt_template:
+        match = re.search(r"Campos a extraer:\s*(.+)", prompt_template)
+        if match:
+            fields = [field.strip() for field in match.group(1).split(",")]
+            fields = [field for field in fields if re.fullmatch(r"\w+", field)]
+            if fields:
+                return fields
+    return default_extraction_fields(document_type)
+
+
+def restrict_extraction_prompt(prompt_template: str, fields: List[str]) -> str:
+    """
+    Cambia la línea "Campos a extraer:" de un prompt de extracción por otra
+    lista de campos (los prompts sin esa línea quedan igual: el esquema de
+    la respuesta ya limita los campos)
+    """
+    return re.sub(
+        r"(Campos a extraer:[ \t]*).+", lambda match: match.group(1) + ", ".join(fields), prompt_template, count=1
+    )
+
+
+def restrict_attributes(attributes: List[ConfigurableAttribute], fields: List[str]) -> List[ConfigurableAttribute]:
+    """Atributos configurables cuyo campo de primer nivel (ej: "cliente" de "cliente.nombre") está en `fields`"""
+    return [attribute for attribute in attributes if attribute.attribute_key.split(".")[0] in fields]
+
+
+def _attribute_schema(validation_rules: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if validation_rules and validation_rules.get("type") == "numeric":
+        return {"type": ["number", "null"]}
+    return {}
+
+
+def _fields_schema(fields: List[str], attributes: List[ConfigurableAttribute], required: bool) -> Dict[str, Any]:
+    """
+    Objeto JSON con los campos a extraer y las claves de los atributos
+    configurables (con notación de punto, ej: "cliente.nombre", se
+    anidan como objetos)
+    """
+    # Sin tipo: el modelo puede devolver texto, números, listas o null
+    properties: Dict[str, Any] = {field: {} for field in fields}
+
+    for attribute in attributes:
+        keys = attribute.attribute_key.split(".")
+        node = properties
+        for key in keys[:-1]:
+            child = node.get(key)
+            if not child or "properties" not in child:
+                child = {"type": ["object", "null"], "properties": {}}
+                node[key] = child
+            node = child["properties"]
+        if not node.get(keys[-1]):
+            node[keys[-1]] = _attribute_schema(attribute.validation_rules)
+
+    schema = {"type": "object", "properties": properties}
+    if required:
+        schema["required"] = list(properties)
+    return schema
+
+
+def get_attributes(db: Session) -> List[ConfigurableAttribute]:
+    """Atributos configurables, cuyas claves deben estar en los datos extraídos"""
+    return db.query(ConfigurableAttribute).all()
+
+
+def missing_required_attributes(data: Any, attributes: List[ConfigurableAttribute]) -> List[str]:
+    """
+    Claves de los atributos requeridos (is_required) sin valor en los datos
+    extraídos
+
+    Args:
+        data: Datos extraídos (las claves con notación de punto se buscan
+            en los objetos anidados, como en la comparación)
+        attributes: Atributos configurables
+
+    Returns:
+        Claves de los atributos requeridos que faltan o son null
+    """
+    missing = []
+    for attribute in attributes:
+        if not attribute.is_required:
+            continue
+        value = data
+        for key in attribute.attribute_key.split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+        if value in (None, ""):
+            missing.append(attribute.attribute_key)
+    return missing
+
+
+def build_extraction_schema(fields: List[str], attributes: List[ConfigurableAttribute]) -> Dict[str, Any]:
+    """
+    Esquema JSON de la respuesta de extracción
+
+    Todos los campos son obligatorios (con null si no están en el
+    documento), igual que pide el prompt.
+
+    Args:
+        fields: Campos a extraer
+        attributes: Atributos configurables
+
+    Returns:
+        Esquema JSON para el parámetro format de Ollama
+    """
+    return _fields_schema(fields, attributes, required=True)
+
+
+def build_classification_extraction_schema(attributes: List[ConfigurableAttribute]) -> Dict[str, Any]:
+    """
+    Esquema JSON de la respuesta combinada de clasificación y extracción
+
+    "fields" admite los campos de cualquier tipo de documento (el modelo
+    incluye solo los de la categoría elegida), más los atributos
+    configurables.
+    """
+    return {
+        "type": "object",
+        "properties": {
+            **CLASSIFICATION_SCHEMA["properties"],
+            "fields": _fields_schema(all_extraction_fields(), attributes, required=False)
+        },
+        "required": [*CLASSIFICATION_SCHEMA["required"], "fields"]
+    }
+
+
+def estimate_output_tokens(schema: Dict[str, Any]) -> int:
+    """
+    Tokens que se esperan en una respuesta que cumple el esquema
+
+    Args:
+        schema: Esquema JSON de la respuesta
+
+    Returns:
+        Estimación de tokens de salida (para num_predict)
+    """
+    def field_tokens(name: str, field_schema: Dict[str, Any]) -> int:
+        if field_schema.get("properties"):
+            return sum(field_tokens(key, value) for key, value in field_schema["properties"].items())
+        if name in LIST_FIELDS:
+            return OUTPUT_TOKENS_PER_LIST
+        if name == "reasoning":
+            return OUTPUT_TOKENS_PER_TEXT
+        return OUTPUT_TOKENS_PER_FIELD
+
+    return OUTPUT_TOKENS_OVERHEAD + field_tokens("", schema)
+
+
+def estimate_classification_extraction_tokens(attributes: List[ConfigurableAttribute]) -> int:
+    """
+    Tokens esperados de la respuesta combinada de clasificación y extracción
+
+    "fields" lleva solo los campos de la categoría elegida, así que se toma
+    el tipo de documento con la respuesta más larga (no la suma de todos).
+    """
+    document_fields = [*DEFAULT_EXTRACTION_FIELDS.values(), FALLBACK_EXTRACTION_FIELDS]
+    return estimate_output_tokens(CLASSIFICATION_SCHEMA) + max(
+        estimate_output_tokens(build_extraction_schema(fields, attributes)) for fields in document_fields
+    )
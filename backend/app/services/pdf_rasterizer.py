@@ -0,0 +1,276 @@
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+import math
+import re
+import subprocess
+import tempfile
+
+from ..core.config import settings
+
+
+RASTER_BACKENDS = ["pipe", "pdf2image"]
+
+# Modos de imagen de los formatos PNM que produce pdftoppm
+PNM_MODES = {b"P5": ("L", 1), b"P6": ("RGB", 3)}
+
+# Tamaño A4 en puntos, usado si pdfinfo no informa el tamaño de página
+DEFAULT_PAGE_SIZE_PTS = (595.276, 841.89)
+
+
+def _parse_page_size(page_size: Optional[str]) -> Tuple[float, float]:
+    """Interpreta el campo "Page size" de pdfinfo (ej: "612 x 792 pts (letter)")"""
+    if page_size:
+        match = re.match(r"\s*([\d.]+)\s*x\s*([\d.]+)", page_size)
+        if match:
+            return float(match.group(1)), float(match.group(2))
+    return DEFAULT_PAGE_SIZE_PTS
+
+
+def estimate_page_bytes(page_size_pts: Tuple[float, float], dpi: int) -> int:
+    """
+    Estima la memoria de una página rasterizada en RGB
+
+    Args:
+        page_size_pts: Ancho y alto de la página en puntos (1/72 de pulgada)
+        dpi: Resolución de rasterización
+
+    Returns:
+        Bytes aproximados de la imagen en memoria
+    """
+    width_px = page_size_pts[0] / 72 * dpi
+    height_px = page_size_pts[1] / 72 * dpi
+    return int(width_px * height_px * 3)
+
+
+def get_page_count(file_path: str) -> int:
+    """Cantidad de páginas de un PDF según pdfinfo"""
+    return int(pdfinfo_from_path(file_path)["Pages"])
+
+
+def plan_rasterization(
+    file_path: str,
+    dpi: Optional[int] = None,
+    page_numbers: Optional[List[int]] = None
+) -> Dict[str, Any]:
+    """
+    Calcula cómo rasterizar un PDF respetando los presupuestos por documento
+
+    - OCR_MAX_PAGES limita la cantidad de páginas que se procesan
+    - OCR_MAX_RASTER_MEMORY_MB limita la memoria de las páginas que pueden
+      estar rasterizadas a la vez; si una sola página no entra en el
+      presupuesto se reduce la resolución
+
+    Args:
+        file_path: Ruta al archivo PDF
+        dpi: Resolución deseada (por defecto OCR_DPI)
+
+    Returns:
+        Dict con page_count, pages (páginas a procesar), dpi,
+        max_pages_in_memory y truncated
+    """
+    dpi = dpi or settings.OCR_DPI
+    info = pdfinfo_from_path(file_path)
+    page_count = int(info["Pages"])
+    page_size = _parse_page_size(info.get("Page size"))
+
+    if page_numbers is None:
+        page_numbers = list(range(1, page_count + 1))
+    candidates = [page_number for page_number in page_numbers if 1 <= page_number <= page_count]
+
+    pages = candidates
+    if settings.OCR_MAX_PAGES > 0:
+        pages = candidates[:settings.OCR_MAX_PAGES]
+
+    max_pages_in_memory = max(1, settings.OCR_PAGE_WINDOW)
+    if settings.OCR_MAX_RASTER_MEMORY_MB > 0:
+        budget = settings.OCR_MAX_RASTER_MEMORY_MB * 1024 * 1024
+        page_bytes = estimate_page_bytes(page_size, dpi)
+        if page_bytes > budget:
+            dpi = max(72, int(dpi * math.sqrt(budget / page_bytes)))
+            page_bytes = estimate_page_bytes(page_size, dpi)
+        max_pages_in_memory = max(1, min(max_pages_in_memory, budget // max(1, page_bytes)))
+
+    return {
+        "page_count": page_count,
+        "pages": pages,
+        "dpi": dpi,
+        "max_pages_in_memory": max_pages_in_memory,
+        "truncated": len(pages) < len(candidates),
+    }
+
+
+def _page_windows(page_numbers: List[int], window: int) -> Iterator[Tuple[int, int]]:
+    """Agrupa páginas consecutivas en rangos (first_page, last_page) de a lo sumo `window` páginas"""
+    start = None
+    previous = None
+    for page_number in page_numbers:
+        if start is None:
+            start = previous = page_number
+        elif page_number == previous + 1 and page_number - start < window:
+            previous = page_number
+        else:
+            yield start, previous
+            start = previous = page_number
+    if start is not None:
+        yield start, previous
+
+
+def _read_pnm_header(stream) -> Optional[Tuple[str, Tuple[int, int], int]]:
+    """
+    Lee el encabezado de una imagen PNM binaria (P5/P6) de un stream
+
+    Returns:
+        Tupla (modo PIL, (ancho, alto), bytes por píxel) o None si el
+        stream terminó
+    """
+    tokens: List[bytes] = []
+    token = b""
+    while len(tokens) < 4:
+        char = stream.read(1)
+        if not char:
+            if tokens or token:
+                raise ValueError("Encabezado PNM incompleto")
+            return None
+        if char == b"#":
+            stream.readline()
+        elif char.isspace():
+            if token:
+                tokens.append(token)
+                token = b""
+        else:
+            token += char
+
+    magic, width, height, maxval = tokens
+    if magic not in PNM_MODES or int(maxval) != 255:
+        raise ValueError(f"Formato PNM no soportado: {magic!r} (maxval {maxval!r})")
+    mode, bytes_per_pixel = PNM_MODES[magic]
+    return mode, (int(width), int(height)), bytes_per_pixel
+
+
+def _read_exact(stream, buffer) -> None:
+    """Llena `buffer` con bytes del stream, sin copias intermedias"""
+    with memoryview(buffer) as view:
+        position = 0
+        while position < len(view):
+            read = stream.readinto(view[position:])
+            if not read:
+                raise ValueError("Imagen PNM truncada")
+            position += read
+
+
+def iter_pdf_page_buffers(
+    file_path: str,
+    page_numbers: List[int],
+    dpi: int,
+    allocate: Callable[[int], Any] = bytearray
+) -> Iterator[Tuple[int, str, Tuple[int, int], Any]]:
+    """
+    Rasteriza páginas de un PDF con pdftoppm, leyendo los píxeles de un pipe
+
+    pdftoppm escribe las páginas como PGM (escala de grises) por stdout y
+    cada una se lee directamente en un buffer obtenido de `allocate`, sin
+    archivos temporales ni decodificación. Como el pipe tiene capacidad
+    acotada, poppler se detiene mientras el consumidor no pide la página
+    siguiente: la memoria queda limitada a los buffers que siguen vivos.
+
+    Args:
+        file_path: Ruta al archivo PDF
+        page_numbers: Páginas a rasterizar (comenzando en 1), en orden
+        dpi: Resolución de rasterización
+        allocate: Función que recibe un tamaño en bytes y devuelve un
+            buffer escribible de ese tamaño (por defecto un bytearray;
+            puede ser memoria compartida entre procesos)
+
+    Yields:
+        Tuplas (número de página, modo PIL, (ancho, alto), buffer)
+    """
+    for first_page, last_page in _page_windows(page_numbers, max(1, len(page_numbers))):
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(
+                ["pdftoppm", "-gray", "-r", str(dpi), "-f", str(first_page), "-l", str(last_page), file_path],
+                stdout=subprocess.PIPE,
+                stderr=stderr
+            )
+            try:
+                page_number = first_page
+                while True:
+                    header = _read_pnm_header(process.stdout)
+                    if header is None:
+                        break
+                    mode, size, bytes_per_pixel = header
+                    buffer = allocate(size[0] * size[1] * bytes_per_pixel)
+                    _read_exact(process.stdout, buffer)
+                    yield page_number, mode, size, buffer
+                    page_number += 1
+
+                if process.wait() != 0:
+                    stderr.seek(0)
+                    message = stderr.read().decode(errors="replace").strip()
+                    raise RuntimeError(f"pdftoppm terminó con código {process.returncode}: {message}")
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                process.stdout.close()
+                process.wait()
+
+
+def image_from_buffer(mode: str, size: Tuple[int, int], buffer) -> Image.Image:
+    """Imagen PIL que usa directamente los píxeles de `buffer` (sin copiarlos)"""
+    return Image.frombuffer(mode, size, buffer, "raw", mode, 0, 1)
+
+
+def render_pdf_page(file_path: str, page_number: int, dpi: int) -> Optional[Image.Image]:
+    """Rasteriza una única página de un PDF con el backend configurado"""
+    for _, image in iter_pdf_pages(file_path, [page_number], dpi):
+        # La imagen se copia porque iter_pdf_pages la cierra al avanzar
+        return image.copy()
+    return None
+
+
+def iter_pdf_pages(
+    file_path: str,
+    page_numbers: List[int],
+    dpi: int,
+    window: int = 1
+) -> Iterator[Tuple[int, Image.Image]]:
+    """
+    Rasteriza páginas de un PDF de forma perezosa, por ventanas
+
+    Con OCR_RASTER_BACKEND=pipe las páginas se leen de pdftoppm a medida
+    que se piden (ver iter_pdf_page_buffers); con pdf2image se renderizan
+    `window` páginas a la vez (con first_page/last_page). Cada imagen se
+    cierra cuando el consumidor pide la siguiente, de modo que la memoria
+    queda acotada a la ventana actual.
+
+    Args:
+        file_path: Ruta al archivo PDF
+        page_numbers: Páginas a rasterizar (comenzando en 1), en orden
+        dpi: Resolución de rasterización
+        window: Máximo de páginas rasterizadas en memoria
+
+    Yields:
+        Tuplas (número de página, imagen)
+    """
+    if settings.OCR_RASTER_BACKEND == "pipe":
+        for page_number, mode, size, buffer in iter_pdf_page_buffers(file_path, page_numbers, dpi):
+            image = image_from_buffer(mode, size, buffer)
+            try:
+                yield page_number, image
+            finally:
+                image.close()
+        return
+
+    for first_page, last_page in _page_windows(page_numbers, max(1, window)):
+        images = convert_from_path(file_path, dpi=dpi, first_page=first_page, last_page=last_page)
+        try:
+            while images:
+                image = images.pop(0)
+                try:
+                    yield first_page, image
+                finally:
+                    image.close()
+                first_page += 1
+        finally:
+            for image in images:
+                image.close()
@@ -1,9 +1,87 @@
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
+import re
+from ..core.config import settings
 from ..models.document import PromptTemplate
 from ..schemas.document import PromptTemplateCreate, PromptTemplateUpdate
 
 
+# Tipos de prompt soportados
+PROMPT_TYPES = ["classification", "extraction", "classification_extraction"]
+
+# Campos por defecto a extraer de cada tipo de documento
+DEFAULT_EXTRACTION_FIELDS = {
+    "factura": ["numero_factura", "fecha", "proveedor", "cliente", "monto_total", "moneda", "items"],
+    "orden_compra": ["numero_orden", "fecha", "proveedor", "cliente", "items", "monto_total"],
+    "certificado_origen": ["numero_certificado", "fecha", "pais_origen", "producto", "exportador"],
+    "especificacion_tecnica": ["producto", "modelo", "especificaciones", "normas"],
+    "contrato": ["numero_contrato", "fecha", "partes", "objeto", "monto"],
+    "remito": ["numero_remito", "fecha", "origen", "destino", "items"]
+}
+
+# Instrucciones con las que empiezan todos los prompts en el orden "prefix"
+# (LLM_PROMPT_LAYOUT): como el comienzo es idéntico en cada llamada, Ollama
+# reutiliza de su caché KV los tokens ya evaluados en vez de recalcularlos
+PROMPT_PREFIX = """Eres un asistente que analiza documentos comerciales y de comercio exterior (facturas, órdenes de compra, certificados de origen, especificaciones técnicas, contratos y remitos).
+Respondes siempre con un único objeto JSON válido, sin texto antes ni después."""
+
+# Prompt por defecto para clasificar documentos
+DEFAULT_CLASSIFICATION_PROMPT = """Analiza el siguiente contenido de documento y clasifícalo en una de estas categorías:
+- factura
+- orden_compra
+- certificado_origen
+- especificacion_tecnica
+- contrato
+- remito
+- otro
+
+Contenido del documento:
+{text_content}
+
+Responde ÚNICAMENTE con un JSON en el siguiente formato:
+{{"document_type": "tipo_de_documento", "confidence": 0.95, "reasoning": "breve explicación"}}"""
+
+
+def default_extraction_prompt(document_type: str, fields: List[str]) -> str:
+    """
+    Prompt por defecto para extraer los campos de un tipo de documento
+
+    Las instrucciones y el formato de respuesta, iguales para todos los
+    tipos, van antes del tipo y los campos: el comienzo del prompt se
+    repite entre documentos de distinto tipo.
+    """
+    return f"""Extrae del documento la información indicada en "Campos a extraer".
+Responde ÚNICAMENTE con un JSON con esos campos. Si un campo no está presente, usa null.
+Formato de respuesta:
+{{{{
+  "campo1": "valor1",
+  "campo2": "valor2",
+  ...
+}}}}
+
+Tipo de documento: "{document_type}"
+Campos a extraer: {', '.join(fields)}
+
+Contenido del documento:
+{{text_content}}"""
+
+
+# Prompt por defecto para clasificar y extraer datos en una sola generación
+DEFAULT_CLASSIFICATION_EXTRACTION_PROMPT = """Analiza el siguiente contenido de documento, clasifícalo en una de estas categorías y extrae sus datos:
+""" + "\n".join(
+    f"- {document_type}: {', '.join(fields)}" for document_type, fields in DEFAULT_EXTRACTION_FIELDS.items()
+) + """
+- otro: fecha, numero_documento, emisor, receptor
+
+Los campos a extraer dependen de la categoría (se indican junto a cada una).
+
+Contenido del documento:
+{text_content}
+
+Responde ÚNICAMENTE con un JSON en el siguiente formato. En "fields" incluye solo los campos de la categoría elegida; si un campo no está presente, usa null:
+{{"document_type": "tipo_de_documento", "confidence": 0.95, "reasoning": "breve explicación", "fields": {{"campo1": "valor1", "campo2": "valor2"}}}}"""
+
+
 class PromptService:
     """Servicio para gestionar plantillas de prompts"""
 
@@ -56,6 +134,14 @@ class PromptService:
             PromptTemplate.is_active == 1
         ).first()
 
+    @staticmethod
+    def get_classification_extraction_prompt(db: Session) -> Optional[PromptTemplate]:
+        """Obtener el prompt activo de clasificación y extracción combinadas"""
+        return db.query(PromptTemplate).filter(
+            PromptTemplate.prompt_type == "classification_extraction",
+            PromptTemplate.is_active == 1
+        ).first()
+
     @staticmethod
     def update_prompt(db: Session, prompt_id: int, prompt_data: PromptTemplateUpdate) -> Optional[PromptTemplate]:
         """Actualizar un prompt existente"""
@@ -99,12 +185,50 @@ class PromptService:
         except KeyError as e:
             raise ValueError(f"Variable faltante en el template: {e}")
 
+    @staticmethod
+    def apply_layout(prompt_template: str) -> str:
+        """
+        Ordena un template según LLM_PROMPT_LAYOUT
+
+        Con "prefix" el template queda como PROMPT_PREFIX, luego sus
+        instrucciones (categorías, campos y formato de respuesta) y al final
+        la sección con {text_content} (la línea de la variable y su título,
+        si la línea anterior termina en ":"). Así todo lo que precede al
+        documento se repite igual entre llamadas del mismo tipo y Ollama lo
+        toma de la caché KV. Con "template" se usa el template tal cual.
+
+        Args:
+            prompt_template: Template con la variable {text_content}
+
+        Returns:
+            Template reordenado (sin cambios si no tiene {text_content})
+        """
+        if settings.LLM_PROMPT_LAYOUT != "prefix" or "{text_content}" not in prompt_template:
+            return prompt_template
+
+        lines = prompt_template.strip().splitlines()
+        index = next(i for i, line in enumerate(lines) if "{text_content}" in line)
+        start = index - 1 if index > 0 and lines[index - 1].rstrip().endswith(":") else index
+
+        instructions = "\n".join(lines[:start] + lines[index + 1:]).strip()
+        instructions = re.sub(r"\n{3,}", "\n\n", instructions)
+        if instructions.startswith(PROMPT_PREFIX):
+            instructions = instructions[len(PROMPT_PREFIX):].lstrip()
+        document = "\n".join(lines[start:index + 1])
+        return f"{PROMPT_PREFIX}\n\n{instructions}\n\n{document}"
+
     @staticmethod
     def initialize_default_prompts(db: Session):
         """Inicializar prompts por defecto si no existen"""
 
-        # Verificar si ya existen prompts
         existing_prompts = db.query(PromptTemplate).count()
+
+        # El prompt combinado se agregó después: se crea también en BDs ya inicializadas
+        if not PromptService.get_prompt_by_name(db, "default_classification_extraction"):
+            db.add(PromptService._default_classification_extraction_prompt())
+            db.commit()
+
+        # Verificar si ya existían prompts
         if existing_prompts > 0:
             return
 
@@ -113,20 +237,7 @@ class PromptService:
             name="default_classification",
             prompt_type="classification",
             document_type=None,
-            prompt_template="""Analiza el siguiente contenido de documento y clasifícalo en una de estas categorías:
-- factura
-- orden_compra
-- certificado_origen
-- especificacion_tecnica
-- contrato
-- remito
-- otro
-
-Contenido del documento:
-{text_content}
-
-Responde ÚNICAMENTE con un JSON en el siguiente formato:
-{{"document_type": "tipo_de_documento", "confidence": 0.95, "reasoning": "breve explicación"}}""",
+            prompt_template=DEFAULT_CLASSIFICATION_PROMPT,
             description="Prompt por defecto para clasificación de documentos",
             is_active=1,
             variables={
@@ -137,35 +248,11 @@ Responde ÚNICAMENTE con un JSON en el siguiente formato:
         # Prompts de extracción por tipo de documento
         extraction_prompts = [
             {
-                "name": "extraction_factura",
-                "document_type": "factura",
-                "fields": ["numero_factura", "fecha", "proveedor", "cliente", "monto_total", "moneda", "items"]
-            },
-            {
-                "name": "extraction_orden_compra",
-                "document_type": "orden_compra",
-                "fields": ["numero_orden", "fecha", "proveedor", "cliente", "items", "monto_total"]
-            },
-            {
-                "name": "extraction_certificado_origen",
-                "document_type": "certificado_origen",
-                "fields": ["numero_certificado", "fecha", "pais_origen", "producto", "exportador"]
-            },
-            {
-                "name": "extraction_especificacion_tecnica",
-                "document_type": "especificacion_tecnica",
-                "fields": ["producto", "modelo", "especificaciones", "normas"]
-            },
-            {
-                "name": "extraction_contrato",
-                "document_type": "contrato",
-                "fields": ["numero_contrato", "fecha", "partes", "objeto", "monto"]
-            },
-            {
-                "name": "extraction_remito",
-                "document_type": "remito",
-                "fields": ["numero_remito", "fecha", "origen", "destino", "items"]
+                "name": f"extraction_{document_type}",
+                "document_type": document_type,
+                "fields": fields
             }
+            for document_type, fields in DEFAULT_EXTRACTION_FIELDS.items()
         ]
 
         prompts_to_add = [classification_prompt]
@@ -175,20 +262,9 @@ Responde ÚNICAMENTE con un JSON en el siguiente formato:
                 name=extraction_config["name"],
                 prompt_type="extraction",
                 document_type=extraction_config["document_type"],
-                prompt_template=f"""Extrae la siguiente información del documento de tipo "{extraction_config["document_type"]}":
-
-Campos a extraer: {', '.join(extraction_config["fields"])}
-
-Contenido del documento:
-{{text_content}}
-
-Responde ÚNICAMENTE con un JSON con los campos encontrados. Si un campo no está presente, usa null.
-Formato de respuesta:
-{{
-  "campo1": "valor1",
-  "campo2": "valor2",
-  ...
-}}""",
+                prompt_template=default_extraction_prompt(
+                    extraction_config["document_type"], extraction_config["fields"]
+                ),
                 description=f"Prompt por defecto para extracción de datos de {extraction_config['document_type']}",
                 is_active=1,
                 variables={
@@ -202,5 +278,20 @@ Formato de respuesta:
         db.add_all(prompts_to_add)
         db.commit()
 
+    @staticmethod
+    def _default_classification_extraction_prompt() -> PromptTemplate:
+        """Prompt por defecto de clasificación y extracción combinadas"""
+        return PromptTemplate(
+            name="default_classification_extraction",
+            prompt_type="classification_extraction",
+            document_type=None,
+            prompt_template=DEFAULT_CLASSIFICATION_EXTRACTION_PROMPT,
+            description="Prompt por defecto para clasificar y extraer datos en una sola llamada al modelo",
+            is_active=1,
+            variables={
+                "text_content": "Contenido de texto del documento (primeros 4000 caracteres)"
+            }
+        )
+
 
 prompt_service = PromptService()
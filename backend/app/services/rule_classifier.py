@@ -0,0 +1,101 @@
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+import re
+
+from .text_normalization import normalize_text
+
+# Reglas por tipo de documento: (patrón sobre el texto sin acentos y en
+# minúsculas, peso). Los anclados con ^ buscan el título al comienzo de una
+# línea, sin ":" detrás (que indicaría un campo, como "Remito: 0001-...").
+# Los códigos de comprobante son los de AFIP (01/06/11/19/51 facturas
+# A/B/C/E/M, 91 remito R)
+RULES: Dict[str, List[Tuple[str, float]]] = {
+    "factura": [
+        (r"^\W*factura\b(?!\s*:)", 3.0),
+        (r"\bfactura\s+(?:de credito electronica\s+)?[abcem]\b", 3.0),
+        (r"\bcod(?:igo)?\.?\s*(?:n\W?\s*)?0?(?:01|06|11|19|51)\b", 2.0),
+        (r"^\W*invoice\b(?!\s*:)|\bcommercial invoice\b", 3.0),
+        (r"\bcae\b", 1.5),
+        (r"\bneto gravado\b|\biva\s+(?:21|10[.,]5)\s*%", 1.0),
+    ],
+    "remito": [
+        (r"^\W*remito\b(?!\s*:)", 3.0),
+        (r"\bremito\s+r\b", 3.0),
+        (r"\bcod(?:igo)?\.?\s*(?:n\W?\s*)?0?91\b", 2.0),
+        (r"\bdocumento no valido como factura\b", 2.5),
+        (r"\bnota de entrega\b|\bdelivery note\b|\bpacking list\b", 2.0),
+        (r"\bcai\b", 1.0),
+    ],
+    "orden_compra": [
+        (r"^\W*orden de compra\b(?!\s*:)", 3.0),
+        (r"\borden de compra\b|\bpurchase order\b", 2.0),
+        (r"\bnota de pedido\b", 2.0),
+        (r"^\W*o\.?\s*c\.?\s*(?:n\W|nro|#)", 1.5),
+    ],
+    "certificado_origen": [
+        (r"\bcertificado de origen\b|\bcertificate of origin\b", 4.0),
+        (r"\bcriterio de origen\b|\borigin criteri", 1.5),
+        (r"\bmercosur\b|\baladi\b|\bace\s*\d+\b", 1.0),
+    ],
+    "especificacion_tecnica": [
+        (r"^\W*(?:especificacion(?:es)? tecnicas?|ficha tecnica|hoja de datos|datasheet)\b(?!\s*:)", 3.0),
+        (r"\bespecificacion(?:es)? tecnicas?\b|\bficha tecnica\b|\bdata\s?sheet\b|\btechnical specification", 2.0),
+    ],
+    "contrato": [
+        (r"^\W*(?:contrato|contract)\b(?!\s*:)", 3.0),
+        (r"\bcontrato de\b", 2.0),
+        (r"\bclausula (?:primera|1\b)", 2.0),
+        (r"\bentre las partes\b|\bse conviene\b|\bconvienen en celebrar\b", 1.5),
+    ],
+}
+
+# Puntaje que se suma al denominador de la confianza: con pocas reglas
+# cumplidas la confianza queda baja aunque no compita otro tipo
+RULE_PRIOR = 1.0
+
+_COMPILED: Dict[str, List[Tuple[Pattern, float]]] = {
+    document_type: [(re.compile(pattern, re.MULTILINE), weight) for pattern, weight in rules]
+    for document_type, rules in RULES.items()
+}
+
+
+def classify_by_rules(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Clasifica un documento con reglas de palabras clave ponderadas
+
+    Cada tipo suma el peso de sus reglas que aparecen en el texto. La
+    confianza es puntaje / (puntaje + puntaje del segundo tipo +
+    RULE_PRIOR): alta solo si el título o varios indicios coinciden y
+    ningún otro tipo compite (una factura que cita su orden de compra queda
+    por debajo del umbral y la clasifica el modelo).
+
+    Args:
+        text: Comienzo del texto del documento
+
+    Returns:
+        Dict con document_type, confidence y reasoning (las reglas
+        cumplidas), o None si no se cumple ninguna regla
+    """
+    normalized = normalize_text(text)
+    scores: List[Tuple[float, str, List[str]]] = []
+    for document_type, rules in _COMPILED.items():
+        matches = []
+        score = 0.0
+        for pattern, weight in rules:
+            match = pattern.search(normalized)
+            if match:
+                score += weight
+                matches.append(" ".join(match.group(0).split()))
+        if score > 0:
+            scores.append((score, document_type, matches))
+
+    if not scores:
+        return None
+
+    scores.sort(key=lambda item: -item[0])
+    score, document_type, matches = scores[0]
+    second = scores[1][0] if len(scores) > 1 else 0.0
+    return {
+        "document_type": document_type,
+        "confidence": round(score / (score + second + RULE_PRIOR), 3),
+        "reasoning": f"Reglas: {', '.join(dict.fromkeys(matches))}",
+    }
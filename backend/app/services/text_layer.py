@@ -0,0 +1,161 @@
+import PyPDF2
+from typing import Dict, List, Optional
+import shutil
+import subprocess
+
+from ..core.config import settings
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:  # Dependencia opcional: pip install pymupdf
+    fitz = None
+
+
+class TextLayerBackend:
+    """Interfaz común de los extractores de la capa de texto de un PDF"""
+
+    name = "base"
+
+    def extract_pages(self, file_path: str) -> List[Optional[str]]:
+        """
+        Extrae el texto de cada página de un PDF
+
+        Args:
+            file_path: Ruta al archivo PDF
+
+        Returns:
+            Lista con el texto de cada página, en orden (None si no se pudo
+            extraer esa página)
+
+        Raises:
+            Exception: Si no se pudo leer el documento
+        """
+        raise NotImplementedError
+
+    def version(self) -> str:
+        """Versión del extractor (forma parte de la clave de caché de OCR)"""
+        raise NotImplementedError
+
+
+class PyPDF2Backend(TextLayerBackend):
+    """Extractor en Python puro basado en PyPDF2"""
+
+    name = "pypdf2"
+
+    def extract_pages(self, file_path: str) -> List[Optional[str]]:
+        texts: List[Optional[str]] = []
+        with open(file_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            for page_number, page in enumerate(pdf_reader.pages, start=1):
+                try:
+                    texts.append(page.extract_text() or "")
+                except Exception as e:
+                    print(f"Error extrayendo texto de la página {page_number}: {str(e)}")
+                    texts.append(None)
+        return texts
+
+    def version(self) -> str:
+        return f"pypdf2-{PyPDF2.__version__}"
+
+
+class PdftotextBackend(TextLayerBackend):
+    """
+    Extractor basado en `pdftotext` de poppler-utils
+
+    Procesa todo el documento en una sola invocación; con -layout conserva
+    la disposición en columnas de tablas e ítems de facturas.
+    """
+
+    name = "pdftotext"
+
+    def __init__(self, layout: bool = True):
+        self.layout = layout
+        self._version: Optional[str] = None
+
+    @staticmethod
+    def available() -> bool:
+        return shutil.which("pdftotext") is not None
+
+    def extract_pages(self, file_path: str) -> List[Optional[str]]:
+        command = ["pdftotext", "-enc", "UTF-8"]
+        if self.layout:
+            command.append("-layout")
+        result = subprocess.run(command + [file_path, "-"], capture_output=True, check=True)
+
+        # pdftotext separa las páginas con un salto de página (\f) al final de cada una
+        pages = result.stdout.decode("utf-8", errors="replace").split("\f")
+        if pages and not pages[-1].strip():
+            pages.pop()
+        return pages
+
+    def version(self) -> str:
+        if self._version is None:
+            try:
+                result = subprocess.run(["pdftotext", "-v"], capture_output=True)
+                banner = (result.stderr or result.stdout).decode(errors="replace").splitlines()
+                version = banner[0] if banner else "unknown"
+            except Exception:
+                version = "unknown"
+            self._version = f"pdftotext-{version}-layout={self.layout}"
+        return self._version
+
+
+class PyMuPDFBackend(TextLayerBackend):
+    """Extractor basado en MuPDF (opcional, requiere pymupdf)"""
+
+    name = "pymupdf"
+
+    def extract_pages(self, file_path: str) -> List[Optional[str]]:
+        texts: List[Optional[str]] = []
+        with fitz.open(file_path) as document:
+            for page_number, page in enumerate(document, start=1):
+                try:
+                    texts.append(page.get_text())
+                except Exception as e:
+                    print(f"Error extrayendo texto de la página {page_number}: {str(e)}")
+                    texts.append(None)
+        return texts
+
+    def version(self) -> str:
+        return f"pymupdf-{fitz.VersionBind}"
+
+
+def available_text_layer_backends() -> List[str]:
+    """Nombres de los extractores utilizables en este entorno"""
+    names = [PyPDF2Backend.name]
+    if PdftotextBackend.available():
+        names.append(PdftotextBackend.name)
+    if fitz is not None:
+        names.append(PyMuPDFBackend.name)
+    return names
+
+
+_backends: Dict[str, TextLayerBackend] = {}
+
+
+def get_text_layer_backend(name: Optional[str] = None) -> TextLayerBackend:
+    """
+    Obtiene el extractor de capa de texto configurado (OCR_TEXT_LAYER_BACKEND)
+
+    Si el extractor pedido no está disponible se usa PyPDF2.
+
+    Args:
+        name: Nombre del extractor (pypdf2, pdftotext o pymupdf)
+
+    Returns:
+        Instancia del extractor
+    """
+    name = name or settings.OCR_TEXT_LAYER_BACKEND
+
+    if name not in _backends:
+        if name == PdftotextBackend.name and PdftotextBackend.available():
+            _backends[name] = PdftotextBackend(layout=settings.OCR_TEXT_LAYER_LAYOUT)
+        elif name == PyMuPDFBackend.name and fitz is not None:
+            _backends[name] = PyMuPDFBackend()
+        else:
+            if name != PyPDF2Backend.name:
+                print(f"Extractor de capa de texto no disponible: {name}. Se usa pypdf2")
+            _backends[name] = _backends.get(PyPDF2Backend.name) or PyPDF2Backend()
+            _backends[PyPDF2Backend.name] = _backends[name]
+
+    return _backends[name]
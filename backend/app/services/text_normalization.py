@@ -0,0 +1,33 @@
+from typing import Optional
+import unicodedata
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas y sin acentos, para comparar con palabras clave y etiquetas"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def parse_number(text: str) -> Optional[float]:
+    """
+    Interpreta un importe con separadores de miles y decimales de
+    cualquier convención ("1.234,56", "1,234.56", "1234,5")
+    """
+    text = text.strip()
+    if "," in text and "." in text:
+        decimal = "," if text.rfind(",") > text.rfind(".") else "."
+    elif "," in text:
+        decimal = "," if len(text) - text.rfind(",") - 1 in (1, 2) else None
+    elif "." in text:
+        decimal = "." if text.count(".") == 1 and len(text) - text.rfind(".") - 1 != 3 else None
+    else:
+        decimal = None
+    thousands = {",", "."} - {decimal}
+    for separator in thousands:
+        text = text.replace(separator, "")
+    if decimal:
+        text = text.replace(decimal, ".")
+    try:
+        return float(text)
+    except ValueError:
+        return None
@@ -0,0 +1,176 @@
+from typing import Dict, List, Optional, Pattern, Sequence, Tuple
+import re
+
+from .text_normalization import normalize_text
+
+# Palabras clave que suelen acompañar el valor de cada campo (sin acentos,
+# en minúsculas). Los campos que no están acá usan las partes de su nombre
+FIELD_KEYWORDS: Dict[str, List[str]] = {
+    "numero_factura": ["factura", "invoice", "comprobante", "nro", "numero", "n°", "punto de venta"],
+    "numero_orden": ["orden", "pedido", "purchase order", "nro", "numero", "n°"],
+    "numero_certificado": ["certificado", "certificate", "nro", "numero", "n°"],
+    "numero_contrato": ["contrato", "contract", "nro", "numero", "n°"],
+    "numero_remito": ["remito", "nro", "numero", "n°"],
+    "numero_documento": ["nro", "numero", "n°", "comprobante"],
+    "fecha": ["fecha", "date", "emision", "vencimiento"],
+    "proveedor": ["proveedor", "razon social", "emisor", "vendedor", "seller", "supplier", "cuit"],
+    "emisor": ["emisor", "razon social", "proveedor", "vendedor", "cuit"],
+    "exportador": ["exportador", "exporter", "razon social", "cuit"],
+    "cliente": ["cliente", "senor", "sr.", "comprador", "buyer", "customer", "destinatario", "cuit"],
+    "receptor": ["receptor", "cliente", "destinatario", "comprador", "cuit"],
+    "monto_total": ["total", "importe", "subtotal", "iva", "neto", "amount", "a pagar"],
+    "monto": ["monto", "total", "importe", "precio", "amount"],
+    "moneda": ["moneda", "currency", "usd", "ars", "eur", "u$s", "dolares", "pesos", "euros"],
+    "items": ["cantidad", "descripcion", "precio unitario", "p. unit", "codigo", "qty", "unidad", "subtotal"],
+    "pais_origen": ["origen", "origin", "pais", "country"],
+    "producto": ["producto", "product", "mercaderia", "descripcion", "posicion arancelaria", "ncm"],
+    "origen": ["origen", "desde", "remitente", "domicilio"],
+    "destino": ["destino", "entregar", "destinatario", "domicilio"],
+    "partes": ["entre", "parte", "representad", "domicilio", "cuit"],
+    "objeto": ["objeto", "clausula primera"],
+    "modelo": ["modelo", "model"],
+    "especificaciones": ["especificacion", "caracteristica", "dimension", "material", "tension", "potencia"],
+    "normas": ["norma", "iso", "iram", "standard", "certificacion"],
+}
+
+# Palabras que identifican el tipo de documento, para clasificar
+CLASSIFICATION_KEYWORDS = [
+    "factura", "invoice", "orden de compra", "purchase order", "certificado de origen", "certificate of origin",
+    "especificacion", "ficha tecnica", "datasheet", "contrato", "contract", "remito",
+]
+
+# Valores que suelen ser los que se extraen: importes, fechas y CUIT/CUIL
+VALUE_PATTERNS = [
+    re.compile(r"\d[\d.,]*[.,]\d{2}\b"),
+    re.compile(r"\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b"),
+    re.compile(r"\b\d{2}-?\d{8}-?\d\b"),
+]
+
+GAP_MARKER = "[...]"
+
+# Líneas por bloque como máximo (los párrafos largos se parten)
+MAX_BLOCK_LINES = 6
+
+
+def field_keywords(fields: Sequence[str]) -> List[str]:
+    """
+    Palabras clave de una lista de campos a extraer
+
+    Args:
+        fields: Nombres de campos (ej: "monto_total", o claves con notación
+            de punto de los atributos configurables)
+
+    Returns:
+        Palabras clave sin repetir, sin acentos y en minúsculas
+    """
+    keywords: List[str] = []
+    for field in fields:
+        name = normalize_text(field.split(".")[-1])
+        keywords.extend(FIELD_KEYWORDS.get(name, []))
+        keywords.extend(part for part in re.split(r"[\W_]+", name) if len(part) > 3)
+    return list(dict.fromkeys(keywords))
+
+
+def _split_blocks(text: str) -> List[List[str]]:
+    """
+    Bloques de líneas consecutivas (separados por líneas en blanco)
+
+    Las líneas repetidas (encabezados y pies de página que se repiten en
+    cada página) se conservan solo la primera vez.
+    """
+    blocks: List[List[str]] = []
+    current: List[str] = []
+    seen = set()
+
+    for line in text.splitlines():
+        key = " ".join(normalize_text(line).split())
+        if not key or key in seen:
+            if not key and current:
+                blocks.append(current)
+                current = []
+            continue
+        seen.add(key)
+        current.append(line.rstrip())
+        if len(current) >= MAX_BLOCK_LINES:
+            blocks.append(current)
+            current = []
+
+    if current:
+        blocks.append(current)
+    return blocks
+
+
+def _score_block(lines: List[str], keyword_pattern: Optional[Pattern]) -> int:
+    """Puntaje de un bloque: palabras clave distintas por línea (x2) y valores"""
+    score = 0
+    for line in lines:
+        if keyword_pattern is not None:
+            score += 2 * len(set(keyword_pattern.findall(normalize_text(line))))
+        score += sum(1 for pattern in VALUE_PATTERNS if pattern.search(line))
+    return score
+
+
+def select_relevant_text(text: str, keywords: Sequence[str], max_chars: int) -> str:
+    """
+    Selecciona las partes del texto más relevantes hasta max_chars caracteres
+
+    El texto se divide en bloques que se puntúan por las palabras clave de
+    los campos a extraer y por los valores que contienen (importes, fechas,
+    CUIT). Se toman los de mayor puntaje que entran en el presupuesto,
+    siempre con el primer bloque (encabezado del documento), y se devuelven
+    en su orden original, marcando con "[...]" el texto omitido. Así los
+    totales o el CUIT al final de una factura larga llegan al modelo, y los
+    encabezados repetidos no consumen el presupuesto.
+
+    Args:
+        text: Texto completo del documento
+        keywords: Palabras clave (ver field_keywords)
+        max_chars: Presupuesto de caracteres
+
+    Returns:
+        Texto seleccionado; el texto completo si entra en el presupuesto
+    """
+    if len(text) <= max_chars:
+        return text
+
+    blocks = ["\n".join(lines) for lines in _split_blocks(text)]
+    if not blocks:
+        return text[:max_chars]
+
+    # Las palabras clave se buscan al inicio de palabra ("usd" no coincide
+    # dentro de otra palabra, "especificacion" sí con "especificaciones")
+    keyword_pattern = None
+    if keywords:
+        keyword_pattern = re.compile(r"(?<!\w)(?:" + "|".join(map(re.escape, keywords)) + ")")
+
+    scores: List[Tuple[int, int]] = [
+        (_score_block(block.splitlines(), keyword_pattern), i) for i, block in enumerate(blocks)
+    ]
+    ranked = sorted(scores, key=lambda item: (-item[0], item[1]))
+    # El encabezado va siempre: suele identificar el documento y al emisor
+    candidates = [0] + [i for score, i in ranked if i != 0 and score > 0]
+    # Con presupuesto sobrante se completa con los bloques restantes en orden
+    candidates += [i for score, i in scores if i != 0 and score == 0]
+
+    selected = set()
+    used = 0
+    separator = len(GAP_MARKER) + 2
+    for i in candidates:
+        cost = len(blocks[i]) + separator
+        if used + cost <= max_chars:
+            selected.add(i)
+            used += cost
+
+    if not selected:
+        return blocks[0][:max_chars]
+
+    parts: List[str] = []
+    previous = -1
+    for i in sorted(selected):
+        if i != previous + 1:
+            parts.append(GAP_MARKER)
+        parts.append(blocks[i])
+        previous = i
+    if previous != len(blocks) - 1:
+        parts.append(GAP_MARKER)
+    return "\n\n".join(parts)
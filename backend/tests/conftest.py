@@ -0,0 +1,12 @@
+import os
+
+# La configuración exige las variables del .env; para los tests alcanzan los
+# valores de ejemplo (las que ya estén definidas no se pisan)
+_ENV_EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "..", ".env.example")
+
+with open(_ENV_EXAMPLE, encoding="utf-8") as env_example:
+    for line in env_example:
+        line = line.strip()
+        if line and not line.startswith("#") and "=" in line:
+            name, value = line.split("=", 1)
+            os.environ.setdefault(name.strip(), value.strip())
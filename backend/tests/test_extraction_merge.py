@@ -0,0 +1,26 @@
+from app.services.extraction_merge import merge_extractions
+
+TORNILLO = {"descripcion": "Tornillo", "cantidad": 1, "precio": 10}
+TUERCA = {"descripcion": "Tuerca", "cantidad": 2, "precio": 5}
+ARANDELA = {"descripcion": "Arandela", "cantidad": 4, "precio": 1}
+
+
+def test_repeated_items_within_a_chunk_are_kept():
+    merged, _ = merge_extractions([{"items": [TORNILLO, TORNILLO, TUERCA]}])
+    assert merged["items"] == [TORNILLO, TORNILLO, TUERCA]
+
+
+def test_items_repeated_by_the_overlap_are_dropped_once():
+    merged, _ = merge_extractions([
+        {"items": [TORNILLO, TORNILLO, TUERCA]},
+        {"items": [TUERCA, ARANDELA, TORNILLO]},
+    ])
+    assert merged["items"] == [TORNILLO, TORNILLO, TUERCA, ARANDELA, TORNILLO]
+
+
+def test_overlap_keeps_repeated_rows_past_it():
+    merged, _ = merge_extractions([
+        {"items": [TUERCA, TORNILLO]},
+        {"items": [TORNILLO, TORNILLO]},
+    ])
+    assert merged["items"] == [TUERCA, TORNILLO, TORNILLO]
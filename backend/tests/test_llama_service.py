@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.config import settings
+from app.services.llama_service import llama_service
+from app.services.llm_scheduler import LLMRequestCancelled
+
+
+@pytest.fixture
+def map_reduce(monkeypatch):
+    """Documento de tres fragmentos que siempre se extrae por map-reduce"""
+    monkeypatch.setattr(llama_service, "_use_map_reduce", lambda text_content: True)
+    monkeypatch.setattr(llama_service, "_split_document", lambda text_content: (["0", "1", "2"], 3))
+    monkeypatch.setattr(
+        llama_service, "_extraction_request", lambda chunk, document_type, db, fields: (chunk, {}, None)
+    )
+
+
+def test_llm_extract_skips_pending_chunks_after_a_cancelled_one(monkeypatch, map_reduce):
+    monkeypatch.setattr(settings, "LLM_MAP_REDUCE_CONCURRENCY", 1)
+    started = []
+    lock = threading.Lock()
+
+    def extract_chunk(request, document_type, attributes):
+        with lock:
+            started.append(request[0])
+        raise LLMRequestCancelled("cancelada")
+
+    monkeypatch.setattr(llama_service, "_extract_chunk", extract_chunk)
+
+    with pytest.raises(LLMRequestCancelled):
+        llama_service._llm_extract("texto", "factura", None, None)
+    assert started == ["0"]
+
+
+def test_allm_extract_cancels_other_chunks_after_a_cancelled_one(monkeypatch, map_reduce):
+    monkeypatch.setattr(settings, "LLM_MAP_REDUCE_CONCURRENCY", 3)
+    cancelled = []
+
+    async def aextract_chunk(request, document_type, attributes):
+        if request[0] == "0":
+            await asyncio.sleep(0.01)
+            raise LLMRequestCancelled("cancelada")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(request[0])
+            raise
+
+    monkeypatch.setattr(llama_service, "_aextract_chunk", aextract_chunk)
+
+    async def run():
+        with pytest.raises(LLMRequestCancelled):
+            await llama_service._allm_extract("texto", "factura", None, None)
+        # Ya cancelados al fallar la extracción, no al cerrar el event loop
+        return sorted(cancelled)
+
+    assert asyncio.run(run()) == ["1", "2"]
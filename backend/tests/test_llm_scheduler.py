@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.config import settings
+from app.services.llm_scheduler import LLMRequestCancelled, LLMScheduler
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    """Planificador con un solo lugar y los pesos por defecto"""
+    monkeypatch.setattr(settings, "LLM_SCHEDULER_MAX_IN_FLIGHT", 1)
+    monkeypatch.setattr(settings, "LLM_SCHEDULER_WEIGHTS", {"interactive": 8, "normal": 2, "bulk": 1})
+    return LLMScheduler()
+
+
+async def _wait_until_queued(scheduler, lane, count):
+    while scheduler.get_stats()["lanes"][lane]["queued"] < count:
+        await asyncio.sleep(0)
+
+
+def test_lowest_finish_tag_is_dispatched_first(scheduler):
+    order = []
+
+    async def call(lane, name):
+        with scheduler.priority(lane):
+            async with scheduler.slot(100):
+                order.append(name)
+
+    async def run():
+        async with scheduler.slot(100):
+            # Con el lugar libre y sin cola se despacha sin esperar
+            assert scheduler.get_stats()["in_flight"] == 1
+            tasks = [asyncio.create_task(call("bulk", f"bulk-{i}")) for i in range(3)]
+            await _wait_until_queued(scheduler, "bulk", 3)
+            tasks.append(asyncio.create_task(call("interactive", "interactive")))
+            await _wait_until_queued(scheduler, "interactive", 1)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["interactive", "bulk-0", "bulk-1", "bulk-2"]
+    assert scheduler.get_stats()["in_flight"] == 0
+
+
+def test_cancel_queued_wakes_async_and_sync_waiters(scheduler):
+    results = {}
+
+    def sync_call():
+        try:
+            with scheduler.priority("bulk"), scheduler.sync_slot(100):
+                results["sync"] = "dispatched"
+        except LLMRequestCancelled:
+            results["sync"] = "cancelled"
+
+    async def run():
+        async with scheduler.slot(100):
+            with scheduler.priority("bulk"):
+                waiter = asyncio.create_task(scheduler.slot(100).__aenter__())
+            await _wait_until_queued(scheduler, "bulk", 1)
+            thread = threading.Thread(target=sync_call)
+            thread.start()
+            await _wait_until_queued(scheduler, "bulk", 2)
+
+            assert scheduler.cancel_queued("bulk") == 2
+            with pytest.raises(LLMRequestCancelled):
+                await waiter
+            await asyncio.to_thread(thread.join)
+
+    asyncio.run(run())
+    assert results == {"sync": "cancelled"}
+    stats = scheduler.get_stats()
+    assert stats["in_flight"] == 0
+    assert stats["lanes"]["bulk"]["cancelled"] == 2
+    assert stats["lanes"]["bulk"]["queued"] == 0
+
+
+def test_task_cancelled_while_waiting_leaves_no_slot_taken(scheduler):
+    async def run():
+        async with scheduler.slot(100):
+            waiter = asyncio.create_task(scheduler.slot(100).__aenter__())
+            await _wait_until_queued(scheduler, "normal", 1)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            assert scheduler.get_stats()["lanes"]["normal"]["queued"] == 0
+
+    asyncio.run(run())
+    assert scheduler.get_stats()["in_flight"] == 0
+
+
+def test_task_cancelled_as_its_slot_is_granted_releases_it(scheduler):
+    async def run():
+        holder = scheduler.slot(100)
+        await holder.__aenter__()
+        waiter = asyncio.create_task(scheduler.slot(100).__aenter__())
+        await _wait_until_queued(scheduler, "normal", 1)
+        # Al liberar, el lugar pasa al que espera, pero su tarea se cancela
+        # antes de enterarse: _withdraw ya no lo encuentra en la cola
+        await holder.__aexit__(None, None, None)
+        assert scheduler.get_stats()["in_flight"] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(run())
+    assert scheduler.get_stats()["in_flight"] == 0
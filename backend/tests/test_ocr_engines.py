@@ -0,0 +1,30 @@
+from PIL import Image
+
+from app.services.ocr_engines import TesserocrEngine
+
+
+class _FakeAPI:
+    """Registra cómo se le pasó la imagen al handle de Tesseract"""
+
+    def __init__(self):
+        self.calls = []
+
+    def SetImage(self, image):
+        self.calls.append(("SetImage", image.mode))
+
+    def SetImageBytes(self, data, width, height, bytes_per_pixel, bytes_per_line):
+        self.calls.append(("SetImageBytes", bytes_per_pixel))
+
+
+def test_set_image_passes_raw_bytes_for_l_and_rgb():
+    for mode, bytes_per_pixel in (("L", 1), ("RGB", 3)):
+        api = _FakeAPI()
+        TesserocrEngine._set_image(api, Image.new(mode, (4, 2)))
+        assert api.calls == [("SetImageBytes", bytes_per_pixel)]
+
+
+def test_set_image_falls_back_to_set_image_for_other_modes():
+    for mode in ("RGBA", "P", "LA", "CMYK", "1"):
+        api = _FakeAPI()
+        TesserocrEngine._set_image(api, Image.new(mode, (4, 2)))
+        assert api.calls == [("SetImage", mode)]
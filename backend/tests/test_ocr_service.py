@@ -0,0 +1,19 @@
+from PIL import Image
+
+from app.services import ocr_service
+
+
+class _LowConfidenceEngine:
+    def image_to_text_and_confidence(self, image, lang):
+        return "texto borroso", 40.0
+
+
+def test_ocr_pdf_page_keeps_low_dpi_result_when_high_dpi_render_fails(monkeypatch):
+    monkeypatch.setattr(ocr_service, "get_ocr_engine", lambda engine: _LowConfidenceEngine())
+    monkeypatch.setattr(ocr_service, "render_pdf_page", lambda file_path, page_number, dpi: None)
+
+    result = ocr_service.ocr_pdf_page(
+        "documento.pdf", 1, 300, "spa", "pytesseract", adaptive=(150, 70.0), image=Image.new("L", (4, 4))
+    )
+
+    assert result == {"text": "texto borroso", "dpi": 150, "confidence": 40.0, "escalated": False}